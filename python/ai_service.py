@@ -1,29 +1,141 @@
-from secret import OPENAI_API_KEY
-from openai import OpenAI
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor
+try:
+    from secret import OPENAI_API_KEY
+except ImportError:
+    OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 import search_faiss # Make sure this import points to your actual FAISS module
+import config
 import re
+from verdict_cache import VerdictCache, make_cache_key
+from llm_client import AsyncLLMClient, LLMError
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+def create_llm_backend(backend=None):
+    """Creates the LLM backend named by config.LLM_BACKEND: "openai" or "ollama"."""
+    backend = backend or config.LLM_BACKEND
+    if backend == "openai":
+        return AsyncLLMClient(
+            api_key=OPENAI_API_KEY,
+            model=config.OPENAI_MODEL,
+            base_url=config.OPENAI_BASE_URL,
+            max_in_flight=config.LLM_MAX_IN_FLIGHT,
+            requests_per_second=config.LLM_REQUESTS_PER_SECOND,
+            burst=config.LLM_BURST,
+            max_retries=config.LLM_MAX_RETRIES,
+            timeout=config.LLM_TIMEOUT,
+            max_connections=config.LLM_MAX_CONNECTIONS
+        )
+    if backend == "ollama":
+        from ollama import OllamaBackend
+        return OllamaBackend(
+            model=config.OLLAMA_MODEL,
+            server_url=config.OLLAMA_URL,
+            max_in_flight=config.OLLAMA_MAX_IN_FLIGHT
+        )
+    raise ValueError(f"Unknown LLM backend: {backend}")
+
+llm = create_llm_backend()
+
+API_ERROR_MESSAGE = "Unable to determine truthfulness due to an API error."
+
+verdict_cache = VerdictCache(
+    config.VERDICT_CACHE_URL,
+    ttl_seconds=config.VERDICT_CACHE_TTL,
+    max_entries=config.VERDICT_CACHE_MAX_ENTRIES
+) if config.VERDICT_CACHE_ENABLED else None
 
-def call_api(system_instructions, user_prompt):
-    # 4. Call the OpenAI Chat Completion API
+def call_api(system_instructions, user_prompt, response_format=None, max_tokens=300):
+    # 4. Call the LLM backend (OpenAI: retried on rate limits and transient errors)
     try:
-        completion = client.chat.completions.create(
-            model="gpt-4o-mini",  # Or whichever model you are using
-            messages=[
-                {"role": "system", "content": system_instructions},
-                {"role": "user", "content": user_prompt},
-            ],
-            max_tokens=300,
-            temperature=0.7
-        )
-        answer = completion.choices[0].message.content.strip()
+        return llm.complete_sync(system_instructions, user_prompt, response_format=response_format, max_tokens=max_tokens)
+    except LLMError as e:
+        print("Error calling the LLM API:", e)
+        return API_ERROR_MESSAGE
+
+
+class JsonStringFieldStream:
+    """
+    Extracts the value of one string field from a JSON object that arrives in
+    pieces, so the text of e.g. "statement_analysis" can be passed on while the
+    rest of the object is still being generated.
+    """
 
-    except Exception as e:
-        print("Error calling OpenAI API:", e)
-        return "Unable to determine truthfulness due to an API error."
+    ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
 
-    return answer
+    def __init__(self, field):
+        self._start = re.compile(r'"' + re.escape(field) + r'"\s*:\s*"')
+        self._buffer = ""
+        self._inside = False
+        self._done = False
+
+    def feed(self, piece):
+        """Returns the part of the field value contained in the new piece."""
+        if self._done:
+            return ""
+        self._buffer += piece
+        if not self._inside:
+            match = self._start.search(self._buffer)
+            if match is None:
+                return ""
+            self._inside = True
+            self._buffer = self._buffer[match.end():]
+
+        text = []
+        i = 0
+        while i < len(self._buffer):
+            char = self._buffer[i]
+            if char == '"':
+                self._done = True
+                break
+            if char != '\\':
+                text.append(char)
+                i += 1
+                continue
+            # Keep incomplete escape sequences for the next piece
+            if i + 1 >= len(self._buffer):
+                break
+            if self._buffer[i + 1] == 'u':
+                if i + 6 > len(self._buffer):
+                    break
+                code = int(self._buffer[i + 2:i + 6], 16)
+                if 0xD800 <= code < 0xDC00:
+                    # High surrogate, combine it with the following low surrogate
+                    if i + 12 > len(self._buffer):
+                        break
+                    low = int(self._buffer[i + 8:i + 12], 16)
+                    text.append(chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)))
+                    i += 12
+                    continue
+                text.append(chr(code))
+                i += 6
+            else:
+                text.append(self.ESCAPES.get(self._buffer[i + 1], self._buffer[i + 1]))
+                i += 2
+        self._buffer = self._buffer[i:]
+        return "".join(text)
+
+
+def call_api_streaming(system_instructions, user_prompt, on_token, response_format=None, max_tokens=300,
+                       stream_field=None):
+    """
+    Like call_api, but streams the answer and calls on_token with each piece
+    of text as the LLM produces it. With stream_field only the value of that
+    field of a JSON answer is passed to on_token.
+    """
+    field_stream = JsonStringFieldStream(stream_field) if stream_field else None
+    pieces = []
+    try:
+        for piece in llm.stream_sync(system_instructions, user_prompt, response_format=response_format,
+                                     max_tokens=max_tokens):
+            pieces.append(piece)
+            text = field_stream.feed(piece) if field_stream else piece
+            if text:
+                on_token(text)
+    except LLMError as e:
+        print("Error calling the LLM API:", e)
+        return API_ERROR_MESSAGE
+    return "".join(pieces).strip()
 
 
 def parse_llm_response(chatgpt_answer):
@@ -41,6 +153,33 @@ def parse_llm_response(chatgpt_answer):
     prob_false = int(false_match.group(1)) if false_match else 0
     prob_undecided = int(undecided_match.group(1)) if undecided_match else 100  # Default to undecided if not found
 
+    return build_verdict(prob_true, prob_false, prob_undecided)
+
+
+def parse_structured_response(chatgpt_answer):
+    """
+    Parses a JSON answer of the single-call mode into the statement analysis
+    and the probability values. Falls back to the text format of
+    parse_llm_response if the answer is not valid JSON.
+    """
+    try:
+        answer = json.loads(chatgpt_answer)
+        if not isinstance(answer, dict):
+            raise ValueError("Expected a JSON object")
+        verdict = build_verdict(
+            int(answer.get("probability_true", 0)),
+            int(answer.get("probability_false", 0)),
+            int(answer.get("probability_undecided", 100)),
+        )
+        verdict["statement_analysis"] = str(answer.get("statement_analysis", "")).strip()
+    except (ValueError, TypeError):
+        verdict = parse_llm_response(chatgpt_answer)
+        verdict["statement_analysis"] = chatgpt_answer
+    return verdict
+
+
+def build_verdict(prob_true, prob_false, prob_undecided):
+    """Determines the truthfulness flag from the three probabilities."""
     # Determine the boolean flag
     if prob_true > 50:
         is_likely_true = True
@@ -65,7 +204,12 @@ def check_truth_with_chatgpt(
     normalise=True,
     alpha=0.05,
     selected_types=None,
-    max_sources: int = 5
+    max_sources: int = 5,
+    search_results=None,
+    mode=None,
+    query_embedding=None,
+    on_token=None,
+    search_index=None
 ):
     """
     1. Searches the FAISS index with the user's text (extracted_text).
@@ -94,6 +238,22 @@ def check_truth_with_chatgpt(
         If not None, the search function will filter results by these types.
     max_sources : int
         Maximum number of sources/snippets to pass to ChatGPT.
+    search_results : list or None
+        Results already retrieved for this statement (e.g. by
+        search_faiss.search_pdfs_batch). If given, the FAISS search is skipped.
+    mode : str or None
+        "single" asks for the analysis and the probabilities in one JSON
+        answer, "two_step" makes a second call for the probabilities.
+        Defaults to config.LLM_CHECK_MODE.
+    query_embedding : np.ndarray or None
+        Embedding of extracted_text if the caller already computed it.
+    on_token : callable or None
+        If given, the statement analysis is streamed and on_token is called
+        with each piece of it as the LLM produces it. The pieces still cite
+        sources as "Source #N", the returned analysis links them.
+    search_index : search_faiss.SearchIndex or None
+        The loaded index the FAISS objects belong to, for its metadata
+        lookups, re-ranking vectors and text index (see search_faiss.search_pdfs).
 
     Returns:
     --------
@@ -102,16 +262,21 @@ def check_truth_with_chatgpt(
     """
 
     # 1. Use FAISS to retrieve top matching snippets
-    results = search_faiss.search_pdfs(
-        query=extracted_text,
-        index=faiss_index,
-        model=embedding_model,
-        chunks=all_chunks,
-        metadata=metadata,
-        normalise=normalise,
-        alpha=alpha,
-        publication_types=selected_types if selected_types else []
-    )
+    if search_results is not None:
+        results = search_results
+    else:
+        results = search_faiss.search_pdfs(
+            query=extracted_text,
+            index=faiss_index,
+            model=embedding_model,
+            chunks=all_chunks,
+            metadata=metadata,
+            normalise=normalise,
+            alpha=alpha,
+            publication_types=selected_types if selected_types else [],
+            query_embedding=query_embedding,
+            search_index=search_index
+        )
 
     if not results:
         return (
@@ -122,6 +287,21 @@ def check_truth_with_chatgpt(
     # If you only want to pass top-N results to the LLM:
     top_results = results[:max_sources]
 
+    mode = mode or config.LLM_CHECK_MODE
+    if mode not in ("single", "two_step"):
+        raise ValueError(f"Unknown LLM check mode: {mode}")
+
+    # Reuse the verdict of an earlier check of the same claim against the same sources
+    cache_key = None
+    if verdict_cache is not None:
+        cache_key = make_cache_key(
+            extracted_text, [r.get("chunk_id", r["url"]) for r in top_results], f"{llm.name}/{llm.model}", mode
+        )
+        cached_response = verdict_cache.get(cache_key)
+        if cached_response is not None:
+            print("Verdict cache hit")
+            return cached_response
+
 
     # 2. Build a context string with snippet text + sources
     #    Adjust the format as you prefer:
@@ -157,34 +337,60 @@ def check_truth_with_chatgpt(
         "- If false, provide a corrected statement.\n"
         "- Cite the source(s) used in your reasoning, using their Source #.\n"
     )
-    print(user_prompt)
+    if mode == "single":
+        # One call returning the analysis and the probabilities as JSON
+        user_prompt += (
+            "\nAlso assign probabilities (0 to 100) that the statement is true, false, or "
+            "undecided (i.e., the sources do not provide enough evidence).\n\n"
+            "Respond with a JSON object with exactly these keys:\n"
+            '- "statement_analysis": your answer as text, citing sources by their Source #\n'
+            '- "probability_true": integer\n'
+            '- "probability_false": integer\n'
+            '- "probability_undecided": integer\n'
+        )
+        print(user_prompt)
 
+        if on_token is not None:
+            answer = call_api_streaming(
+                system_instructions, user_prompt, on_token, response_format={"type": "json_object"},
+                max_tokens=400, stream_field="statement_analysis"
+            )
+        else:
+            answer = call_api(system_instructions, user_prompt, response_format={"type": "json_object"}, max_tokens=400)
+        parsed_result = parse_structured_response(answer)
+        answer_1 = parsed_result["statement_analysis"]
+        api_failed = answer_1 == API_ERROR_MESSAGE
+    else:
+        print(user_prompt)
 
-    answer_1 = call_api(system_instructions, user_prompt)
-
-    user_prompt_2 = (
-        "You previously assessed the following statement and provided an answer.\n\n"
-        "### User Statement:\n"
-        f"{extracted_text}\n\n"
-        "### Relevant Document Snippets:\n"
-        f"{combined_context}\n\n"
-        "### Your Previous Conclusion:\n"
-        f"{answer_1}\n\n"
-        "**Now, assign probabilities to the following categories (0% to 100%):**\n"
-        "- Probability that the statement is **true**.\n"
-        "- Probability that the statement is **false**.\n"
-        "- Probability that the statement is **undecided** (i.e., the sources do not provide enough evidence).\n\n"
-        "**Format your response exactly like this:**\n"
-        "- Probability True: XX%\n"
-        "- Probability False: XX%\n"
-        "- Probability Undecided: XX%\n"
-    )
+        if on_token is not None:
+            answer_1 = call_api_streaming(system_instructions, user_prompt, on_token)
+        else:
+            answer_1 = call_api(system_instructions, user_prompt)
 
+        user_prompt_2 = (
+            "You previously assessed the following statement and provided an answer.\n\n"
+            "### User Statement:\n"
+            f"{extracted_text}\n\n"
+            "### Relevant Document Snippets:\n"
+            f"{combined_context}\n\n"
+            "### Your Previous Conclusion:\n"
+            f"{answer_1}\n\n"
+            "**Now, assign probabilities to the following categories (0% to 100%):**\n"
+            "- Probability that the statement is **true**.\n"
+            "- Probability that the statement is **false**.\n"
+            "- Probability that the statement is **undecided** (i.e., the sources do not provide enough evidence).\n\n"
+            "**Format your response exactly like this:**\n"
+            "- Probability True: XX%\n"
+            "- Probability False: XX%\n"
+            "- Probability Undecided: XX%\n"
+        )
 
-    answer_2 = call_api(system_instructions, user_prompt_2)
+        answer_2 = call_api(system_instructions, user_prompt_2)
 
-    # Parse probabilities
-    parsed_result = parse_llm_response(answer_2)
+        # Parse probabilities
+        parsed_result = parse_llm_response(answer_2)
+        api_failed = API_ERROR_MESSAGE in (answer_1, answer_2)
 
     # Replace source numbers with actual titles & URLs in the first response
     for source_key, (title, url) in source_map.items():
@@ -193,11 +399,77 @@ def check_truth_with_chatgpt(
         answer_1 = answer_1.replace(source_key, f"[{title}]({url})")
 
     # Return the full structured response
-    return {
+    response = {
         "statement_analysis": answer_1,
         "sources": source_map,
         "probability_true": parsed_result["probability_true"],
         "probability_false": parsed_result["probability_false"],
         "probability_undecided": parsed_result["probability_undecided"],
         "is_likely_true": parsed_result["is_likely_true"]
-    }
\ No newline at end of file
+    }
+
+    # Failed API calls are not cached so the next upload retries them
+    if cache_key is not None and not api_failed:
+        verdict_cache.put(cache_key, f"{llm.name}/{llm.model}", response)
+
+    return response
+
+def check_truths_with_chatgpt(
+    extracted_texts,
+    faiss_index,
+    embedding_model,
+    all_chunks,
+    metadata,
+    normalise=True,
+    alpha=0.05,
+    selected_types=None,
+    max_sources: int = 5,
+    batch_size: int = 32,
+    mode=None,
+    max_concurrency: int = None,
+    search_index=None
+):
+    """
+    Batch variant of check_truth_with_chatgpt for backfills and audits.
+
+    All statements are retrieved with one search_faiss.search_pdfs_batch call
+    (batched encoding, a single index.search), then the statements are checked
+    concurrently by up to `max_concurrency` threads (default: the LLM client's
+    in-flight limit), each with its precomputed results.
+
+    Returns:
+    --------
+    list
+        One check_truth_with_chatgpt response per statement, in input order.
+    """
+    extracted_texts = list(extracted_texts)
+    all_results = search_faiss.search_pdfs_batch(
+        queries=extracted_texts,
+        index=faiss_index,
+        model=embedding_model,
+        chunks=all_chunks,
+        metadata=metadata,
+        normalise=normalise,
+        alpha=alpha,
+        publication_types=selected_types if selected_types else [],
+        batch_size=batch_size,
+        search_index=search_index
+    )
+
+    def check(extracted_text, results):
+        return check_truth_with_chatgpt(
+            extracted_text=extracted_text,
+            faiss_index=faiss_index,
+            embedding_model=embedding_model,
+            all_chunks=all_chunks,
+            metadata=metadata,
+            normalise=normalise,
+            alpha=alpha,
+            selected_types=selected_types,
+            max_sources=max_sources,
+            search_results=results,
+            mode=mode
+        )
+
+    with ThreadPoolExecutor(max_workers=max_concurrency or llm.max_in_flight) as pool:
+        return list(pool.map(check, extracted_texts, all_results))
@@ -1,20 +1,35 @@
-from flask import Flask, request, send_file, jsonify, make_response
+from flask import Flask, Response, request, send_file, jsonify
 from flask_cors import CORS
 from io import BytesIO
 import os
-import time
 import json
+import queue
+import threading
+import base64
 import hashlib
+import hmac
+import time
+from datetime import datetime, timezone
+import config
 import search_faiss
-
-from PIL import Image, ImageDraw, ImageFont
-import pytesseract
-
-from sqlalchemy import create_engine, Column, String, Integer
+from perceptual_hash import BKTree, dhash_bytes, hash_to_hex, hex_to_hash
+from claim_index import ClaimIndex, read_claim_index_file
+from verdict_cache import normalise_text
+from search_context import SearchContext, SearchContextUnavailable, GenerationStore
+from jobs import JobQueue, JobStore, QueueFull, DONE, FAILED
+from ocr import OCREngine
+from image_context import ImageContext, to_rgb
+from render import VerdictRenderer
+from thumbnails import ThumbnailPipeline, thumbnail_path
+
+from PIL import Image
+
+from sqlalchemy import create_engine, inspect, text, and_, or_, Column, DateTime, String, Integer, Text, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 # Import the separate ChatGPT function
+import ai_service
 from ai_service import check_truth_with_chatgpt
 
 #######################################################
@@ -22,13 +37,16 @@ from ai_service import check_truth_with_chatgpt
 #######################################################
 
 app = Flask(__name__)
-CORS(app, expose_headers=["x-description"])
+CORS(app, expose_headers=["x-description", "ETag", "Last-Modified"])
 
-DATABASE_URL = "sqlite:///image_records.db"
+DATABASE_URL = config.DATABASE_URL  # Created with all tables on first run
 engine = create_engine(DATABASE_URL)
 Session = sessionmaker(bind=engine)
 Base = declarative_base()
 
+def utc_now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
 class ImageRecord(Base):
     __tablename__ = 'image_records'
     id = Column(Integer, primary_key=True)
@@ -37,23 +55,49 @@ class ImageRecord(Base):
     output_image_path = Column(String)
     extracted_text = Column(String)
     truthfulness_response = Column(String)
+    phash = Column(String)  # Perceptual hash (dHash) as hex, for near-duplicate lookup
+    verdict = Column(Text)  # Full check_truth_with_chatgpt response as JSON
+    created_at = Column(DateTime, index=True, default=utc_now)  # UTC, gallery order
+    input_thumbnail_path = Column(String)
+    output_thumbnail_path = Column(String)
+    claim_embedding = Column(LargeBinary)  # Normalised float32 embedding of the extracted text, see claim_index.py
+
+def add_missing_columns(engine):
+    """
+    Adds columns and indexes defined on the models but missing from existing
+    tables, so databases created by older versions keep working.
+    """
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(engine.dialect)
+                with engine.begin() as connection:
+                    connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
 
 Base.metadata.create_all(engine)
+add_missing_columns(engine)
 
 print("System ready! You can now ask questions.")
 
 # -------------------------------------------
 # 1A. FAISS Initialization (Important)
 # -------------------------------------------
-print("Loading the FAISS index...")
-faiss_index, embedding_model, all_chunks, metadata, normalise = search_faiss.initialize_search_index(
+# The embedding model and FAISS index load in a background thread, routes that
+# don't need them (gallery, cached results, health checks) serve right away.
+print("Loading the FAISS index in the background...")
+search_context = SearchContext(
     model_name="all-mpnet-base-v2",   # or your chosen model
-    similarity_metric="L2"           # or "Cosine", etc.
-)
+    similarity_metric="L2",          # or "Cosine", etc.
+    store=GenerationStore(config.SEARCH_STATE_URL),  # Reloads reach all worker processes
+    check_interval=config.SEARCH_INDEX_CHECK_INTERVAL
+).start()
 ALPHA = 0.05
 SELECTED_TYPES = ['Briefing', 'Press Release', 'Unknown Type', 'Report', 'Letter',
        'Opinion', 'News', 'Publication', 'Consultation response', 'Internal', 'Spreadsheet'] # or a list of types if you want to filter
-print("FAISS index loaded successfully!")
 
 #######################################################
 # 2. Helper Functions
@@ -63,20 +107,96 @@ def generate_image_hash(file_bytes: bytes) -> str:
     """Generate a SHA-256 hash of the file bytes."""
     return hashlib.sha256(file_bytes).hexdigest()
 
-def save_input_image(image_bytes: bytes, uploads_folder: str, image_hash: str) -> str:
+def save_input_image(context: ImageContext, uploads_folder: str, image_hash: str) -> str:
     """
-    Saves the uploaded (input) image bytes to disk as a JPG,
-    returns the full file path.
+    Saves the uploaded (input) image to disk as a JPG, JPEG uploads as they
+    are, returns the full file path.
     """
     input_path = os.path.join(uploads_folder, f"{image_hash}_input.jpg")
-    # Open from bytes to ensure correct format
-    img = Image.open(BytesIO(image_bytes))
-    # Convert to RGB if needed
-    if img.mode == 'RGBA':
-        img = img.convert('RGB')
-    img.save(input_path, "JPEG")
+    with open(input_path, "wb") as f:
+        f.write(context.input_jpeg())
     return input_path
 
+def backfill_phash(session):
+    """
+    Computes and stores the perceptual hash of records created before the
+    column existed.
+    """
+    for record in session.query(ImageRecord).filter(ImageRecord.phash.is_(None)):
+        if record.input_image_path and os.path.exists(record.input_image_path):
+            with open(record.input_image_path, "rb") as f:
+                record.phash = hash_to_hex(dhash_bytes(f.read()))
+    session.commit()
+
+# BK-tree of the perceptual hashes of all records up to phash_index_last_id
+phash_index = BKTree()
+phash_index_last_id = 0
+phash_index_lock = threading.Lock()
+
+def refresh_phash_index(session):
+    """
+    Adds the perceptual hashes of records created since the last refresh to
+    the BK-tree, including records stored by other worker processes. Record
+    IDs increase in commit order, so the records newer than the last one
+    loaded are exactly the missing ones.
+    """
+    global phash_index_last_id
+    with phash_index_lock:
+        records = (
+            session.query(ImageRecord.id, ImageRecord.phash)
+            .filter(ImageRecord.id > phash_index_last_id)
+            .order_by(ImageRecord.id)
+        )
+        for record_id, phash in records:
+            if phash is not None:
+                phash_index.add(hex_to_hash(phash), record_id)
+            phash_index_last_id = record_id
+
+def find_near_duplicate(session, phash_value: int):
+    """
+    Returns the closest record whose perceptual hash is within
+    config.PHASH_MAX_DISTANCE bits of phash_value and whose output image
+    still exists, or None.
+    """
+    refresh_phash_index(session)
+    for distance, record_id in phash_index.search(phash_value, config.PHASH_MAX_DISTANCE):
+        record = session.get(ImageRecord, record_id)
+        if record and os.path.exists(record.output_image_path):
+            print(f"Near-duplicate of record {record_id} (Hamming distance {distance})")
+            return record
+    return None
+
+def backfill_created_at(session):
+    """
+    Sets the creation time of records created before the column existed to
+    the modification time of their output (or input) image.
+    """
+    for record in session.query(ImageRecord).filter(ImageRecord.created_at.is_(None)):
+        paths = [p for p in (record.output_image_path, record.input_image_path) if p and os.path.exists(p)]
+        timestamp = os.path.getmtime(paths[0]) if paths else 0
+        record.created_at = datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
+    session.commit()
+
+thumbnail_pipeline = ThumbnailPipeline(
+    config.THUMBNAILS_FOLDER,
+    size=config.THUMBNAIL_SIZE,
+    formats=config.THUMBNAIL_FORMATS,
+    workers=config.THUMBNAIL_WORKERS,
+    cache_bytes=config.THUMBNAIL_CACHE_BYTES
+)
+
+def store_thumbnail_paths(image_hash: str, input_thumbnail_path: str, output_thumbnail_path: str):
+    """Stores the thumbnail paths of a record, called by the thumbnail pipeline."""
+    session = Session()
+    try:
+        session.query(ImageRecord).filter_by(hash=image_hash).update({
+            "input_thumbnail_path": input_thumbnail_path,
+            "output_thumbnail_path": output_thumbnail_path
+        })
+        session.commit()
+    finally:
+        session.close()
+
 def retrieve_or_create_record(session, image_hash: str):
     """
     Check if there's an existing record for this hash. If found,
@@ -85,181 +205,301 @@ def retrieve_or_create_record(session, image_hash: str):
     existing_record = session.query(ImageRecord).filter_by(hash=image_hash).first()
     return existing_record
 
-def perform_ocr(image_bytes: bytes) -> str:
+ocr_engine = OCREngine(
+    lang=config.OCR_LANGUAGE,
+    text_height=config.OCR_TEXT_HEIGHT,
+    max_pixels=config.OCR_MAX_PIXELS,
+    binarize=config.OCR_BINARIZE
+)
+
+def perform_ocr(image) -> str:
     """
-    Performs OCR on the given image bytes using pytesseract
+    Performs OCR on the given image (a decoded PIL image or image bytes),
+    cropped to the text and scaled to the text size Tesseract reads best,
     and returns the extracted text.
     """
-    img = Image.open(BytesIO(image_bytes))
-    if img.mode == 'RGBA':
-        img = img.convert('RGB')
-    text = pytesseract.image_to_string(img)
-    return text
+    if isinstance(image, bytes):
+        return ocr_engine.bytes_to_string(image)
+    return ocr_engine.image_to_string(image)
+
+renderers = {}
+
+def get_renderer(logo_path: str) -> VerdictRenderer:
+    """The renderer using the given logo, created (and the logo loaded) on first use."""
+    if logo_path not in renderers:
+        renderers[logo_path] = VerdictRenderer(logo_path, cross_width=config.RENDER_CROSS_WIDTH)
+    return renderers[logo_path]
 
 def apply_grayscale_overlay_with_red_crosses(image: Image.Image, alpha=0.5) -> Image.Image:
     """
-    Applies a grayscale + white overlay, then draws red crosses.
+    Fades the image towards white, then draws a red cross.
     """
-    grayscale_image = image.convert("L").convert("RGB")
-    white_overlay = Image.new("RGB", image.size, color="white")
-    overlay_image = Image.blend(image, white_overlay, alpha=alpha)
-
-    draw = ImageDraw.Draw(overlay_image)
-    draw.line((0, 0, overlay_image.width, overlay_image.height), fill="red", width=20)
-    draw.line((0, overlay_image.height, overlay_image.width, 0), fill="red", width=20)
-    return overlay_image
+    return get_renderer(config.RENDER_LOGO_PATH).cross_out(to_rgb(image), alpha)
 
-def edit_image_with_logo_and_text(image_bytes: bytes, logo_path: str, is_likely_true: bool) -> Image.Image:
+def edit_image_with_logo_and_text(image, logo_path: str, is_likely_true: bool) -> Image.Image:
     """
-    Applies the red-cross overla if false, attaches a logo in the bottom-right corner,
-    and draws the answer text on the image.
+    Applies the red-cross overlay if false and attaches a logo in the
+    bottom-right corner of the image (a decoded PIL image or image bytes).
     """
-    image = Image.open(BytesIO(image_bytes))
-    if image.mode == 'RGBA':
-        image = image.convert('RGB')
-
-    if not is_likely_true:
-        # 1) Apply grayscale overlay with crosses
-        edited = apply_grayscale_overlay_with_red_crosses(image, alpha=0.5)
+    if not isinstance(image, Image.Image):
+        image = Image.open(BytesIO(image))
+    return get_renderer(logo_path).render(to_rgb(image), is_likely_true)
 
-        # 2) Additional big cross lines (optional, you might remove if redundant)
-        draw = ImageDraw.Draw(edited)
-        draw.line((0, 0, edited.width, edited.height), fill="red", width=20)
-        draw.line((0, edited.height, edited.width, 0), fill="red", width=20)
-    else:
-        edited = image
-    # 3) Insert the logo (if it exists)
-    #if os.path.exists(logo_path):
-    #    logo = Image.open(logo_path).convert("RGBA")
-    #    # Example: scale the logo to ~1/3 of the image width
-    #    logo_width = edited.width // 3
-    #    logo_ratio = logo_width / logo.width
-    #    logo_height = int(logo.height * logo_ratio)
-    #    logo = logo.resize((logo_width, logo_height))
-#
-    #    logo_x = edited.width - logo_width
-    #    logo_y = edited.height - logo_height
-    #    edited.paste(logo, (logo_x, logo_y), logo)
-
-    return edited
-
-def save_output_image(edited_image: Image.Image, uploads_folder: str, image_hash: str) -> str:
-    """
-    Saves the edited (output) image to disk and returns its file path.
+def save_output_image(output_bytes: bytes, uploads_folder: str, image_hash: str) -> str:
+    """
+    Saves the encoded (output) JPEG to disk and returns its file path.
     """
     output_path = os.path.join(uploads_folder, f"{image_hash}_output.jpg")
-    edited_image.save(output_path, "JPEG")
+    with open(output_path, "wb") as f:
+        f.write(output_bytes)
     return output_path
 
-def build_flask_image_response(edited_image: Image.Image, text_response: str, is_statement_true: bool):
+def build_flask_image_response(output_bytes: bytes, description: dict, image_hash: str = None):
     """
-    Converts the edited PIL image to a BytesIO response and attaches a
-    JSON-encoded text response and truthfulness flag in the 'x-description' header.
+    Sends the encoded output JPEG (the bytes saved by save_output_image) and
+    attaches the verdict JSON-encoded in the 'x-description' header.
 
     Parameters:
-    - edited_image (Image.Image): The PIL image to be returned.
-    - text_response (str): The response text explaining the truthfulness of the statement.
-    - is_statement_true (bool): A boolean flag indicating whether the statement is true or false.
+    - output_bytes (bytes): The JPEG to be returned.
+    - description (dict): The verdict as returned by verdict_description().
+    - image_hash (str): Hash of the upload, sent as ETag like for cached results.
 
     Returns:
     - Flask response object containing the image and metadata.
     """
-    output = BytesIO()
-    edited_image.save(output, format='JPEG')
-    output.seek(0)
-
-    # Create JSON metadata
-    metadata = {
-        "text": text_response,
-        "is_statement_true": is_statement_true  # ✅ Include truthfulness flag
-    }
-
-    response = make_response(send_file(output, mimetype='image/jpeg'))
-    response.headers['x-description'] = json.dumps(metadata)
-
+    response = send_file(BytesIO(output_bytes), mimetype='image/jpeg', etag=image_hash or False)
+    response.headers['x-description'] = json.dumps(description)
     return response
 
-def create_and_commit_record(session, image_hash, input_path, output_path, extracted_text, truthfulness_response):
+def find_similar_claim(session, claim_embedding):
     """
-    Creates a new ImageRecord and saves it to the database.
+    Returns the verdict of the most similar previously checked claim if its
+    cosine similarity reaches config.CLAIM_SIMILARITY_THRESHOLD, otherwise None.
+    """
+    refresh_claim_index(session)
+    match = claim_index.search(claim_embedding, config.CLAIM_SIMILARITY_THRESHOLD)
+    if match is None:
+        return None
+    record_id, similarity = match
+    record = session.get(ImageRecord, record_id)
+    if record is None or not record.verdict:
+        return None
+    print(f"Reusing the verdict of record {record_id} (cosine similarity {similarity:.3f})")
+    return json.loads(record.verdict)
+
+def create_and_commit_record(session, image_hash, input_path, output_path, extracted_text, truthfulness_response,
+                             phash=None, verdict=None, claim_embedding=None):
+    """
+    Creates a new ImageRecord and saves it to the database. Its perceptual
+    hash and claim embedding are picked up by the next refresh_phash_index
+    and refresh_claim_index.
     """
     new_record = ImageRecord(
         hash=image_hash,
         input_image_path=input_path,
         output_image_path=output_path,
         extracted_text=extracted_text,
-        truthfulness_response=truthfulness_response
+        truthfulness_response=truthfulness_response,
+        phash=hash_to_hex(phash) if phash is not None else None,
+        verdict=json.dumps(verdict) if verdict is not None else None,
+        claim_embedding=ClaimIndex.encode(claim_embedding) if claim_embedding is not None else None
     )
     session.add(new_record)
     session.commit()
 
+def build_cached_response(record):
+    """
+    Sends the stored output image of a previously processed record straight
+    from disk (the WSGI server's file wrapper, e.g. sendfile() in gunicorn)
+    with its verdict. The image hash is the ETag and the file's modification
+    time Last-Modified; GET requests with a matching If-None-Match or
+    If-Modified-Since header get 304 Not Modified.
+    """
+    # Paths are stored relative to the working directory, send_file resolves them against the app root
+    response = send_file(
+        os.path.abspath(record.output_image_path),
+        mimetype='image/jpeg',
+        etag=record.hash,
+        max_age=config.RESULT_MAX_AGE
+    )
+    response.headers['x-description'] = json.dumps(record_description(record))
+    return response
+
+# Perceptual hashes of all processed images for near-duplicate lookup
+_session = Session()
+backfill_created_at(_session)
+backfill_phash(_session)
+refresh_phash_index(_session)
+_session.close()
+
+# Embeddings of all checked claims up to claim_index.last_id
+claim_index = ClaimIndex()
+claim_index_lock = threading.Lock()
+
+def import_claim_index_file(session, path):
+    """
+    Stores the embeddings of a claim index file written by earlier versions
+    with their records, then renames the file so it is imported only once.
+    """
+    embeddings = read_claim_index_file(path)
+    if not embeddings:
+        return
+    for record in session.query(ImageRecord).filter(ImageRecord.id.in_(list(embeddings))):
+        if record.claim_embedding is None:
+            record.claim_embedding = ClaimIndex.encode(embeddings[record.id])
+    session.commit()
+    os.replace(path, path + ".imported")
+    print(f"Imported {len(embeddings)} claims from {path}")
+
+def refresh_claim_index(session):
+    """
+    Adds the claim embeddings of records created since the last refresh to
+    the claim index, including records stored by other worker processes.
+    """
+    with claim_index_lock:
+        records = (
+            session.query(ImageRecord.id, ImageRecord.claim_embedding)
+            .filter(ImageRecord.id > claim_index.last_id, ImageRecord.claim_embedding.isnot(None))
+            .order_by(ImageRecord.id)
+        )
+        for record_id, embedding in records:
+            claim_index.add(ClaimIndex.decode(embedding), record_id)
+
+_session = Session()
+import_claim_index_file(_session, config.CLAIM_INDEX_FILE)
+refresh_claim_index(_session)
+_session.close()
+
 #######################################################
 # 3. Routes
 #######################################################
 
-@app.route('/process-image', methods=['POST'])
-def process_image():
+def lookup_processed_image(session, file_bytes: bytes):
     """
-    Receives an image via POST, performs OCR, queries ChatGPT for truthfulness,
-    edits the image, and returns the result.
+    Hashes the upload and looks for a previous result of the same image
+    (exact SHA-256) or a near-duplicate (perceptual hash).
+    Returns (image_hash, phash, record or None).
     """
-    session = Session()
-
-    # 1) Read the file and generate a hash
-    file = request.files['image']
-    file_bytes = file.read()
     image_hash = generate_image_hash(file_bytes)
 
-    # 2) Check if there's an existing record
     existing_record = retrieve_or_create_record(session, image_hash)
     if existing_record and os.path.exists(existing_record.output_image_path):
-        # Optional 2-second delay for debugging
-        time.sleep(2)
-
-        # Return previously processed image
-        with open(existing_record.output_image_path, "rb") as f:
-            output = BytesIO(f.read())
-        output.seek(0)
-
-        response = make_response(send_file(output, mimetype='image/jpeg'))
-        response.headers['x-description'] = json.dumps({"text": existing_record.truthfulness_response})
-        session.close()
-        return response
+        return image_hash, None, existing_record
     elif existing_record:
         # If record is found but file is missing, remove the record
         session.delete(existing_record)
         session.commit()
 
-    # 3) Save the input image
-    uploads_folder = '../uploads'
-    input_path = save_input_image(file_bytes, uploads_folder, image_hash)
+    # Re-encoded, resized or watermarked copies of a processed image
+    phash = dhash_bytes(file_bytes)
+    return image_hash, phash, find_near_duplicate(session, phash)
+
+def source_list(truthfulness_response):
+    """Titles and URLs of the sources cited by a verdict, in citation order."""
+    return [{"title": title, "url": url} for title, url in truthfulness_response.get("sources", {}).values()]
+
+def verdict_description(truthfulness_response):
+    """The 'x-description' of an output image: answer, truth flag, probabilities and sources."""
+    return {
+        "text": truthfulness_response.get("statement_analysis"),
+        "is_statement_true": truthfulness_response.get("is_likely_true"),
+        "probability_true": truthfulness_response.get("probability_true"),
+        "probability_false": truthfulness_response.get("probability_false"),
+        "probability_undecided": truthfulness_response.get("probability_undecided"),
+        "sources": source_list(truthfulness_response)
+    }
 
-    # 4) Perform OCR
-    extracted_text = perform_ocr(file_bytes)
-    print("Extracted text:", extracted_text)
+def record_description(record):
+    """verdict_description() of a stored record, only the answer text for records without a stored verdict."""
+    if record.verdict:
+        return verdict_description(json.loads(record.verdict))
+    return {"text": record.truthfulness_response, "is_statement_true": None}
 
-    # 5) Generate answer (via ChatGPT or future local LLM)
-    # ---- Pass FAISS objects & params ----
-    truthfulness_response = check_truth_with_chatgpt(
-        extracted_text=extracted_text,
-        faiss_index=faiss_index,           # Global from top-level load
-        embedding_model=embedding_model,   # Global from top-level load
-        all_chunks=all_chunks,
-        metadata=metadata,
-        normalise=normalise,
-        alpha=ALPHA,
-        selected_types=SELECTED_TYPES,
-        max_sources=5
-    )
+def verdict_event(truthfulness_response):
+    keys = ("statement_analysis", "probability_true", "probability_false", "probability_undecided", "is_likely_true")
+    return {key: truthfulness_response.get(key) for key in keys}
 
+def run_pipeline(session, file_bytes: bytes, image_hash: str, phash: int, ocr=None, on_event=None):
+    """
+    Runs OCR, the fact check and the image editing for a new upload, saves
+    the input and output images and the database record.
+    `ocr(function, image)` runs the OCR call, e.g. on a separate pool.
+    `on_event(event, data)` receives the intermediate results as they become
+    available: "ocr", "sources", "token" (pieces of the statement analysis)
+    and "verdict".
+    The upload is decoded once and the output encoded once (ImageContext).
+    Returns (output_bytes, output_path, truthfulness_response).
+    """
+    emit = on_event or (lambda event, data: None)
+    context = ImageContext(file_bytes)
 
+    # 3b) Save the input image
+    uploads_folder = config.UPLOADS_FOLDER
+    input_path = save_input_image(context, uploads_folder, image_hash)
+
+    # 4) Perform OCR
+    extracted_text = ocr(perform_ocr, context.image) if ocr else perform_ocr(context.image)
+    print("Extracted text:", extracted_text)
+    emit("ocr", {"text": extracted_text})
+    if config.RENDER_MIN_SIDE and context.is_jpeg:
+        # Don't hold the decoded upload during the fact check, the output
+        # image is decoded again from the JPEG in draft mode
+        context.release()
+
+    # 5) Reuse the verdict of a restated claim, or generate an answer (via ChatGPT or future local LLM).
+    # The whole step searches one index generation, even if a reload swaps in a new one meanwhile
+    with search_context.acquire() as search:
+        claim_embedding = None
+        truthfulness_response = None
+        if len(normalise_text(extracted_text)) >= config.CLAIM_MIN_CHARACTERS:
+            claim_embedding = search.embedding_model.encode(extracted_text)
+            truthfulness_response = find_similar_claim(session, claim_embedding)
+
+        if truthfulness_response is not None:
+            emit("sources", source_list(truthfulness_response))
+        else:
+            # ---- Pass FAISS objects & params ----
+            search_results = search_faiss.search_pdfs(
+                query=extracted_text,
+                index=search.faiss_index,
+                model=search.embedding_model,
+                chunks=search.all_chunks,
+                metadata=search.metadata,
+                normalise=search.normalise,
+                alpha=ALPHA,
+                publication_types=SELECTED_TYPES,
+                query_embedding=claim_embedding,
+                search_index=search.search_index
+            )
+            emit("sources", [
+                {"title": r["title"], "url": r["url"], "publication_date": r["publication_date"]}
+                for r in search_results[:5]
+            ])
+            truthfulness_response = check_truth_with_chatgpt(
+                extracted_text=extracted_text,
+                faiss_index=search.faiss_index,
+                embedding_model=search.embedding_model,
+                all_chunks=search.all_chunks,
+                metadata=search.metadata,
+                normalise=search.normalise,
+                alpha=ALPHA,
+                selected_types=SELECTED_TYPES,
+                max_sources=5,
+                search_results=search_results,
+                on_token=(lambda text: emit("token", {"text": text})) if on_event else None
+            )
+    emit("verdict", verdict_event(truthfulness_response))
 
     # 6) Edit the image
-    logo_path = 'logo.png'
-    edited_image = edit_image_with_logo_and_text(file_bytes, logo_path, truthfulness_response["is_likely_true"])
+    edited_image = edit_image_with_logo_and_text(
+        context.output_image(config.RENDER_MIN_SIDE), config.RENDER_LOGO_PATH, truthfulness_response["is_likely_true"]
+    )
+    context.release()
+    output_bytes = context.encode_output(edited_image)
+    del edited_image
 
     # 7) Save the output image
-    output_path = save_output_image(edited_image, uploads_folder, image_hash)
+    output_path = save_output_image(output_bytes, uploads_folder, image_hash)
 
     # 8) Create DB record
     create_and_commit_record(
@@ -268,41 +508,464 @@ def process_image():
         input_path,
         output_path,
         extracted_text,
-        truthfulness_response["statement_analysis"]
+        truthfulness_response["statement_analysis"],
+        phash,
+        verdict=truthfulness_response,
+        claim_embedding=claim_embedding
+    )
+
+    # 9) Gallery thumbnails, in the background
+    thumbnail_pipeline.submit(
+        [input_path, output_path], on_done=lambda paths: store_thumbnail_paths(image_hash, *paths)
     )
 
+    return output_bytes, output_path, truthfulness_response
+
+def search_context_unavailable_response(error):
+    response = jsonify({"error": str(error), **search_context.status()})
+    response.status_code = 503
+    response.headers['Retry-After'] = '10'
+    return response
+
+@app.route('/process-image', methods=['POST'])
+def process_image():
+    """
+    Receives an image via POST, performs OCR, queries ChatGPT for truthfulness,
+    edits the image, and returns the result.
+    """
+    session = Session()
+
+    # 1) Read the file, 2) check if there's an existing record
+    file_bytes = request.files['image'].read()
+    image_hash, phash, existing_record = lookup_processed_image(session, file_bytes)
+    if existing_record:
+        response = build_cached_response(existing_record)
+        session.close()
+        return response
+
+    # 3) New uploads need the search index, wait for it to finish loading
+    try:
+        search_context.wait(timeout=config.SEARCH_CONTEXT_TIMEOUT)
+    except SearchContextUnavailable as e:
+        session.close()
+        return search_context_unavailable_response(e)
+
+    output_bytes, _, truthfulness_response = run_pipeline(session, file_bytes, image_hash, phash)
+
     # 9) Build the Flask response
-    response = build_flask_image_response(edited_image, truthfulness_response["statement_analysis"], truthfulness_response["is_likely_true"])
+    response = build_flask_image_response(output_bytes, verdict_description(truthfulness_response), image_hash)
+    session.close()
+    return response
+
+#######################################################
+# 3A. Job API: enqueue uploads and poll for the result
+#######################################################
+
+job_queue = JobQueue(
+    max_workers=config.JOB_WORKERS,
+    max_pending=config.JOB_MAX_PENDING,
+    ocr_workers=config.JOB_OCR_WORKERS,
+    result_ttl=config.JOB_RESULT_TTL,
+    store=JobStore(config.JOB_STORE_URL)  # Shared by all worker processes, polls may land on any of them
+)
+
+def process_image_job(file_bytes: bytes, image_hash: str, phash: int, on_event=None):
+    """Pipeline of a queued upload, runs on the job pool."""
+    search_context.wait(timeout=config.SEARCH_CONTEXT_TIMEOUT)
+    session = Session()
+    try:
+        _, output_path, truthfulness_response = run_pipeline(
+            session, file_bytes, image_hash, phash, ocr=job_queue.run_ocr, on_event=on_event
+        )
+    finally:
+        session.close()
+    return {
+        "output_path": output_path,
+        "hash": image_hash,
+        "description": verdict_description(truthfulness_response)
+    }
+
+def job_status(job):
+    status = job.to_dict()
+    status["status_url"] = f"/process-image/jobs/{job.id}"
+    if job.status == DONE:
+        status["result_url"] = f"/process-image/jobs/{job.id}/result"
+        status["description"] = job.result["description"]
+    return status
+
+def complete_cached_job(record):
+    """Registers the stored result of a previously processed image as a finished job."""
+    return job_queue.complete({
+        "output_path": record.output_image_path,
+        "hash": record.hash,
+        "description": record_description(record)
+    })
+
+def queue_full_response(error):
+    response = jsonify({"error": str(error), **job_queue.metrics()})
+    response.status_code = 429
+    response.headers['Retry-After'] = '5'
+    return response
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/process-image/jobs', methods=['POST'])
+def submit_process_image_job():
+    """
+    Receives an image via POST and queues it for processing. Returns the job
+    status right away: 200 if the result is already known, 202 if queued,
+    429 if too many uploads are pending.
+    """
+    session = Session()
+    file_bytes = request.files['image'].read()
+    image_hash, phash, existing_record = lookup_processed_image(session, file_bytes)
+    session.close()
+
+    if existing_record:
+        job = complete_cached_job(existing_record)
+        return jsonify(job_status(job)), 200
+
+    try:
+        job = job_queue.submit(process_image_job, file_bytes, image_hash, phash)
+    except QueueFull as e:
+        return queue_full_response(e)
+    return jsonify(job_status(job)), 202
+
+@app.route('/process-image/jobs/<job_id>', methods=['GET'])
+def get_process_image_job(job_id):
+    """
+    Returns the job status. With ?wait=<seconds> (at most 30) the request
+    is held until the job finished or the time ran out (long polling).
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    wait = min(request.args.get('wait', default=0, type=float), 30)
+    if wait > 0:
+        job_queue.wait(job, wait)
+    return jsonify(job_status(job))
+
+@app.route('/process-image/jobs/<job_id>/events', methods=['GET'])
+def stream_process_image_job(job_id):
+    """Streams the job status as Server-Sent Events until the job finished."""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+
+    def generate():
+        status = job.status
+        yield sse_event("status", job_status(job))
+        while not job.finished:
+            status = job_queue.wait(job, 15, last_status=status)
+            yield sse_event("status", job_status(job))
+
+    return Response(generate(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+@app.route('/process-image/stream', methods=['POST'])
+def stream_process_image():
+    """
+    Receives an image via POST and streams the fact check as Server-Sent
+    Events while it runs: "status" (job ID) right away, then "ocr", "sources",
+    "token" pieces of the statement analysis as the LLM produces them,
+    "verdict" with the probabilities and finally "done" with the job status
+    and the URL of the output image.
+    """
+    session = Session()
+    file_bytes = request.files['image'].read()
+    image_hash, phash, existing_record = lookup_processed_image(session, file_bytes)
     session.close()
+
+    events = queue.Queue()
+    if existing_record:
+        job = complete_cached_job(existing_record)
+        events.put(("ocr", {"text": existing_record.extracted_text}))
+        if existing_record.verdict:
+            verdict = json.loads(existing_record.verdict)
+            events.put(("sources", source_list(verdict)))
+            events.put(("verdict", verdict_event(verdict)))
+        else:
+            events.put(("verdict", {"statement_analysis": existing_record.truthfulness_response}))
+        events.put(None)
+    else:
+        def run(file_bytes, image_hash, phash):
+            try:
+                return process_image_job(file_bytes, image_hash, phash,
+                                         on_event=lambda event, data: events.put((event, data)))
+            finally:
+                events.put(None)
+
+        try:
+            job = job_queue.submit(run, file_bytes, image_hash, phash)
+        except QueueFull as e:
+            return queue_full_response(e)
+
+    def generate():
+        yield sse_event("status", job_status(job))
+        while True:
+            item = events.get()
+            if item is None:
+                break
+            yield sse_event(*item)
+        job_queue.wait(job, config.SEARCH_CONTEXT_TIMEOUT)
+        yield sse_event("done", job_status(job))
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/process-image/jobs/<job_id>/result', methods=['GET'])
+def get_process_image_job_result(job_id):
+    """Returns the output image of a finished job with the x-description header."""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    if job.status == FAILED:
+        return jsonify(job_status(job)), 500
+    if job.status != DONE:
+        return jsonify(job_status(job)), 409
+
+    # Paths are stored relative to the working directory, send_file resolves them against the app root
+    response = send_file(
+        os.path.abspath(job.result["output_path"]),
+        mimetype='image/jpeg',
+        etag=job.result["hash"],
+        max_age=config.RESULT_MAX_AGE
+    )
+    response.headers['x-description'] = json.dumps(job.result["description"])
     return response
 
+@app.route('/results/<image_hash>', methods=['GET'])
+def get_result(image_hash):
+    """
+    Returns the output image of a processed upload by its SHA-256 hash with
+    the x-description header. The hash is the ETag: a matching If-None-Match
+    is answered with 304 Not Modified without touching the database or disk.
+    """
+    if image_hash in request.if_none_match:
+        response = Response(status=304)
+        response.set_etag(image_hash)
+        response.cache_control.public = True
+        response.cache_control.max_age = config.RESULT_MAX_AGE
+        return response
+
+    session = Session()
+    record = retrieve_or_create_record(session, image_hash)
+    session.close()
+    if record is None or not os.path.exists(record.output_image_path):
+        return jsonify({"error": "Unknown image"}), 404
+    return build_cached_response(record)
+
+@app.route('/api/job-metrics', methods=['GET'])
+def get_job_metrics():
+    """Queue depth, running and finished job counts of this worker process."""
+    return jsonify(job_queue.metrics())
+
 from flask import send_from_directory
 
+@app.route('/health/live', methods=['GET'])
+def liveness():
+    """Liveness probe: the web server is up, independent of the search index."""
+    return jsonify({"status": "alive"})
+
+@app.route('/health/ready', methods=['GET'])
+def readiness():
+    """Readiness probe: 200 once the embedding model and FAISS index are loaded, 503 before."""
+    search_context.refresh()  # Probes also bring idle workers to a requested generation
+    response = jsonify(search_context.status())
+    if not search_context.ready:
+        response.status_code = 503
+    return response
+
+def admin_allowed():
+    """
+    Admin routes need the bearer token config.ADMIN_TOKEN and are disabled
+    without one. The client address is no proof: behind a reverse proxy on
+    the same machine every request comes from 127.0.0.1.
+    """
+    if not config.ADMIN_TOKEN:
+        return False
+    return hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {config.ADMIN_TOKEN}")
+
+def reload_progress(generation, workers):
+    """"done" once every worker serves the generation, "failed" if it failed in one, else "loading"."""
+    if any(w["reload_generation"] == generation and w["reload_status"] == "failed" for w in workers):
+        return "failed"
+    if workers and all((w["generation"] or 0) >= generation for w in workers):
+        return "done"
+    return "loading"
+
+@app.route('/admin/search-index', methods=['GET'])
+def get_search_index():
+    """The search index generation requested and the one live in each worker process."""
+    if not admin_allowed():
+        return jsonify({"error": "Forbidden"}), 403
+    store = search_context.store
+    return jsonify({**search_context.status(), "requested_generation": store.requested(), "workers": store.workers()})
+
+@app.route('/admin/search-index/reload', methods=['POST'])
+def reload_search_index():
+    """
+    Requests a new search index generation (e.g. after ingest.py added
+    publications) from every worker process. Each one loads the index files
+    again, checks them and swaps them in without interrupting requests: this
+    one right away, the others on their next request or readiness probe
+    (config.SEARCH_INDEX_CHECK_INTERVAL). With ?wait=N the request waits up to
+    N seconds for all of them.
+
+    Returns 200 once every worker serves the new generation, 202 while they
+    are loading and 500 if it failed to load or validate in a worker (which
+    keeps its previous generation).
+    """
+    if not admin_allowed():
+        return jsonify({"error": "Forbidden"}), 403
+    store = search_context.store
+    generation = store.request()
+    search_context.refresh(force=True)
+
+    deadline = time.time() + min(request.args.get('wait', default=0, type=float), config.SEARCH_CONTEXT_TIMEOUT)
+    while True:
+        workers = store.workers()
+        progress = reload_progress(generation, workers)
+        if progress != "loading" or time.time() >= deadline:
+            break
+        time.sleep(0.2)
+    return jsonify({"generation": generation, "status": progress, "workers": workers}), \
+        {"done": 200, "failed": 500}.get(progress, 202)
+
 @app.route('/uploads/<filename>')
 def serve_uploaded_file(filename):
-    uploads_folder = "C:/Users/TE/Documents/20241108_climate_fake_filter/uploads"
-    return send_from_directory(uploads_folder, filename)
+    # File names contain the image hash, their content never changes
+    return send_from_directory(os.path.abspath(config.UPLOADS_FOLDER), filename, max_age=config.RESULT_MAX_AGE)
+
+@app.route('/thumbnails/<filename>')
+def serve_thumbnail(filename):
+    """
+    Serves a gallery thumbnail from the in-memory cache or disk. Thumbnails
+    are named after the image hash and never change, so clients may cache
+    them for config.THUMBNAIL_MAX_AGE without revalidating.
+    """
+    thumbnail = thumbnail_pipeline.read(filename)
+    if thumbnail is None:
+        return jsonify({"error": "Unknown thumbnail"}), 404
+    data, mime_type = thumbnail
+    response = Response(data, mimetype=mime_type)
+    response.set_etag(hashlib.md5(data).hexdigest())
+    response.cache_control.public = True
+    response.cache_control.max_age = config.THUMBNAIL_MAX_AGE
+    response.cache_control.immutable = True
+    return response.make_conditional(request)
+
+@app.route('/api/thumbnail-cache-stats', methods=['GET'])
+def get_thumbnail_cache_stats():
+    """Size and hit/miss counters of the in-memory thumbnail cache of this worker process."""
+    return jsonify(thumbnail_pipeline.cache.stats())
+
+@app.route('/api/verdict-cache-stats', methods=['GET'])
+def get_verdict_cache_stats():
+    """
+    Hit/miss counters of the verdict cache in this worker process and the
+    number of cached verdicts.
+    """
+    if ai_service.verdict_cache is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **ai_service.verdict_cache.stats()})
+
+@app.route('/api/llm-stats', methods=['GET'])
+def get_llm_stats():
+    """
+    Call, retry and token counters of the LLM client in this worker process,
+    latency percentiles of its recent calls and, with ?calls=N, the timings of
+    the last N calls.
+    """
+    stats = ai_service.llm.stats()
+    calls = request.args.get('calls', type=int)
+    if calls:
+        stats["recent_calls"] = ai_service.llm.recent_calls(min(calls, 1000))
+    return jsonify(stats)
+
+def encode_cursor(record) -> str:
+    """Opaque gallery cursor: position of the record in (created_at, id) order."""
+    return base64.urlsafe_b64encode(f"{record.created_at.isoformat()}|{record.id}".encode()).decode()
+
+def decode_cursor(cursor: str):
+    """(created_at, id) of a cursor, raises ValueError for malformed cursors."""
+    created_at, record_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+    return datetime.fromisoformat(created_at), int(record_id)
+
+def ensure_thumbnails(session, records):
+    """
+    Generates the missing thumbnails of the records once and stores their
+    paths: records from before the thumbnail pipeline, or whose thumbnails
+    are still being generated in the background.
+    """
+    changed = False
+    for record in records:
+        for image_column, thumbnail_column in (("input_image_path", "input_thumbnail_path"),
+                                               ("output_image_path", "output_thumbnail_path")):
+            image_path = getattr(record, image_column)
+            if getattr(record, thumbnail_column) is None and image_path and os.path.exists(image_path):
+                setattr(record, thumbnail_column, thumbnail_pipeline.make(image_path))
+                changed = True
+    if changed:
+        session.commit()
+
+def file_url(route: str, path: str):
+    return f"/{route}/{os.path.basename(path)}" if path else None
+
+def webp_thumbnail_url(path: str):
+    """URL of the WebP sibling of a JPEG thumbnail, None if WebP thumbnails are off."""
+    if not path or "webp" not in config.THUMBNAIL_FORMATS:
+        return None
+    return file_url("thumbnails", thumbnail_path(config.THUMBNAILS_FOLDER, path, "webp"))
+
+def gallery_item(record):
+    return {
+        "id": record.id,
+        "hash": record.hash,
+        "created_at": record.created_at.isoformat() + "Z",
+        "input": file_url("uploads", record.input_image_path),
+        "output": file_url("uploads", record.output_image_path),
+        "input_thumbnail": file_url("thumbnails", record.input_thumbnail_path),
+        "output_thumbnail": file_url("thumbnails", record.output_thumbnail_path),
+        "input_thumbnail_webp": webp_thumbnail_url(record.input_thumbnail_path),
+        "output_thumbnail_webp": webp_thumbnail_url(record.output_thumbnail_path),
+        "is_statement_true": record_description(record)["is_statement_true"]
+    }
 
 @app.route('/api/gallery-images', methods=['GET'])
 def get_gallery_images():
     """
-    Lists existing _input and _output image pairs from a known folder.
+    Lists processed images, newest first, one page at a time: ?limit=N (at
+    most config.GALLERY_MAX_PAGE_SIZE) and ?cursor=<next_cursor of the
+    previous page>. Served from the created_at index, so a page takes the
+    same time however many images exist.
     """
-    uploads_folder = 'C:/Users/TE/Documents/20241108_climate_fake_filter/uploads'
-    images = []
-
-    for filename in os.listdir(uploads_folder):
-        if filename.endswith('_input.jpg'):
-            base_name = filename.split('_input')[0]
-            input_image = os.path.join(uploads_folder, f"{base_name}_input.jpg")
-            output_image = os.path.join(uploads_folder, f"{base_name}_output.jpg")
-            if os.path.exists(output_image):
-                images.append({
-                    "input": f"/uploads/{base_name}_input.jpg",
-                    "output": f"/uploads/{base_name}_output.jpg"
-                })
+    limit = request.args.get('limit', default=config.GALLERY_PAGE_SIZE, type=int)
+    limit = min(max(limit, 1), config.GALLERY_MAX_PAGE_SIZE)
 
-    return jsonify(images)
+    session = Session()
+    try:
+        query = session.query(ImageRecord).filter(ImageRecord.created_at.isnot(None))
+        cursor = request.args.get('cursor')
+        if cursor:
+            try:
+                created_at, record_id = decode_cursor(cursor)
+            except ValueError:
+                return jsonify({"error": "Invalid cursor"}), 400
+            query = query.filter(or_(
+                ImageRecord.created_at < created_at,
+                and_(ImageRecord.created_at == created_at, ImageRecord.id < record_id)
+            ))
+        records = query.order_by(ImageRecord.created_at.desc(), ImageRecord.id.desc()).limit(limit + 1).all()
+        page = records[:limit]
+        ensure_thumbnails(session, page)
+        return jsonify({
+            # Records whose output image was deleted have no thumbnail
+            "images": [gallery_item(record) for record in page if record.output_thumbnail_path],
+            "next_cursor": encode_cursor(page[-1]) if len(records) > limit else None
+        })
+    finally:
+        session.close()
 
 if __name__ == '__main__':
     app.run(debug=True)
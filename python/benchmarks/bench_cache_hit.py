@@ -0,0 +1,107 @@
+# benchmarks/bench_cache_hit.py
+#
+# Latency of cache hits: re-uploads of a processed image to /process-image
+# and GET /results/<hash> with and without If-None-Match, over HTTP against
+# a local server. "previous" is the old build_cached_response (reading the
+# output JPEG into a BytesIO) without its 2 second sleep.
+#
+#   python benchmarks/bench_cache_hit.py --requests 500 --size 1170x2532
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from io import BytesIO
+
+import numpy as np
+import requests
+from PIL import Image
+from werkzeug.serving import make_server
+
+from bench_jobs import QuietRequestHandler
+from common import percentile_ms
+
+os.environ.setdefault("OPENAI_API_KEY", "mock")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def previous_cached_response(record):
+    from flask import make_response, send_file
+    with open(record.output_image_path, "rb") as f:
+        output = BytesIO(f.read())
+    output.seek(0)
+    response = make_response(send_file(output, mimetype='image/jpeg'))
+    response.headers['x-description'] = json.dumps({"text": record.truthfulness_response})
+    return response
+
+
+def measure(name, request, count):
+    with requests.Session() as session:
+        request(session)  # Connection set up
+        timings = []
+        for _ in range(count):
+            start = time.perf_counter()
+            response = request(session)
+            timings.append(time.perf_counter() - start)
+    print(f"{name:34s}: {response.status_code}  p50 {percentile_ms(timings, 50):6.2f} ms  "
+          f"p99 {percentile_ms(timings, 99):6.2f} ms  {len(response.content) / 1000:6.0f} kB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--size", default="1170x2532", help="Size of the upload and output image")
+    args = parser.parse_args()
+    size = tuple(int(x) for x in args.size.split("x"))
+
+    # The app keeps its database and uploads relative to the working directory
+    workdir = tempfile.mkdtemp()
+    os.makedirs(os.path.join(workdir, "uploads"))
+    os.makedirs(os.path.join(workdir, "python"))
+    os.chdir(os.path.join(workdir, "python"))
+
+    import app
+
+    pixels = np.random.default_rng(0).integers(0, 255, (size[1], size[0], 3), dtype=np.uint8)
+    upload = BytesIO()
+    Image.fromarray(pixels).save(upload, "JPEG")
+    upload = upload.getvalue()
+    image_hash = app.generate_image_hash(upload)
+    output_path = os.path.join("..", "uploads", f"{image_hash}_output.jpg")
+    Image.fromarray(pixels // 2).save(output_path, "JPEG")
+    verdict = {"statement_analysis": "False.", "sources": {"1": ["Report", "https://example.org/1"]},
+               "probability_true": 5, "probability_false": 90, "probability_undecided": 5, "is_likely_true": False}
+    session = app.Session()
+    app.create_and_commit_record(session, image_hash, None, output_path, "text", "False.", verdict=verdict)
+    session.close()
+
+    server = make_server("127.0.0.1", 0, app.app, threaded=True, request_handler=QuietRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    def post_upload(session):
+        return session.post(f"{base_url}/process-image", files={"image": ("upload.jpg", upload)})
+
+    def get_result(session):
+        return session.get(f"{base_url}/results/{image_hash}")
+
+    def revalidate(session):
+        return session.get(f"{base_url}/results/{image_hash}", headers={"If-None-Match": f'"{image_hash}"'})
+
+    print(f"Upload {len(upload) / 1000:.0f} kB, {args.requests} requests each")
+    current = app.build_cached_response
+    app.build_cached_response = previous_cached_response
+    measure("previous POST /process-image", post_upload, args.requests)
+    app.build_cached_response = current
+    measure("POST /process-image", post_upload, args.requests)
+    measure("GET /results/<hash>", get_result, args.requests)
+    measure("GET /results/<hash> If-None-Match", revalidate, args.requests)
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
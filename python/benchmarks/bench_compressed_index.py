@@ -0,0 +1,151 @@
+# benchmarks/bench_compressed_index.py
+#
+# Memory and recall of compressed FAISS indexes (SQ, PQ, IVF-PQ) against the
+# flat index, each searched on its own and re-ranked exactly against the
+# memory-mapped float16 vectors (config.VECTORS_FILE, see
+# search_faiss.rerank_exact). Recall@5 compares the results search_pdfs
+# returns (after the date weighting) with those of the flat index; recall@k
+# the FAISS_TOP_K candidates handed to the date weighting. The index size is
+# what every process keeps resident, the vectors file is mapped and only the
+# pages of re-ranked candidates are read.
+#
+# Queries are stored vectors held out of the indexes. Switch to a compressed
+# index by setting config.FAISS_INDEX_FACTORY and running
+# `python ingest.py --rebuild-index`.
+#
+#   python benchmarks/bench_compressed_index.py --model all-mpnet-base-v2
+#   python benchmarks/bench_compressed_index.py --synthetic 100000 --rerank-k 200 400 800
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+import numpy as np
+import faiss
+
+from common import PUBLICATION_TYPES, add_corpus_arguments, percentile_ms, synthetic_corpus
+from bench_faiss_index import clustered_vectors
+
+import config
+import search_faiss
+
+
+def load_corpus(args):
+    """(vectors, ids, chunks, metadata, normalise) of the real index, or of a synthetic corpus."""
+    if args.synthetic:
+        vectors = clustered_vectors(args.synthetic, args.dimension, max(1, args.synthetic // 100))
+        # Dimension 1: only the metadata and chunks of the synthetic corpus are used
+        _, _, chunks, metadata, _, _ = synthetic_corpus(args.synthetic, 1)
+        return vectors, np.arange(args.synthetic, dtype="int64"), chunks, metadata, False
+    search_index = search_faiss.load_search_index(args.model, args.metric)
+    index, chunks, metadata = search_index.faiss_index, search_index.chunks, search_index.metadata
+    if search_faiss.is_compressed_index(index):
+        raise SystemExit("The index is compressed, run the benchmark against a flat index")
+    vectors, ids = search_faiss.index_vectors(index)
+    return np.ascontiguousarray(vectors, dtype="float32"), ids, chunks, metadata, args.metric != "L2"
+
+
+def default_factories(size, dimension):
+    nlist = 1 << max(4, int(round(np.log2(4 * np.sqrt(size)))))
+    return ["SQ8", "SQ4", f"IVF{nlist},PQ{dimension // 4}", f"IVF{nlist},PQ{dimension // 8}"]
+
+
+def overlap(found, expected, k):
+    """Mean fraction of the first k expected chunk IDs among the first k found ones."""
+    hits = []
+    for row_found, row_expected in zip(found, expected):
+        row_expected = set(row_expected[:k])
+        if row_expected:
+            hits.append(len(row_expected & set(row_found[:k])) / len(row_expected))
+    return float(np.mean(hits))
+
+
+def search(search_index, queries, normalise, alpha):
+    """Chunk IDs of the search_pdfs results per query (config.SEARCH_RESULT_K of them) and seconds per query."""
+    found, timings = [], []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for query in queries:
+            start = time.perf_counter()
+            rows = search_faiss.search_pdfs_batch(
+                [""], search_index.faiss_index, None, search_index.chunks, search_index.metadata,
+                normalise=normalise, alpha=alpha, publication_types=PUBLICATION_TYPES,
+                query_embeddings=query.reshape(1, -1), search_index=search_index
+            )[0]
+            timings.append(time.perf_counter() - start)
+            found.append([row["chunk_id"] for row in rows])
+    return found, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_corpus_arguments(parser)
+    parser.add_argument("--factories", nargs="+", help="Compressed FAISS index factory strings, default SQ8, SQ4 and IVF-PQ")
+    parser.add_argument("--rerank-k", nargs="+", type=int, default=[config.FAISS_RERANK_K],
+                        help="Candidates re-ranked exactly (config.FAISS_RERANK_K)")
+    parser.add_argument("--queries", type=int, default=200, help="Stored vectors held out as queries")
+    parser.add_argument("--alpha", type=float, default=0.05, help="Date decay of the search, as the app uses it")
+    args = parser.parse_args()
+
+    vectors, ids, chunks, metadata, normalise = load_corpus(args)
+    rng = np.random.default_rng(1)
+    held_out = np.zeros(len(vectors), dtype=bool)
+    held_out[rng.choice(len(vectors), args.queries, replace=False)] = True
+    queries, base, base_ids = vectors[held_out], vectors[~held_out], ids[~held_out]
+    dimension = vectors.shape[1]
+
+    # The float16 vectors file, as ingest.py writes it
+    directory = tempfile.mkdtemp()
+    vectors_path = os.path.join(directory, config.VECTORS_FILE)
+    rows = np.zeros((len(metadata), dimension), dtype="float16")
+    rows[base_ids] = base
+    rows.tofile(vectors_path)
+    del rows
+    vectors_file = search_faiss.read_vectors_file(vectors_path, dimension)
+
+    # With the full candidate lists, the results of the flat index are the references
+    top_k = config.SEARCH_RESULT_K
+    flat = search_faiss.build_faiss_index(base, base_ids, "Flat")
+    flat_mb = len(faiss.serialize_index(flat)) / 1e6
+    metadata_index = search_faiss.MetadataIndex(metadata)
+    flat_search = search_faiss.SearchIndex(flat, chunks, metadata, metadata_index)
+    config.SEARCH_RESULT_K = config.FAISS_TOP_K
+    expected, _ = search(flat_search, queries, normalise, args.alpha)
+    config.SEARCH_RESULT_K = top_k
+    _, flat_timings = search(flat_search, queries, normalise, args.alpha)
+    del flat, flat_search
+
+    print(f"{len(base)} vectors ({dimension}-d), {len(queries)} queries, "
+          f"vectors file {os.path.getsize(vectors_path) / 1e6:.1f} MB (memory-mapped)\n")
+    print(f"{'index':18s} {'B/vector':>8s} {'index MB':>9s} {'smaller':>8s} {'re-rank':>8s} "
+          f"{f'recall@{top_k}':>9s} {f'recall@{config.FAISS_TOP_K}':>10s} {'p50 ms':>7s} {'p99 ms':>7s}")
+    print(f"{'Flat':18s} {4 * dimension:8d} {flat_mb:9.1f} {1:7.1f}x {'-':>8s} {1:9.3f} {1:10.3f} "
+          f"{percentile_ms(flat_timings, 50):7.2f} {percentile_ms(flat_timings, 99):7.2f}")
+
+    for factory in args.factories or default_factories(len(base), dimension):
+        index = search_faiss.build_faiss_index(base, base_ids, factory)
+        size_mb = len(faiss.serialize_index(index)) / 1e6
+        for rerank_k in [None] + args.rerank_k:
+            if rerank_k is not None:
+                config.FAISS_RERANK_K = rerank_k
+            search_index = search_faiss.SearchIndex(index, chunks, metadata, metadata_index,
+                                                    rerank_vectors=vectors_file if rerank_k is not None else None)
+            config.SEARCH_RESULT_K = config.FAISS_TOP_K
+            candidates, _ = search(search_index, queries, normalise, args.alpha)
+            config.SEARCH_RESULT_K = top_k
+            _, timings = search(search_index, queries, normalise, args.alpha)
+            print(f"{factory:18s} {search_faiss.index_code_size(index):8d} {size_mb:9.1f} {flat_mb / size_mb:7.1f}x "
+                  f"{rerank_k or '-':>8} {overlap(candidates, expected, top_k):9.3f} "
+                  f"{overlap(candidates, expected, config.FAISS_TOP_K):10.3f} "
+                  f"{percentile_ms(timings, 50):7.2f} {percentile_ms(timings, 99):7.2f}")
+        del index, search_index
+
+    del vectors_file
+    os.remove(vectors_path)
+    os.rmdir(directory)
+
+
+if __name__ == "__main__":
+    main()
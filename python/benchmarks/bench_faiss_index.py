@@ -0,0 +1,194 @@
+# benchmarks/bench_faiss_index.py
+#
+# Compares FAISS index structures built from the stored embeddings: Flat
+# (exact), IVF, HNSW and IVF-PQ, each over a sweep of its search parameter
+# (nprobe for IVF, efSearch for HNSW). For every setting it reports recall@k
+# against exact search and p50/p99 single-query latency, without and with the
+# publication-type IDSelector; per structure the build time and index size.
+#
+# Queries are stored vectors held out of the indexes. The winner is the
+# setting with the lowest filtered p50 whose recall reaches --target-recall
+# with and without the selector. --write-config stores it in config.py
+# (FAISS_INDEX_FACTORY, FAISS_NPROBE, FAISS_EF_SEARCH);
+# `python ingest.py --rebuild-index` converts the index files to the new
+# structure and initialize_search_index searches with the new parameters.
+#
+# Without the real index, --synthetic N builds clustered unit vectors (random
+# vectors without clusters are the worst case for IVF and HNSW).
+#
+#   python benchmarks/bench_faiss_index.py --model all-mpnet-base-v2 --write-config
+#   python benchmarks/bench_faiss_index.py --synthetic 100000 --types Report
+
+import argparse
+import json
+import re
+import time
+
+import numpy as np
+import faiss
+
+from common import PUBLICATION_TYPES, add_corpus_arguments, percentile_ms
+
+import config
+import search_faiss
+
+
+def clustered_vectors(size, dimension, clusters, seed=0):
+    """Unit vectors around `clusters` random centres, roughly like sentence embeddings of topics."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dimension)).astype("float32")
+    vectors = centres[rng.integers(0, clusters, size)] + rng.standard_normal((size, dimension)).astype("float32")
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def load_vectors(args):
+    """(vectors, ids, metadata) of the real index, or of a synthetic corpus."""
+    if args.synthetic:
+        vectors = clustered_vectors(args.synthetic, args.dimension, max(1, args.synthetic // 100))
+        metadata = [{"Publication Type": PUBLICATION_TYPES[i % len(PUBLICATION_TYPES)]} for i in range(args.synthetic)]
+        return vectors, np.arange(args.synthetic, dtype="int64"), metadata
+    search_index = search_faiss.load_search_index(args.model, args.metric)
+    index, metadata = search_index.faiss_index, search_index.metadata
+    if search_faiss.index_kind(index) != "flat":
+        print("The index is not flat, its vectors may be approximations")
+    vectors, ids = search_faiss.index_vectors(index)
+    return np.ascontiguousarray(vectors, dtype="float32"), ids, metadata
+
+
+def default_factories(size, dimension):
+    nlist = 1 << max(4, int(round(np.log2(4 * np.sqrt(size)))))
+    pq_m = next(m for m in (dimension // 8, dimension // 4, dimension // 2, dimension) if dimension % m == 0)
+    return ["Flat", f"IVF{nlist},Flat", "HNSW32", f"IVF{nlist},PQ{pq_m}"]
+
+
+def sweep(index, kind):
+    """(parameter name, values) searched for an index kind."""
+    if kind == "ivf":
+        nlist = faiss.extract_index_ivf(index).nlist
+        return "nprobe", [n for n in (1, 4, 8, 16, 32, 64, 128, 256) if n <= nlist]
+    if kind == "hnsw":
+        return "efSearch", [64, 128, 256, 512]
+    return None, [None]
+
+
+def recall(found, truth):
+    """Mean fraction of the exact neighbours (ignoring -1 padding) that were found."""
+    hits = []
+    for row_found, row_truth in zip(found, truth):
+        row_truth = set(row_truth[row_truth >= 0].tolist())
+        if row_truth:
+            hits.append(len(row_truth & set(row_found.tolist())) / len(row_truth))
+    return float(np.mean(hits))
+
+
+def single_query_timings(index, queries, k, params):
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query.reshape(1, -1), k, params=params)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def write_config(values, path=None):
+    """Replaces the values of config.py assignments, keeping their comments aligned."""
+    path = path or config.__file__
+    with open(path, "r", encoding="utf-8") as f:
+        lines = f.read().split("\n")
+    for i, line in enumerate(lines):
+        for name, value in values.items():
+            match = re.match(rf"^({name}\s*=\s*)(.*?)(\s+#.*)?$", line)
+            if match:
+                prefix, old, comment = match.group(1), match.group(2), match.group(3) or ""
+                new = json.dumps(value)
+                if comment:
+                    width = len(old) + len(comment) - len(comment.lstrip())
+                    new = new.ljust(width - 1) + " " + comment.lstrip()
+                lines[i] = prefix + new
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_corpus_arguments(parser)
+    parser.add_argument("--factories", nargs="+", help="FAISS index factory strings, default Flat, IVF, HNSW32 and IVF-PQ")
+    parser.add_argument("--queries", type=int, default=200, help="Stored vectors held out as queries")
+    parser.add_argument("--k", type=int, default=config.FAISS_TOP_K, help="Neighbours per query, as many as search_pdfs re-ranks")
+    parser.add_argument("--types", nargs="+", default=PUBLICATION_TYPES,
+                        help="Publication types of the filtered searches, default the ones the app searches")
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument("--threads", type=int, help="FAISS OpenMP threads")
+    parser.add_argument("--write-config", action="store_true", help="Store the winning structure and parameters in config.py")
+    args = parser.parse_args()
+    if args.threads:
+        faiss.omp_set_num_threads(args.threads)
+
+    vectors, ids, metadata = load_vectors(args)
+    rng = np.random.default_rng(1)
+    held_out = np.zeros(len(vectors), dtype=bool)
+    held_out[rng.choice(len(vectors), args.queries, replace=False)] = True
+    queries, base, base_ids = vectors[held_out], vectors[~held_out], ids[~held_out]
+
+    # The publication-type selector, as search_pdfs builds it
+    metadata_index = search_faiss.MetadataIndex(metadata)
+    mask = np.zeros(len(metadata), dtype=bool)
+    mask[metadata_index.ids_for(args.types)] = True
+    bitmap = np.packbits(mask, bitorder="little")
+    id_selector = faiss.IDSelectorBitmap(len(metadata), faiss.swig_ptr(bitmap))
+    print(f"{len(base)} vectors ({vectors.shape[1]}-d), {len(queries)} queries, k={args.k}, "
+          f"filter {args.types} keeps {mask[base_ids].mean():.1%}")
+
+    exact = search_faiss.build_faiss_index(base, base_ids, "Flat")
+    truth = exact.search(queries, args.k)[1]
+    truth_filtered = exact.search(queries, args.k, params=faiss.SearchParameters(sel=id_selector))[1]
+    del exact
+
+    results = []
+    print(f"\n{'index':22s} {'param':>14s} {'build s':>8s} {'MB':>8s} {'recall':>7s} {'p50 ms':>7s} {'p99 ms':>7s}"
+          f" {'filt. recall':>12s} {'p50 ms':>7s} {'p99 ms':>7s}")
+    for factory in args.factories or default_factories(len(base), vectors.shape[1]):
+        start = time.perf_counter()
+        index = search_faiss.build_faiss_index(base, base_ids, factory)
+        build_seconds = time.perf_counter() - start
+        size_mb = len(faiss.serialize_index(index)) / 1e6
+        kind = search_faiss.index_kind(index)
+        name, values = sweep(index, kind)
+
+        for value in values:
+            parameters = {"nprobe": value} if name == "nprobe" else {"ef_search": value} if name else {}
+            plain = search_faiss.index_search_parameters(kind, **parameters)
+            filtered = search_faiss.index_search_parameters(kind, id_selector, **parameters)
+            row = {
+                "factory": factory, "kind": kind, "param": name, "value": value,
+                "build_s": build_seconds, "size_mb": size_mb,
+                "recall": recall(index.search(queries, args.k, params=plain)[1], truth),
+                "recall_filtered": recall(index.search(queries, args.k, params=filtered)[1], truth_filtered),
+            }
+            timings = single_query_timings(index, queries, args.k, plain)
+            filtered_timings = single_query_timings(index, queries, args.k, filtered)
+            row.update(p50=percentile_ms(timings, 50), p99=percentile_ms(timings, 99),
+                       p50_filtered=percentile_ms(filtered_timings, 50), p99_filtered=percentile_ms(filtered_timings, 99))
+            results.append(row)
+            print(f"{factory:22s} {f'{name}={value}' if name else '':>14s} {build_seconds:8.1f} {size_mb:8.1f} "
+                  f"{row['recall']:7.3f} {row['p50']:7.2f} {row['p99']:7.2f} "
+                  f"{row['recall_filtered']:12.3f} {row['p50_filtered']:7.2f} {row['p99_filtered']:7.2f}")
+        del index
+
+    qualified = [r for r in results if min(r["recall"], r["recall_filtered"]) >= args.target_recall]
+    best = min(qualified, key=lambda r: r["p50_filtered"])
+    values = {"FAISS_INDEX_FACTORY": best["factory"]}
+    if best["param"] == "nprobe":
+        values["FAISS_NPROBE"] = best["value"]
+    elif best["param"] == "efSearch":
+        values["FAISS_EF_SEARCH"] = best["value"]
+    print(f"\nFastest filtered search with recall >= {args.target_recall}: "
+          + ", ".join(f"{key} = {json.dumps(value)}" for key, value in values.items()))
+    if args.write_config:
+        write_config(values)
+        print(f"Written to {config.__file__}, convert the index files with: python ingest.py --rebuild-index")
+
+
+if __name__ == "__main__":
+    main()
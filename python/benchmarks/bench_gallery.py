@@ -0,0 +1,79 @@
+# benchmarks/bench_gallery.py
+#
+# Latency and response size of /api/gallery-images for growing numbers of
+# processed images: the first page, a page deep in the gallery (following
+# cursors) and, for comparison, all records in one response as the previous
+# listing returned them.
+#
+#   python benchmarks/bench_gallery.py --records 100 1000 10000
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from PIL import Image
+
+from common import percentile_ms
+
+os.environ.setdefault("OPENAI_API_KEY", "mock")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def measure(client, url, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(url)
+        timings.append(time.perf_counter() - start)
+    assert response.status_code == 200, response.data
+    return percentile_ms(timings, 50), percentile_ms(timings, 99), len(response.data), response.get_json()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    # The app keeps its database and uploads relative to the working directory
+    workdir = tempfile.mkdtemp()
+    os.makedirs(os.path.join(workdir, "uploads"))
+    os.makedirs(os.path.join(workdir, "python"))
+    os.chdir(os.path.join(workdir, "python"))
+
+    import app
+
+    # All records share one image and its thumbnail, the benchmark measures the listing
+    image_path = os.path.join("..", "uploads", "image.jpg")
+    Image.new("RGB", (1170, 2532), "white").save(image_path)
+    client = app.app.test_client()
+    session = app.Session()
+    created = 0
+    for total in sorted(args.records):
+        session.bulk_insert_mappings(app.ImageRecord, [
+            {"hash": f"{i:064x}", "input_image_path": image_path, "output_image_path": image_path,
+             "input_thumbnail_path": image_path, "output_thumbnail_path": image_path,
+             "truthfulness_response": "False.", "created_at": app.utc_now()}
+            for i in range(created, total)
+        ])
+        session.commit()
+        created = total
+
+        p50, p99, size, page = measure(client, "/api/gallery-images", args.repeat)
+        cursor = page["next_cursor"]
+        for _ in range(min(20, total // app.config.GALLERY_PAGE_SIZE - 1)):
+            cursor = client.get(f"/api/gallery-images?cursor={cursor}").get_json()["next_cursor"]
+        deep_p50, deep_p99, _, _ = measure(client, f"/api/gallery-images?cursor={cursor}", args.repeat)
+        start = time.perf_counter()
+        everything = [app.gallery_item(record) for record in session.query(app.ImageRecord).all()]
+        all_ms = (time.perf_counter() - start) * 1000
+        print(f"{total:6d} records: first page p50 {p50:5.2f} ms p99 {p99:5.2f} ms ({size / 1000:.0f} kB)  "
+              f"deep page p50 {deep_p50:5.2f} ms p99 {deep_p99:5.2f} ms  "
+              f"all records {all_ms:7.1f} ms ({len(app.json.dumps(everything)) / 1000:.0f} kB)")
+    session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+# benchmarks/bench_image_pipeline.py
+#
+# Peak memory and CPU time of the image handling of one /process-image request
+# for large phone screenshots: the previous pipeline (the upload decoded and
+# converted in save_input_image, perform_ocr and edit_image_with_logo_and_text,
+# the output encoded in save_output_image and again for the response) against
+# the ImageContext pipeline (decoded once, encoded once) and the current one
+# (ImageContext, the decoded upload released after OCR, the output reduced
+# towards --min-side pixels, JPEGs decoded in draft mode, and rendered by
+# render.VerdictRenderer). Tesseract itself is left out, all variants run the
+# same OCR preprocessing.
+#
+# Every request runs in a fresh process. Its peak memory is the peak resident
+# set size (VmHWM, reset through /proc/self/clear_refs, Linux only) above the
+# resident set size at the start of the request.
+#
+#   python benchmarks/bench_image_pipeline.py --repeat 5
+#   python benchmarks/bench_image_pipeline.py --size 1290x2796 --min-side 1600
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image_context import ImageContext
+from ocr import prepare_image
+from render import VerdictRenderer
+
+PICS_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "pics")
+LOGO_PATH = os.path.join(os.path.dirname(__file__), "..", "logo.png")
+
+
+def screenshot(filename, size, fmt):
+    """A pic scaled to phone screenshot size, as PNG with alpha channel (as phones save them) or JPEG."""
+    with Image.open(os.path.join(PICS_DIR, filename)) as image:
+        image = image.convert("RGB").resize(size, Image.BICUBIC)
+    output = BytesIO()
+    if fmt == "png":
+        image.convert("RGBA").save(output, format="PNG", compress_level=1)
+    else:
+        image.save(output, format="JPEG", quality=90)
+    return output.getvalue()
+
+
+def overlay(image):
+    """The previous apply_grayscale_overlay_with_red_crosses and edit_image_with_logo_and_text."""
+    image.convert("L").convert("RGB")
+    edited = Image.blend(image, Image.new("RGB", image.size, "white"), 0.5)
+    draw = ImageDraw.Draw(edited)
+    for _ in range(2):
+        draw.line((0, 0, edited.width, edited.height), fill="red", width=20)
+        draw.line((0, edited.height, edited.width, 0), fill="red", width=20)
+    return edited
+
+
+def previous_pipeline(file_bytes, folder, min_side):
+    image = Image.open(BytesIO(file_bytes))
+    if image.mode == "RGBA":
+        image = image.convert("RGB")
+    image.save(os.path.join(folder, "input.jpg"), "JPEG")
+
+    prepare_image(Image.open(BytesIO(file_bytes)))
+
+    image = Image.open(BytesIO(file_bytes))
+    if image.mode == "RGBA":
+        image = image.convert("RGB")
+    edited = overlay(image)
+
+    edited.save(os.path.join(folder, "output.jpg"), "JPEG")
+    response = BytesIO()
+    edited.save(response, format="JPEG")
+    return response.getvalue()
+
+
+def context_pipeline(file_bytes, folder, min_side):
+    context = ImageContext(file_bytes)
+    with open(os.path.join(folder, "input.jpg"), "wb") as f:
+        f.write(context.input_jpeg())
+
+    prepare_image(context.image)
+
+    edited = overlay(context.image)
+    context.release()
+    output_bytes = context.encode_output(edited)
+    del edited
+    with open(os.path.join(folder, "output.jpg"), "wb") as f:
+        f.write(output_bytes)
+    return BytesIO(output_bytes).getvalue()
+
+
+def rendered_pipeline(file_bytes, folder, min_side):
+    renderer = VerdictRenderer(LOGO_PATH)
+    context = ImageContext(file_bytes)
+    with open(os.path.join(folder, "input.jpg"), "wb") as f:
+        f.write(context.input_jpeg())
+
+    prepare_image(context.image)
+    if min_side and context.is_jpeg:
+        context.release()
+
+    edited = renderer.render(context.output_image(min_side), is_likely_true=False)
+    context.release()
+    output_bytes = context.encode_output(edited)
+    del edited
+    with open(os.path.join(folder, "output.jpg"), "wb") as f:
+        f.write(output_bytes)
+    return BytesIO(output_bytes).getvalue()
+
+
+PIPELINES = {"previous": previous_pipeline, "context": context_pipeline, "rendered": rendered_pipeline}
+
+
+def memory_kb(field):
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+
+
+def measure(name, file_bytes, min_side, results):
+    with tempfile.TemporaryDirectory() as folder:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")  # Resets VmHWM to the current resident set size
+        before = memory_kb("VmRSS")
+        cpu, wall = time.process_time(), time.perf_counter()
+        PIPELINES[name](file_bytes, folder, min_side)
+        results.put({
+            "peak_mb": (memory_kb("VmHWM") - before) / 1024,
+            "cpu_ms": (time.process_time() - cpu) * 1000,
+            "wall_ms": (time.perf_counter() - wall) * 1000,
+        })
+
+
+def run(name, file_bytes, min_side, repeat):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    runs = []
+    for _ in range(repeat):
+        process = context.Process(target=measure, args=(name, file_bytes, min_side, results))
+        process.start()
+        runs.append(results.get())
+        process.join()
+    return {key: float(np.median([r[key] for r in runs])) for key in runs[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--size", default="1170x2532", help="Screenshot size, default: iPhone 13/14")
+    parser.add_argument("--pic", default="flat_earth.jpg")
+    parser.add_argument("--min-side", type=int, default=1000, help="RENDER_MIN_SIDE of the rendered variant, 0 for full size")
+    args = parser.parse_args()
+    size = tuple(int(x) for x in args.size.split("x"))
+
+    for fmt in ("png", "jpeg"):
+        file_bytes = screenshot(args.pic, size, fmt)
+        print(f"{fmt.upper()} {size[0]}x{size[1]} ({len(file_bytes) / 1e6:.1f} MB upload)")
+        for name in PIPELINES:
+            result = run(name, file_bytes, args.min_side or None, args.repeat)
+            print(f"    {name:9s}: peak +{result['peak_mb']:6.1f} MB  cpu {result['cpu_ms']:6.0f} ms  "
+                  f"wall {result['wall_ms']:6.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# benchmarks/bench_jobs.py
+#
+# Load test of the synchronous /process-image route against the job API
+# (/process-image/jobs + long polling). OCR and the fact check are replaced
+# by sleeps of configurable length, so the test measures how many uploads
+# the server completes per second while workers wait on slow stages.
+#
+# The server is limited to --server-workers concurrent requests, like a
+# gunicorn deployment with that many sync workers.
+#
+#   python benchmarks/bench_jobs.py --uploads 64 --concurrency 16 --server-workers 4
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import numpy as np
+import requests
+from PIL import Image
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+os.environ.setdefault("OPENAI_API_KEY", "mock")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class ConcurrencyLimit:
+    """WSGI middleware admitting at most `limit` requests at a time."""
+
+    def __init__(self, wsgi_app, limit):
+        self.wsgi_app = wsgi_app
+        self.slots = threading.BoundedSemaphore(limit)
+
+    def __call__(self, environ, start_response):
+        with self.slots:
+            # Consume streamed responses while holding the slot, as a sync worker would
+            return [b"".join(self.wsgi_app(environ, start_response))]
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def random_upload(seed):
+    """A noise image, so that no two uploads are (near-)duplicates."""
+    pixels = np.random.default_rng(seed).integers(0, 255, (240, 320, 3), dtype=np.uint8)
+    buffer = BytesIO()
+    Image.fromarray(pixels).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--uploads", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent clients")
+    parser.add_argument("--server-workers", type=int, default=4, help="Concurrent requests the server admits")
+    parser.add_argument("--ocr-seconds", type=float, default=0.3)
+    parser.add_argument("--llm-seconds", type=float, default=1.5)
+    args = parser.parse_args()
+
+    # The app keeps its database and uploads relative to the working directory
+    workdir = tempfile.mkdtemp()
+    os.makedirs(os.path.join(workdir, "uploads"))
+    os.makedirs(os.path.join(workdir, "python"))
+    os.chdir(os.path.join(workdir, "python"))
+
+    import app
+
+    def slow_ocr(image_bytes):
+        time.sleep(args.ocr_seconds)
+        return ""
+
+    def slow_check(**kwargs):
+        time.sleep(args.llm_seconds)
+        return {"statement_analysis": "False.", "sources": {}, "probability_true": 0,
+                "probability_false": 100, "probability_undecided": 0, "is_likely_true": False}
+
+    app.perform_ocr = slow_ocr
+    app.check_truth_with_chatgpt = slow_check
+    app.search_context.wait = lambda timeout=None: app.search_context
+
+    server = make_server(
+        "127.0.0.1", 0, ConcurrencyLimit(app.app, args.server_workers),
+        threaded=True, request_handler=QuietRequestHandler
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    def sync_upload(seed):
+        response = requests.post(f"{base_url}/process-image", files={"image": ("upload.jpg", random_upload(seed))})
+        assert response.status_code == 200, response.text
+
+    def job_upload(seed):
+        response = requests.post(f"{base_url}/process-image/jobs", files={"image": ("upload.jpg", random_upload(seed))})
+        assert response.status_code in (200, 202), response.text
+        status = response.json()
+        while status["status"] not in ("done", "failed"):
+            status = requests.get(f"{base_url}{status['status_url']}", params={"wait": 30}).json()
+        assert status["status"] == "done", status
+        assert requests.get(f"{base_url}{status['result_url']}").status_code == 200
+
+    print(f"\nuploads: {args.uploads}, clients: {args.concurrency}, server workers: {args.server_workers}, "
+          f"OCR {args.ocr_seconds}s + LLM {args.llm_seconds}s per upload")
+    for name, upload, offset in [("sync /process-image", sync_upload, 0), ("job API", job_upload, args.uploads)]:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(upload, range(offset, offset + args.uploads)))
+        elapsed = time.perf_counter() - start
+        print(f"{name:20s}: {elapsed:6.2f} s  {args.uploads / elapsed:6.2f} uploads/s")
+    print("job metrics:", app.job_queue.metrics())
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
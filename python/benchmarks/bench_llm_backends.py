@@ -0,0 +1,83 @@
+# benchmarks/bench_llm_backends.py
+#
+# Latency and throughput of check_truth_with_chatgpt with the OpenAI and the
+# Ollama backend. By default both run against local stand-ins (mock_openai and
+# mock_ollama, which simulate a slower local model with limited parallel
+# slots); pass --openai-url / --ollama-url to measure real servers.
+#
+#   python benchmarks/bench_llm_backends.py --statements 16
+#   python benchmarks/bench_llm_backends.py --ollama-url http://localhost:11434 --ollama-model llama3.2
+
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from common import STATEMENTS, percentile_ms
+from mock_openai import MockOpenAIServer
+from mock_ollama import MockOllamaServer
+from bench_llm_modes import sample_results
+
+os.environ.setdefault("OPENAI_API_KEY", "mock")
+import ai_service
+from ollama import OllamaBackend
+
+
+def check(statement, on_token=None):
+    return ai_service.check_truth_with_chatgpt(
+        statement, None, None, None, None, search_results=sample_results(), on_token=on_token
+    )
+
+
+def run_backend(name, backend, statements):
+    ai_service.llm = backend
+
+    latencies, first_text = [], []
+    for statement in statements:
+        start = time.perf_counter()
+        first = []
+        check(statement, on_token=lambda text: first or first.append(time.perf_counter() - start))
+        latencies.append(time.perf_counter() - start)
+        first_text.append(first[0] if first else latencies[-1])
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=backend.max_in_flight) as pool:
+        list(pool.map(check, statements))
+    throughput = len(statements) / (time.perf_counter() - start)
+
+    stats = backend.stats()
+    print(
+        f"{name:7s}: sequential p50 {percentile_ms(latencies, 50):6.0f} ms  p99 {percentile_ms(latencies, 99):6.0f} ms  "
+        f"first text p50 {percentile_ms(first_text, 50):5.0f} ms  "
+        f"concurrent ({backend.max_in_flight} in flight) {throughput:5.1f} statements/s  "
+        f"tokens/call {(stats['prompt_tokens'] + stats['completion_tokens']) / max(stats['calls'], 1):.0f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--statements", type=int, default=16)
+    parser.add_argument("--openai-url", default=None, help="OpenAI-compatible base URL, default: local mock")
+    parser.add_argument("--openai-model", default="gpt-4o-mini")
+    parser.add_argument("--ollama-url", default=None, help="Ollama server URL, default: local mock")
+    parser.add_argument("--ollama-model", default="llama3.2")
+    parser.add_argument("--ollama-parallel", type=int, default=4, help="Parallel slots (OLLAMA_NUM_PARALLEL)")
+    args = parser.parse_args()
+
+    ai_service.verdict_cache = None
+    statements = [STATEMENTS[i % len(STATEMENTS)] for i in range(args.statements)]
+    with ExitStack() as stack:
+        openai_url = args.openai_url or stack.enter_context(MockOpenAIServer()).base_url
+        ollama_url = args.ollama_url or stack.enter_context(MockOllamaServer(num_parallel=args.ollama_parallel)).server_url
+
+        run_backend("openai", ai_service.AsyncLLMClient(
+            api_key=os.environ["OPENAI_API_KEY"], model=args.openai_model, base_url=openai_url
+        ), statements)
+        run_backend("ollama", OllamaBackend(
+            model=args.ollama_model, server_url=ollama_url, max_in_flight=args.ollama_parallel
+        ), statements)
+
+
+if __name__ == "__main__":
+    main()
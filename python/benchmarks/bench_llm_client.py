@@ -0,0 +1,64 @@
+# benchmarks/bench_llm_client.py
+#
+# Throughput of AsyncLLMClient against the local mock OpenAI server, with
+# injected latency and 429 responses: statements/s and per-call latency for
+# sequential calls and for concurrent calls through the shared client.
+#
+#   python benchmarks/bench_llm_client.py --statements 40 --rate-limit-every 5
+
+import argparse
+import asyncio
+import time
+
+from common import STATEMENTS
+from mock_openai import MockOpenAIServer
+
+from llm_client import AsyncLLMClient
+
+
+def report(name, client, statements, elapsed):
+    stats = client.stats()
+    print(
+        f"{name:10s}: {statements / elapsed:6.1f} statements/s  "
+        f"latency p50 {stats['latency_seconds']['p50'] * 1000:6.0f} ms  "
+        f"p99 {stats['latency_seconds']['p99'] * 1000:6.0f} ms  "
+        f"total p99 {stats['total_seconds']['p99'] * 1000:6.0f} ms  "
+        f"retries {stats['retries']}  errors {stats['errors']}"
+    )
+
+
+async def run_concurrent(client, statements):
+    await asyncio.gather(*(client.complete("Fact check the statement.", s) for s in statements))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--statements", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.2, help="Mock server fixed latency per request in seconds")
+    parser.add_argument("--rate-limit-every", type=int, default=5, help="Answer every n-th request with 429")
+    parser.add_argument("--max-in-flight", type=int, default=8)
+    parser.add_argument("--requests-per-second", type=float, default=None)
+    args = parser.parse_args()
+
+    statements = [STATEMENTS[i % len(STATEMENTS)] for i in range(args.statements)]
+    with MockOpenAIServer(latency=args.latency, rate_limit_every=args.rate_limit_every) as server:
+        def make_client():
+            return AsyncLLMClient(api_key="mock", model="mock", base_url=server.base_url,
+                                  max_in_flight=args.max_in_flight, requests_per_second=args.requests_per_second,
+                                  backoff_base=0.1)
+
+        client = make_client()
+        start = time.perf_counter()
+        for statement in statements:
+            client.complete_sync("Fact check the statement.", statement)
+        report("sequential", client, args.statements, time.perf_counter() - start)
+
+        client = make_client()
+        start = time.perf_counter()
+        asyncio.run(run_concurrent(client, statements))
+        report("concurrent", client, args.statements, time.perf_counter() - start)
+        print(f"429 responses: {server.rate_limited}, peak server concurrency: {server.max_in_flight}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# benchmarks/bench_llm_modes.py
+#
+# Compares the "two_step" and "single" modes of check_truth_with_chatgpt
+# against a local mock OpenAI server: latency per statement and prompt tokens.
+#
+#   python benchmarks/bench_llm_modes.py --statements 20
+
+import argparse
+import os
+
+from common import STATEMENTS, percentile_ms, timed
+from mock_openai import MockOpenAIServer
+
+os.environ.setdefault("OPENAI_API_KEY", "mock")
+import ai_service
+
+
+def sample_results(max_sources=5):
+    """Search results with realistic 500 character snippets."""
+    return [
+        {
+            "title": f"Publication {i}",
+            "url": f"https://example.org/{i}",
+            "snippet": ("Lifecycle analysis of battery electric and diesel cars in Europe. " * 8)[:500],
+        }
+        for i in range(max_sources)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--statements", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.2, help="Mock server fixed latency per request in seconds")
+    args = parser.parse_args()
+
+    with MockOpenAIServer(latency=args.latency) as server:
+        ai_service.llm = ai_service.AsyncLLMClient(api_key="mock", model="mock", base_url=server.base_url)
+
+        for mode in ("two_step", "single"):
+            before = ai_service.llm.stats()
+            timings = []
+            for i in range(args.statements):
+                statement = STATEMENTS[i % len(STATEMENTS)]
+                response, elapsed = timed(
+                    ai_service.check_truth_with_chatgpt, statement, None, None, None, None,
+                    search_results=sample_results(), mode=mode
+                )
+                assert response["is_likely_true"] is False
+                timings.extend(elapsed)
+
+            after = ai_service.llm.stats()
+            calls = after["calls"] - before["calls"]
+            prompt_tokens = after["prompt_tokens"] - before["prompt_tokens"]
+            completion_tokens = after["completion_tokens"] - before["completion_tokens"]
+            print(
+                f"\n{mode:9s}: p50 {percentile_ms(timings, 50):7.0f} ms  p99 {percentile_ms(timings, 99):7.0f} ms  "
+                f"calls/statement {calls / args.statements:.0f}  "
+                f"prompt tokens/statement {prompt_tokens / args.statements:.0f}  "
+                f"completion tokens/statement {completion_tokens / args.statements:.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
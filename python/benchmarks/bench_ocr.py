@@ -0,0 +1,89 @@
+# benchmarks/bench_ocr.py
+#
+# OCR speed (ms/image, sequential and on a worker pool) and accuracy on the
+# sharepics in pics/, for plain pytesseract on the full upload (the previous
+# perform_ocr) and for OCREngine with preprocessing. Accuracy is the share of
+# words of the statement (ocr_ground_truth.json) found in the OCR output.
+#
+#   python benchmarks/bench_ocr.py --repeat 5 --workers 4
+#   python benchmarks/bench_ocr.py --scale 3   # phone screenshot resolution
+
+import argparse
+import json
+import os
+import re
+import time
+
+from PIL import Image
+
+from common import percentile_ms
+
+from ocr import OCREngine
+
+PICS_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "pics")
+GROUND_TRUTH_FILE = os.path.join(os.path.dirname(__file__), "ocr_ground_truth.json")
+
+
+def words(text):
+    return re.findall(r"[a-z0-9%#]+", text.lower().replace("’", "'"))
+
+
+def word_recall(expected, actual):
+    """Share of the expected words found in the OCR output (with multiplicity)."""
+    remaining = words(actual)
+    found = 0
+    for word in words(expected):
+        if word in remaining:
+            remaining.remove(word)
+            found += 1
+    return found / max(len(words(expected)), 1)
+
+
+def run(name, engine, images, ground_truth, repeat):
+    timings, recalls = [], {}
+    for filename, image in images.items():
+        for _ in range(repeat):
+            start = time.perf_counter()
+            text = engine.image_to_string(image)
+            timings.append(time.perf_counter() - start)
+        recalls[filename] = word_recall(ground_truth[filename], text)
+
+    batch = list(images.values()) * repeat
+    start = time.perf_counter()
+    engine.map(batch)
+    parallel_ms = (time.perf_counter() - start) / len(batch) * 1000
+
+    print(
+        f"{name:12s}: p50 {percentile_ms(timings, 50):6.0f} ms/image  p99 {percentile_ms(timings, 99):6.0f} ms  "
+        f"pool {parallel_ms:6.0f} ms/image  word recall {sum(recalls.values()) / len(recalls):.1%}"
+    )
+    for filename, recall in recalls.items():
+        print(f"    {filename:16s} {recall:.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=None, help="Pool size, default: number of CPU cores")
+    parser.add_argument("--lang", default="eng")
+    parser.add_argument("--scale", type=float, default=1.0, help="Resize the pics, e.g. 3 for phone screenshot sizes")
+    args = parser.parse_args()
+
+    with open(GROUND_TRUTH_FILE, encoding="utf-8") as f:
+        ground_truth = json.load(f)
+    images = {}
+    for filename in ground_truth:
+        with Image.open(os.path.join(PICS_DIR, filename)) as image:
+            image.load()
+            if args.scale != 1.0:
+                image = image.resize((round(image.width * args.scale), round(image.height * args.scale)), Image.BICUBIC)
+            images[filename] = image
+
+    print(f"Backend: {OCREngine().backend}")
+    run("unprocessed", OCREngine(lang=args.lang, workers=args.workers, preprocess=False), images, ground_truth, args.repeat)
+    run("grayscale", OCREngine(lang=args.lang, workers=args.workers, binarize=False), images, ground_truth, args.repeat)
+    run("binarized", OCREngine(lang=args.lang, workers=args.workers), images, ground_truth, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
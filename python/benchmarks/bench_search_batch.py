@@ -0,0 +1,44 @@
+# benchmarks/bench_search_batch.py
+#
+# Compares the throughput of search_pdfs called once per query with a single
+# search_pdfs_batch call over the same queries.
+#
+#   python benchmarks/bench_search_batch.py --queries 1000
+#   python benchmarks/bench_search_batch.py --queries 1000 --synthetic 50000
+
+import argparse
+
+from common import STATEMENTS, PUBLICATION_TYPES, add_corpus_arguments, load_corpus, timed
+
+import search_faiss
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_corpus_arguments(parser)
+    parser.add_argument("--queries", type=int, default=256, help="Number of statements to search")
+    parser.add_argument("--batch-size", type=int, default=64, help="Encoding batch size")
+    args = parser.parse_args()
+
+    search_index, model, normalise = load_corpus(args)
+    index, chunks, metadata = search_index.faiss_index, search_index.chunks, search_index.metadata
+    queries = [f"{STATEMENTS[i % len(STATEMENTS)]} ({i})" for i in range(args.queries)]
+    kwargs = dict(normalise=normalise, alpha=0.05, publication_types=PUBLICATION_TYPES, search_index=search_index)
+
+    _, loop_timings = timed(
+        lambda: [search_faiss.search_pdfs(q, index, model, chunks, metadata, **kwargs) for q in queries]
+    )
+    _, batch_timings = timed(
+        search_faiss.search_pdfs_batch, queries, index, model, chunks, metadata,
+        batch_size=args.batch_size, **kwargs
+    )
+
+    loop_qps = len(queries) / loop_timings[0]
+    batch_qps = len(queries) / batch_timings[0]
+    print(f"\nqueries: {len(queries)}, index size: {index.ntotal}, FAISS_TOP_K: {search_faiss.config.FAISS_TOP_K}")
+    print(f"per-query loop : {loop_timings[0]:8.3f} s  {loop_qps:10.1f} queries/s")
+    print(f"batch          : {batch_timings[0]:8.3f} s  {batch_qps:10.1f} queries/s  ({batch_qps / loop_qps:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
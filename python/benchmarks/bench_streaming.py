@@ -0,0 +1,58 @@
+# benchmarks/bench_streaming.py
+#
+# Time until the user sees the first words of the statement analysis, with
+# and without streaming, against a local mock OpenAI server.
+#
+#   python benchmarks/bench_streaming.py --statements 20
+
+import argparse
+import os
+import time
+
+from common import STATEMENTS, percentile_ms
+from mock_openai import MockOpenAIServer
+from bench_llm_modes import sample_results
+
+os.environ.setdefault("OPENAI_API_KEY", "mock")
+import ai_service
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--statements", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.2, help="Mock server fixed latency per request in seconds")
+    args = parser.parse_args()
+
+    ai_service.verdict_cache = None
+    with MockOpenAIServer(latency=args.latency) as server:
+        ai_service.llm = ai_service.AsyncLLMClient(api_key="mock", model="mock", base_url=server.base_url)
+
+        for mode in ("two_step", "single"):
+            for streaming in (False, True):
+                first_text, total = [], []
+                for i in range(args.statements):
+                    start = time.perf_counter()
+                    first = []
+
+                    def on_token(text):
+                        if not first:
+                            first.append(time.perf_counter() - start)
+
+                    response = ai_service.check_truth_with_chatgpt(
+                        STATEMENTS[i % len(STATEMENTS)], None, None, None, None,
+                        search_results=sample_results(), mode=mode, on_token=on_token if streaming else None
+                    )
+                    total.append(time.perf_counter() - start)
+                    # Without streaming the analysis is first visible with the full response
+                    first_text.append(first[0] if first else total[-1])
+                    assert response["is_likely_true"] is False
+
+                print(
+                    f"{mode:9s} {'streamed' if streaming else 'blocking':8s}: "
+                    f"first text p50 {percentile_ms(first_text, 50):6.0f} ms  p99 {percentile_ms(first_text, 99):6.0f} ms  "
+                    f"complete p50 {percentile_ms(total, 50):6.0f} ms"
+                )
+
+
+if __name__ == "__main__":
+    main()
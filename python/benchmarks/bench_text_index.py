@@ -0,0 +1,121 @@
+# benchmarks/bench_text_index.py
+#
+# Build time, size and query latency of the BM25 text index (text_index.py),
+# and the latency it adds to search_pdfs when its hits are fused with the
+# FAISS results (config.USE_TEXT_INDEX_FILE). The pruned search (MaxScore with
+# block-max skipping) is checked against exhaustive scoring of every posting
+# of the query terms.
+#
+# The synthetic corpus draws Zipf-distributed words from a vocabulary that
+# contains the words of the benchmark statements, so query terms range from
+# rare to very frequent like in the real chunks.
+#
+#   python benchmarks/bench_text_index.py --model all-mpnet-base-v2
+#   python benchmarks/bench_text_index.py --synthetic 50000 --dimension 768
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from common import STATEMENTS, PUBLICATION_TYPES, add_corpus_arguments, percentile_ms, synthetic_corpus
+
+import config
+import search_faiss
+from text_index import TextIndex, build_text_index, tokenize
+
+
+def synthetic_chunks(size, words_per_chunk, vocabulary_size=100000, seed=0):
+    """Chunks of Zipf-distributed words, the statements' words spread over the frequency ranks."""
+    rng = np.random.default_rng(seed)
+    statement_words = sorted({token for statement in STATEMENTS for token in tokenize(statement)})
+    vocabulary = np.array([f"term{i}" for i in range(vocabulary_size)], dtype=object)
+    vocabulary[rng.choice(np.arange(20, 20000), len(statement_words), replace=False)] = statement_words
+    p = 1 / np.arange(1, vocabulary_size + 1)
+    p /= p.sum()
+    return [" ".join(vocabulary[rng.choice(vocabulary_size, words_per_chunk, p=p)]) for _ in range(size)]
+
+
+def exhaustive_search(text_index, query, k, allowed):
+    """Scores every posting of the query terms, the baseline the pruned search is checked against."""
+    term_ids = {text_index.term_id(term) for term in tokenize(query)} - {None}
+    scores = np.zeros(len(text_index), dtype="float32")
+    for term_id in term_ids:
+        docs, term_scores = text_index.postings(term_id)
+        scores[docs] += term_scores
+    scores[~allowed] = 0
+    top = np.argsort(-scores, kind="stable")[:k]
+    top = top[scores[top] > 0]
+    return top, scores[top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_corpus_arguments(parser)
+    parser.add_argument("--words", type=int, default=config.CHUNK_SIZE, help="Words per synthetic chunk")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=config.TEXT_TOP_K, help="BM25 hits per query")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        index, model, _, metadata, normalise, _ = synthetic_corpus(args.synthetic, args.dimension)
+        chunks = synthetic_chunks(args.synthetic, args.words)
+    else:
+        search_index, model, normalise = search_faiss.initialize_search_index(args.model, args.metric)
+        index, chunks, metadata = search_index.faiss_index, search_index.chunks, search_index.metadata
+
+    path = os.path.join(tempfile.mkdtemp(), config.TEXT_INDEX_FILE)
+    start = time.perf_counter()
+    build_text_index(path, chunks, search_faiss.index_ids(index))
+    build_seconds = time.perf_counter() - start
+    text_index = TextIndex(path)
+    postings = int(text_index._posting_offsets[-1])
+    print(f"{len(chunks)} chunks, {text_index.terms} terms, {postings} postings: built in {build_seconds:.1f}s, "
+          f"{os.path.getsize(path) / 1e6:.1f} MB ({os.path.getsize(path) / max(postings, 1):.1f} bytes per posting)")
+
+    queries = [f"{STATEMENTS[i % len(STATEMENTS)]} {i}" for i in range(args.queries)]
+    metadata_index = search_faiss.MetadataIndex(metadata)
+    allowed = metadata_index.mask_for(PUBLICATION_TYPES)
+
+    pruned, exhaustive, mismatches = [], [], 0
+    for query in queries:
+        start = time.perf_counter()
+        ids, scores = text_index.search(query, args.k, allowed)
+        pruned.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        _, expected = exhaustive_search(text_index, query, args.k, allowed)
+        exhaustive.append(time.perf_counter() - start)
+        mismatches += not np.allclose(scores, expected, rtol=1e-3)
+
+    def search_pdfs_timings(search_index):
+        timings = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            for query in queries:
+                start = time.perf_counter()
+                search_faiss.search_pdfs(query, index, model, chunks, metadata, normalise=normalise,
+                                         alpha=0.05, publication_types=PUBLICATION_TYPES, search_index=search_index)
+                timings.append(time.perf_counter() - start)
+        return timings
+
+    dense = search_pdfs_timings(search_faiss.SearchIndex(index, chunks, metadata, metadata_index))
+    fused = search_pdfs_timings(search_faiss.SearchIndex(index, chunks, metadata, metadata_index, text_index=text_index))
+
+    print(f"\n{'':32s} {'p50 ms':>7s} {'p99 ms':>7s}")
+    for name, timings in [(f"BM25 top {args.k}, pruned", pruned), (f"BM25 top {args.k}, exhaustive", exhaustive),
+                          ("search_pdfs, FAISS only", dense), ("search_pdfs, FAISS + BM25 (RRF)", fused)]:
+        print(f"{name:32s} {percentile_ms(timings, 50):7.2f} {percentile_ms(timings, 99):7.2f}")
+    added = np.asarray(fused) - np.asarray(dense)
+    print(f"\nAdded per query: {percentile_ms(added, 50):.2f} ms (p50), "
+          f"pruned scores differ from exhaustive scoring for {mismatches} of {len(queries)} queries")
+
+    text_index.close()
+    os.remove(path)
+    os.rmdir(os.path.dirname(path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# benchmarks/common.py
+#
+# Shared setup for the benchmark scripts. Every benchmark either runs against
+# the real search index (initialize_search_index) or against a synthetic
+# corpus of random vectors, for machines without the embeddings or the model.
+
+import argparse
+import time
+import zlib
+
+import numpy as np
+import faiss
+
+import sys
+import os
+
+# setting path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import search_faiss
+
+
+PUBLICATION_TYPES = ['Briefing', 'Press Release', 'Unknown Type', 'Report', 'Letter',
+       'Opinion', 'News', 'Publication', 'Consultation response', 'Internal', 'Spreadsheet']
+
+STATEMENTS = [
+    "Electric vehicles emit more CO2 over their lifetime than diesel vehicles.",
+    "Biofuels are always carbon neutral.",
+    "Euro 7 standards will ban combustion engines in 2035.",
+    "Aviation accounts for less than 1% of global emissions.",
+    "Heat pumps do not work in cold climates.",
+    "Battery production makes EVs dirtier than petrol cars.",
+    "Shipping is already on track to meet the Paris Agreement.",
+    "Hydrogen cars are more efficient than battery electric cars.",
+]
+
+
+class HashingEncoder:
+    """
+    Deterministic stand-in for a SentenceTransformer in synthetic runs. It costs
+    almost nothing, so synthetic timings measure search and ranking only.
+    """
+
+    def __init__(self, dimension):
+        self.dimension = dimension
+
+    def encode(self, text, batch_size=32, **kwargs):
+        if isinstance(text, (list, tuple)):
+            return np.stack([self.encode(t) for t in text])
+        rng = np.random.default_rng(zlib.crc32(text.encode("utf-8")))
+        return rng.standard_normal(self.dimension).astype("float32")
+
+
+def synthetic_corpus(size, dimension, seed=0):
+    """Build a random flat L2 corpus with realistic metadata."""
+    rng = np.random.default_rng(seed)
+    embeddings = rng.standard_normal((size, dimension)).astype("float32")
+    index = faiss.IndexFlatL2(dimension)
+    index.add(embeddings)
+    months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+    metadata = [
+        {
+            "Title": f"Publication {i}",
+            "Publication Type": PUBLICATION_TYPES[i % len(PUBLICATION_TYPES)],
+            "Publication Date": f"{months[i % 12]} {1 + i % 28:02d}, {2010 + i % 15}, 10:00:00 AM",
+            "Article URL": f"https://example.org/{i}",
+            "PDF URL": f"https://example.org/{i}.pdf",
+        }
+        for i in range(size)
+    ]
+    chunks = [f"Synthetic chunk {i} about transport and energy policy." for i in range(size)]
+    return index, HashingEncoder(dimension), chunks, metadata, False, embeddings
+
+
+def add_corpus_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--model", default="all-mpnet-base-v2", help="Embedding model of the real index")
+    parser.add_argument("--metric", default="L2", help="Similarity metric of the real index")
+    parser.add_argument("--synthetic", type=int, default=0, metavar="N",
+                        help="Use a synthetic corpus of N random vectors instead of the real index")
+    parser.add_argument("--dimension", type=int, default=768, help="Vector dimension of the synthetic corpus")
+
+
+def load_corpus(args):
+    """
+    Return (search_index, model, normalise) for the benchmark, either from the
+    real search index or from a synthetic corpus.
+    """
+    if args.synthetic:
+        index, model, chunks, metadata, normalise, _ = synthetic_corpus(args.synthetic, args.dimension)
+        return search_faiss.SearchIndex(index, chunks, metadata), model, normalise
+    return search_faiss.initialize_search_index(args.model, args.metric)
+
+
+def timed(function, *args, repeat=1, **kwargs):
+    """Run function `repeat` times and return (last result, list of seconds per run)."""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        timings.append(time.perf_counter() - start)
+    return result, timings
+
+
+def percentile_ms(timings, q):
+    return float(np.percentile(np.asarray(timings) * 1000, q))
@@ -0,0 +1,92 @@
+# benchmarks/mock_ollama.py
+#
+# A local stand-in for an Ollama server: /api/chat and /api/generate with the
+# canned answers of the mock OpenAI server, streamed as one JSON object per
+# line. Like Ollama it processes at most `num_parallel` requests at once and
+# queues the rest.
+
+import re
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+
+from mock_openai import MockOpenAIServer, count_tokens
+
+
+class MockOllamaServer(MockOpenAIServer):
+    """
+    Serves POST /api/chat and /api/generate on a background thread.
+
+    Parameters:
+        latency (float): Fixed seconds per request (model loading and queueing).
+        prompt_token_latency (float): Seconds per prompt token (prefill).
+        completion_token_latency (float): Seconds per completion token (decoding).
+        num_parallel (int): Requests processed at once (OLLAMA_NUM_PARALLEL).
+    """
+
+    def __init__(self, latency=0.05, prompt_token_latency=0.0002, completion_token_latency=0.02, num_parallel=4,
+                 host="127.0.0.1", port=0):
+        super().__init__(latency, prompt_token_latency, completion_token_latency, host=host, port=port)
+        self._slots = threading.Semaphore(num_parallel)
+
+    @property
+    def server_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def answer(self, body):
+        if "prompt" in body:
+            return super().answer({"messages": [{"content": body["prompt"]}]})
+        response_format = {"type": "json_object"} if body.get("format") == "json" else None
+        return super().answer({**body, "response_format": response_format})
+
+    def _handler_class(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def write_line(self, data):
+                self.wfile.write(json.dumps(data).encode("utf-8") + b"\n")
+                self.wfile.flush()
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                chat = self.path == "/api/chat"
+                with mock._lock:
+                    mock.requests.append(body)
+
+                content = mock.answer(body)
+                prompt = " ".join(m["content"] for m in body["messages"]) if chat else body["prompt"]
+                prompt_tokens, completion_tokens = count_tokens(prompt), count_tokens(content)
+
+                def message(text):
+                    return {"message": {"role": "assistant", "content": text}} if chat else {"response": text}
+
+                final = {"model": body["model"], "done": True, "prompt_eval_count": prompt_tokens,
+                         "eval_count": completion_tokens}
+
+                with mock._slots:
+                    with mock._lock:
+                        mock.in_flight += 1
+                        mock.max_in_flight = max(mock.max_in_flight, mock.in_flight)
+                    try:
+                        time.sleep(mock.latency + prompt_tokens * mock.prompt_token_latency)
+                        self.send_response(200)
+                        self.send_header("Content-Type", "application/x-ndjson")
+                        self.end_headers()
+                        if body.get("stream", True):
+                            for piece in re.findall(r"\S+\s*", content):
+                                time.sleep(count_tokens(piece) * mock.completion_token_latency)
+                                self.write_line({"model": body["model"], "done": False, **message(piece)})
+                            self.write_line({**final, **message("")})
+                        else:
+                            time.sleep(completion_tokens * mock.completion_token_latency)
+                            self.write_line({**final, **message(content)})
+                    finally:
+                        with mock._lock:
+                            mock.in_flight -= 1
+
+        return Handler
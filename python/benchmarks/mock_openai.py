@@ -0,0 +1,184 @@
+# benchmarks/mock_openai.py
+#
+# A local stand-in for the OpenAI Chat Completions API. It answers with canned
+# fact-check responses, reports token usage (about 4 characters per token) and
+# simulates model latency proportional to the prompt and completion length.
+# Requests with "stream": true are answered word by word as Server-Sent Events.
+# It can also answer every n-th request with 429 Too Many Requests to exercise
+# client-side retries.
+
+import re
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+ANALYSIS = (
+    "The statement is false. Over their lifetime electric vehicles emit far less CO2 "
+    "than diesel vehicles, even when battery production is included (Source #1). "
+    "Corrected statement: Electric vehicles emit less CO2 over their lifetime than diesel vehicles."
+)
+PROBABILITIES = "- Probability True: 5%\n- Probability False: 90%\n- Probability Undecided: 5%"
+
+
+def count_tokens(text):
+    return max(1, len(text) // 4)
+
+
+class MockOpenAIServer:
+    """
+    Serves POST /v1/chat/completions on a background thread.
+
+    Parameters:
+        latency (float): Fixed seconds per request (network and queueing).
+        prompt_token_latency (float): Seconds per prompt token (prefill).
+        completion_token_latency (float): Seconds per completion token (decoding).
+        rate_limit_every (int): Answer every n-th request with 429, None to never.
+        retry_after (float): Retry-After header of 429 responses, None to omit it.
+    """
+
+    def __init__(self, latency=0.2, prompt_token_latency=0.00005, completion_token_latency=0.01,
+                 rate_limit_every=None, retry_after=None, host="127.0.0.1", port=0):
+        self.latency = latency
+        self.prompt_token_latency = prompt_token_latency
+        self.completion_token_latency = completion_token_latency
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.requests = []
+        self.rate_limited = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def answer(self, body):
+        """Returns the canned answer text for a chat completion request body."""
+        prompt = body["messages"][-1]["content"]
+        if (body.get("response_format") or {}).get("type") == "json_object":
+            return json.dumps({
+                "statement_analysis": ANALYSIS,
+                "probability_true": 5,
+                "probability_false": 90,
+                "probability_undecided": 5,
+            })
+        if "Probability True: XX%" in prompt:
+            return PROBABILITIES
+        return ANALYSIS
+
+    def _handler_class(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def send_json(self, status, payload, headers=()):
+                payload = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with mock._lock:
+                    mock.requests.append(body)
+                    limited = mock.rate_limit_every and len(mock.requests) % mock.rate_limit_every == 0
+                    if limited:
+                        mock.rate_limited += 1
+                    else:
+                        mock.in_flight += 1
+                        mock.max_in_flight = max(mock.max_in_flight, mock.in_flight)
+                if limited:
+                    headers = [("Retry-After", str(mock.retry_after))] if mock.retry_after is not None else []
+                    self.send_json(429, {"error": {"message": "Rate limit reached", "type": "requests",
+                                                   "code": "rate_limit_exceeded"}}, headers)
+                    return
+                try:
+                    self.complete(body)
+                finally:
+                    with mock._lock:
+                        mock.in_flight -= 1
+
+            def complete(self, body):
+                content = mock.answer(body)
+                prompt_tokens = sum(count_tokens(m["content"]) for m in body["messages"])
+                completion_tokens = count_tokens(content)
+                if body.get("stream"):
+                    self.stream(body, content, prompt_tokens, completion_tokens)
+                    return
+                time.sleep(
+                    mock.latency
+                    + prompt_tokens * mock.prompt_token_latency
+                    + completion_tokens * mock.completion_token_latency
+                )
+
+                self.send_json(200, {
+                    "id": "chatcmpl-mock",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", "mock"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens,
+                        "total_tokens": prompt_tokens + completion_tokens,
+                    },
+                })
+
+            def stream(self, body, content, prompt_tokens, completion_tokens):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                time.sleep(mock.latency + prompt_tokens * mock.prompt_token_latency)
+
+                def send_chunk(choices, usage=None):
+                    chunk = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()),
+                             "model": body.get("model", "mock"), "choices": choices, "usage": usage}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+
+                for piece in re.findall(r"\S+\s*", content):
+                    time.sleep(count_tokens(piece) * mock.completion_token_latency)
+                    send_chunk([{"index": 0, "delta": {"content": piece}, "finish_reason": None}])
+                send_chunk([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+                if (body.get("stream_options") or {}).get("include_usage"):
+                    send_chunk([], {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens,
+                        "total_tokens": prompt_tokens + completion_tokens,
+                    })
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+        return Handler
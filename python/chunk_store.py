@@ -0,0 +1,333 @@
+# Compact, memory-mapped storage for chunk texts and chunk metadata.
+#
+# A store file holds one or more string columns of equal length:
+#
+#   magic (8 bytes) | header position (uint64) | header length (uint64)
+#   segments, per column and write: offsets (uint64, rows + 1) | present flags (uint8, rows, padded) | UTF-8 blob
+#   JSON header | padding to 8 bytes
+#
+# The header maps each column name to its segments: the rows they hold and
+# their file positions. Appending rows writes new segments and a new header
+# after the end of the file and then points the file at that header, so an
+# ingest touches only the new rows and a crash before that last write leaves
+# the previous rows intact. Files written before segments existed (magic
+# CFFSTOR1, header at the start) are still read and are rewritten once on the
+# first append.
+#
+# Files are opened with mmap, so `chunks[i]` and `metadata[i]` only decode the
+# bytes of row i and the pages of unused chunks are never read into memory.
+#
+# Convert the existing JSON files with:
+#   python chunk_store.py embeddings/20250601_all-mpnet-base-v2/
+
+import os
+import json
+import mmap
+import bisect
+import argparse
+import numpy as np
+import config
+
+
+MAGIC = b"CFFSTOR2"
+MAGIC_V1 = b"CFFSTOR1"
+PREAMBLE_SIZE = 24
+CHUNK_COLUMN = "text"
+
+
+def _pad(length):
+    return (-length) % 8
+
+
+def _encode_segments(columns, count, position, first_row=0):
+    """
+    Encodes rows first_row ... first_row + count - 1 of the columns as one
+    segment per column, starting at file position `position`.
+    Returns (bytes sections, {column name: segment spec}).
+    """
+    sections = []
+    segments = {}
+
+    for name, values in columns.items():
+        if len(values) != count:
+            raise ValueError(f"Column {name!r} has {len(values)} rows, expected {count}")
+
+        encoding = "utf-8" if all(v is None or isinstance(v, str) for v in values) else "json"
+        encoded = [
+            b"" if v is None else (v if encoding == "utf-8" else json.dumps(v, ensure_ascii=False)).encode("utf-8")
+            for v in values
+        ]
+        lengths = np.fromiter((len(e) for e in encoded), dtype="<u8", count=count)
+        offsets = np.zeros(count + 1, dtype="<u8")
+        np.cumsum(lengths, out=offsets[1:])
+        present = np.fromiter((v is not None for v in values), dtype="u1", count=count)
+        blob = b"".join(encoded)
+
+        offsets_bytes = offsets.tobytes()
+        present_bytes = present.tobytes() + b"\0" * _pad(count)
+        segments[name] = {
+            "first_row": first_row,
+            "count": count,
+            "encoding": encoding,
+            "offsets": position,
+            "present": position + len(offsets_bytes),
+            "blob": position + len(offsets_bytes) + len(present_bytes),
+        }
+        sections.extend([offsets_bytes, present_bytes, blob, b"\0" * _pad(len(blob))])
+        position += len(offsets_bytes) + len(present_bytes) + len(blob) + _pad(len(blob))
+
+    return sections, segments
+
+
+def _encode_header(header):
+    header_bytes = json.dumps(header).encode("utf-8")
+    return header_bytes + b" " * _pad(len(header_bytes))
+
+
+def _preamble(header_position, header_length):
+    return np.array([header_position, header_length], dtype="<u8").tobytes()
+
+
+def write_column_store(path, columns, count):
+    """
+    Writes a store file with the given string columns.
+
+    Parameters:
+        path (str): Output file path.
+        columns (dict): Column name -> list of values (str, None for missing, or
+            any JSON value; columns with non-string values are stored as JSON).
+        count (int): Number of rows, every column must have this length.
+    """
+    sections, segments = _encode_segments(columns, count, PREAMBLE_SIZE)
+    header_position = PREAMBLE_SIZE + sum(len(section) for section in sections)
+    header_bytes = _encode_header({"count": count, "columns": {name: [segment] for name, segment in segments.items()}})
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(_preamble(header_position, len(header_bytes)))
+        for section in sections:
+            f.write(section)
+        f.write(header_bytes)
+    os.replace(tmp_path, path)
+
+
+def read_header(buffer):
+    """
+    Parses the header of a store file from its first bytes (a bytes-like
+    object or mmap). Returns (magic, header) with the segments of every column
+    at absolute file positions, for both file versions.
+    """
+    magic = bytes(buffer[:8])
+    if magic == MAGIC:
+        header_position, header_length = (int(v) for v in np.frombuffer(buffer, dtype="<u8", count=2, offset=8))
+        return magic, json.loads(bytes(buffer[header_position:header_position + header_length]).decode("utf-8"))
+    if magic == MAGIC_V1:
+        header_length = int(np.frombuffer(buffer, dtype="<u8", count=1, offset=8)[0])
+        header = json.loads(bytes(buffer[16:16 + header_length]).decode("utf-8"))
+        base = 16 + header_length
+        columns = {
+            name: [{
+                "first_row": 0,
+                "count": header["count"],
+                "encoding": spec["encoding"],
+                **{section: base + spec[section] for section in ("offsets", "present", "blob")},
+            }]
+            for name, spec in header["columns"].items()
+        }
+        return magic, {"count": header["count"], "columns": columns}
+    raise ValueError("Not a chunk store file")
+
+
+class StringColumn:
+    """Lazy, read-only view of one column of a store file."""
+
+    def __init__(self, buffer, count, segments):
+        self._buffer = buffer
+        self._count = count
+        self._first_rows = [segment["first_row"] for segment in segments]
+        self._segments = [
+            (
+                segment["first_row"],
+                segment["count"],
+                segment["encoding"] == "json",
+                np.frombuffer(buffer, dtype="<u8", count=segment["count"] + 1, offset=segment["offsets"]),
+                np.frombuffer(buffer, dtype="u1", count=segment["count"], offset=segment["present"]),
+                segment["blob"],
+            )
+            for segment in segments
+        ]
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError("column index out of range")
+        # Rows before the column's first segment or between segments are missing
+        s = bisect.bisect_right(self._first_rows, i) - 1
+        if s < 0:
+            return None
+        first_row, rows, is_json, offsets, present, blob = self._segments[s]
+        i -= first_row
+        if i >= rows or not present[i]:
+            return None
+        start = blob + int(offsets[i])
+        end = blob + int(offsets[i + 1])
+        value = self._buffer[start:end].decode("utf-8")
+        return json.loads(value) if is_json else value
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self[i]
+
+
+class ColumnStore:
+    """Memory-mapped store file, see the module docstring for the layout."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            _, header = read_header(self._mmap)
+        except ValueError:
+            raise ValueError(f"{path} is not a chunk store file") from None
+        self._count = header["count"]
+        self.columns = {
+            name: StringColumn(self._mmap, self._count, segments)
+            for name, segments in header["columns"].items()
+        }
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self[i]
+
+    def column(self, name):
+        """Returns the lazy column view for `name`, or None if no row has that key."""
+        return self.columns.get(name)
+
+    def close(self):
+        self.columns = {}
+        try:
+            self._mmap.close()
+        except BufferError:
+            # Views of the columns are still referenced, the map is released with them
+            pass
+
+
+class ChunkStore(ColumnStore):
+    """Chunk texts, `chunks[i]` decodes chunk i on access."""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._texts = self.columns[CHUNK_COLUMN]
+
+    def __getitem__(self, i):
+        return self._texts[i]
+
+
+class MetadataStore(ColumnStore):
+    """Columnar chunk metadata, `metadata[i]` decodes the metadata dict of chunk i on access."""
+
+    def __getitem__(self, i):
+        row = {}
+        for name, column in self.columns.items():
+            value = column[i]
+            if value is not None:
+                row[name] = value
+        return row
+
+
+def append_column_store(path, columns, count):
+    """
+    Appends rows to a store file, or creates it if it does not exist. Columns
+    missing on either side are None. Only the new rows are encoded and
+    written, after the end of the file (see the module docstring), the
+    appended rows get the indices len(store) ... len(store) + count - 1.
+    Readers that opened the file before keep seeing the previous rows.
+
+    Returns the number of rows in the store after appending.
+    """
+    for name, values in columns.items():
+        if len(values) != count:
+            raise ValueError(f"Column {name!r} has {len(values)} rows, expected {count}")
+    if not os.path.exists(path):
+        write_column_store(path, columns, count)
+        return count
+
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, header = read_header(buffer)
+        finally:
+            buffer.close()
+    existing_count = header["count"]
+
+    if magic == MAGIC_V1:
+        # Files of the first version keep their header in front, rewrite them once
+        store = ColumnStore(path)
+        existing = {name: list(column) for name, column in store.columns.items()}
+        store.close()
+        combined = {
+            name: existing.get(name, [None] * existing_count) + list(columns.get(name, [None] * count))
+            for name in dict.fromkeys([*existing, *columns])
+        }
+        write_column_store(path, combined, existing_count + count)
+        return existing_count + count
+
+    with open(path, "r+b") as f:
+        position = f.seek(0, os.SEEK_END)
+        position += _pad(position)
+        sections, segments = _encode_segments(columns, count, position, first_row=existing_count)
+        for name, segment in segments.items():
+            header["columns"].setdefault(name, []).append(segment)
+        header["count"] = existing_count + count
+        header_position = position + sum(len(section) for section in sections)
+        header_bytes = _encode_header(header)
+
+        f.write(b"\0" * _pad(f.tell()))
+        for section in sections:
+            f.write(section)
+        f.write(header_bytes)
+        f.flush()
+        os.fsync(f.fileno())
+        # The new rows only become visible with this last write
+        f.seek(8)
+        f.write(_preamble(header_position, len(header_bytes)))
+        f.flush()
+        os.fsync(f.fileno())
+    return existing_count + count
+
+
+def convert_json_files(metadata_file, chunk_file, metadata_store_file, chunk_store_file):
+    """Converts the JSON metadata and chunk files into store files."""
+    with open(chunk_file, "r", encoding="utf-8") as f:
+        chunks = json.load(f)
+    write_column_store(chunk_store_file, {CHUNK_COLUMN: chunks}, len(chunks))
+    del chunks
+
+    with open(metadata_file, "r", encoding="utf-8") as f:
+        metadata = json.load(f)
+    keys = list(dict.fromkeys(key for meta in metadata for key in meta))
+    columns = {key: [meta.get(key) for meta in metadata] for key in keys}
+    write_column_store(metadata_store_file, columns, len(metadata))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert JSON chunks and metadata into memory-mapped store files.")
+    parser.add_argument("directory", help="Embedding directory containing the JSON files, e.g. embeddings/20250601_all-mpnet-base-v2/")
+    args = parser.parse_args()
+
+    convert_json_files(
+        os.path.join(args.directory, config.METADATA_FILE),
+        os.path.join(args.directory, config.CHUNKS_FILE),
+        os.path.join(args.directory, config.METADATA_STORE_FILE),
+        os.path.join(args.directory, config.CHUNKS_STORE_FILE),
+    )
+    print(f"Wrote {config.CHUNKS_STORE_FILE} and {config.METADATA_STORE_FILE} to {args.directory}")
@@ -0,0 +1,90 @@
+# Semantic index of already checked claims.
+#
+# Many uploads restate the same claim in different words. Every checked claim
+# is embedded and added to a small FAISS inner-product index over normalised
+# vectors (cosine similarity) whose IDs are ImageRecord IDs. A new claim close
+# enough to a past one reuses that record's verdict.
+#
+# The embeddings are stored with their records (encode/decode), not in an
+# index file: every worker process keeps its own in-memory index and catches
+# up on the claims other workers stored by adding the records newer than
+# last_id, so adding a claim costs one row instead of rewriting the index.
+
+import os
+import threading
+import numpy as np
+import faiss
+
+
+class ClaimIndex:
+    """
+    Incrementally updated, in-memory FAISS index of claim embeddings keyed by
+    record ID. The index is created with the dimension of the first embedding
+    added. last_id is the highest record ID added.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+        self.last_id = 0
+
+    def __len__(self):
+        return self._index.ntotal if self._index is not None else 0
+
+    @staticmethod
+    def _prepare(embedding):
+        vector = np.array(embedding, dtype="float32").reshape(1, -1)
+        faiss.normalize_L2(vector)
+        return vector
+
+    @staticmethod
+    def encode(embedding) -> bytes:
+        """The normalised embedding as float32 bytes, as stored with the record."""
+        return ClaimIndex._prepare(embedding).tobytes()
+
+    @staticmethod
+    def decode(data: bytes):
+        """The embedding stored by encode."""
+        return np.frombuffer(data, dtype="float32")
+
+    def search(self, embedding, min_similarity):
+        """
+        Returns (record_id, cosine similarity) of the most similar past claim if
+        it reaches min_similarity, otherwise None.
+        """
+        vector = self._prepare(embedding)
+        with self._lock:
+            if self._index is None or self._index.ntotal == 0:
+                return None
+            if self._index.d != vector.shape[1]:
+                print(f"Claim index dimension {self._index.d} does not match embedding dimension {vector.shape[1]}")
+                return None
+            similarities, ids = self._index.search(vector, 1)
+        if ids[0][0] < 0 or similarities[0][0] < min_similarity:
+            return None
+        return int(ids[0][0]), float(similarities[0][0])
+
+    def add(self, embedding, record_id):
+        """Adds a claim embedding under record_id."""
+        vector = self._prepare(embedding)
+        with self._lock:
+            if self._index is None or self._index.d != vector.shape[1]:
+                if self._index is not None:
+                    print("Embedding dimension changed, starting a new claim index")
+                self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(vector.shape[1]))
+            self._index.add_with_ids(vector, np.array([record_id], dtype="int64"))
+            self.last_id = max(self.last_id, record_id)
+
+
+def read_claim_index_file(path):
+    """
+    Reads a claim index file written by earlier versions (a FAISS IndexIDMap2
+    of normalised embeddings). Returns {record_id: embedding}, empty if the
+    file does not exist.
+    """
+    if not os.path.exists(path):
+        return {}
+    index = faiss.read_index(path)
+    ids = faiss.vector_to_array(index.id_map)
+    vectors = faiss.downcast_index(index.index).reconstruct_n(0, index.ntotal)
+    return {int(record_id): vector for record_id, vector in zip(ids, vectors)}
@@ -1,6 +1,8 @@
 ### **`config.py`**
 # Configuration file for Internal Knowledge Database
 
+import os
+
 # Paths
 SCRAPING_OUTPUT_DIR           = r"C:\Users\TE\Documents\20250103_tande_publications\html"  # Directory to save fetched HTML files
 PUBLICATIONS_DIR              = r"C:\Users\TE\Documents\20250103_tande_publications\pdf"    # Directory to store downloaded PDFs
@@ -18,10 +20,99 @@ FAISS_INDEX_FILES = {
     "Cosine": r"faiss_index_cosine.bin"
 }
 
+FAISS_INDEX_FACTORY   = "Flat"                   # Structure of new and rebuilt indexes (FAISS index factory string), tuned with benchmarks/bench_faiss_index.py
+FAISS_NPROBE          = 16                       # Inverted lists an IVF index searches per query
+FAISS_EF_SEARCH       = 64                       # Candidate list size of HNSW searches
+FAISS_INDEX_LOAD_MODE = "mmap"                   # "mmap": map the index file read-only so worker processes share its pages, "memory": private copy per process
+SEARCH_CONTEXT_TIMEOUT = 120                     # Seconds a new upload waits for the background index load before getting a 503
+
 METADATA_FILE        = r"metadata.json"          # File to store document metadata
 CHUNKS_FILE          = r"chunks"
-USE_TEXT_INDEX_FILE  = True
+METADATA_STORE_FILE  = r"metadata.bin"           # Memory-mapped metadata store, see chunk_store.py
+CHUNKS_STORE_FILE    = r"chunks.bin"             # Memory-mapped chunk store, used instead of the JSON files if present
+VECTORS_FILE         = r"vectors_f16.bin"        # Float16 copy of the chunk embeddings (row = chunk ID), memory-mapped to re-rank compressed indexes
+USE_TEXT_INDEX_FILE  = True                      # Fuse BM25 keyword search (text_index.py) with the FAISS results in search_pdfs
+TEXT_INDEX_FILE      = r"text_index.bin"         # BM25 inverted index of the chunks, built by ingest.py or text_index.py, searches are FAISS only without it
 CHUNK_SIZE           = 500                       # Number of words per text chunk - This determines the context size vs granularity trade-off
-FAISS_TOP_K          = 5                         # Number of top results to retrieve
-SEARCH_RESULT_K      = 5
+FAISS_TOP_K          = 100                       # Number of FAISS candidates to re-rank by date weighting
+FAISS_RERANK_K       = 400                       # Candidates of a compressed index (PQ, SQ) re-ranked exactly against VECTORS_FILE, of which FAISS_TOP_K are kept
+TEXT_TOP_K           = 100                       # BM25 hits fused with the FAISS candidates
+RRF_K                = 60                        # Reciprocal rank fusion, a chunk scores the sum of 1 / (RRF_K + rank) over both rankings
+SEARCH_RESULT_K      = 5                         # Number of re-ranked results to return
+
+# Corpus ingestion (ingest.py)
+INGEST_MANIFEST_FILE = r"ingest_manifest.json"   # Fingerprints and chunk IDs of every ingested PDF, next to the index
+INGEST_WORKERS       = None                      # Processes extracting and chunking PDFs, None: number of CPU cores
+INGEST_BATCH_SIZE    = 256                       # Chunks per embedding model batch
+INGEST_FLUSH_ROWS    = 4096                      # Chunks embedded and added to the indexes at a time
+
+# Fact checking
+LLM_BACKEND          = "openai"                  # "openai" or "ollama" (local model)
+OPENAI_MODEL         = "gpt-4o-mini"
+OPENAI_BASE_URL      = None                      # None for api.openai.com, or a compatible server
+LLM_MAX_IN_FLIGHT    = 8                         # Concurrent requests to the LLM API
+LLM_REQUESTS_PER_SECOND = 5.0                    # Average request rate (token bucket), None for no limit
+LLM_BURST            = 10                        # Requests allowed at once before the rate limit applies
+LLM_MAX_RETRIES      = 4                         # Retries on 429, timeouts, connection errors and 5xx
+LLM_TIMEOUT          = 30                        # Seconds per request
+LLM_MAX_CONNECTIONS  = 20                        # Size of the shared HTTP connection pool
+OLLAMA_MODEL         = "llama3.2"
+OLLAMA_URL           = "http://localhost:11435"
+OLLAMA_MAX_IN_FLIGHT = 4                         # Concurrent requests, match the server's OLLAMA_NUM_PARALLEL
+LLM_CHECK_MODE       = "single"                  # "single": one JSON call for analysis and probabilities, "two_step": separate probability call
+
+# Verdict cache, reuses verdicts for the same claim text and retrieved chunks
+VERDICT_CACHE_ENABLED     = True
+VERDICT_CACHE_URL         = "sqlite:///verdict_cache.db"
+VERDICT_CACHE_TTL         = 30 * 24 * 3600       # Seconds until a cached verdict expires
+VERDICT_CACHE_MAX_ENTRIES = 10000                # Least recently used verdicts are evicted beyond this
+
+# Near-duplicate image lookup
+PHASH_MAX_DISTANCE        = 6                    # Max Hamming distance (of 64 bits) between dHashes treated as the same image
+
+# Semantic claim cache, reuses verdicts of restated claims
+CLAIM_INDEX_FILE           = r"claim_index.bin"  # Claim index file of earlier versions, imported into image_records on startup (see claim_index.py)
+CLAIM_SIMILARITY_THRESHOLD = 0.92                # Minimum cosine similarity to reuse a past verdict
+CLAIM_MIN_CHARACTERS       = 20                  # Shorter OCR texts are too ambiguous to match
+
+# OCR
+OCR_LANGUAGE              = "eng"                # Tesseract language(s), e.g. "eng+deu"
+OCR_TEXT_HEIGHT           = 40                   # Pixels text lines are scaled to before OCR
+OCR_MAX_PIXELS            = 4_000_000            # Upper bound for the image size passed to Tesseract
+OCR_BINARIZE              = False                # Otsu binarisation to dark text on white before OCR
+
+# Stored images, relative to the working directory (python/)
+UPLOADS_FOLDER            = "../uploads"         # Input and output images, named by the upload's hash
+THUMBNAILS_FOLDER         = "../uploads/thumbnails"
+
+# Gallery
+GALLERY_PAGE_SIZE         = 24                   # Images per page of /api/gallery-images
+GALLERY_MAX_PAGE_SIZE     = 100                  # Upper bound for ?limit=
+THUMBNAIL_SIZE            = 320                  # Longest side of gallery thumbnails in pixels
+THUMBNAIL_FORMATS         = ("webp", "jpeg")     # Written per thumbnail, JPEG always (fallback for old browsers)
+THUMBNAIL_WORKERS         = 1                    # Background threads generating thumbnails of new uploads
+THUMBNAIL_CACHE_BYTES     = 32 * 1024 * 1024     # In-memory LRU cache of the most requested thumbnail files
+THUMBNAIL_MAX_AGE         = 365 * 24 * 3600      # Cache-Control max-age of thumbnails (immutable, named by hash)
+
+# Output image
+RENDER_MIN_SIDE           = 1000                 # Output images are reduced by 1/2, 1/4 or 1/8 while their longest side stays above this, None: full size
+RENDER_LOGO_PATH          = "logo.png"           # Pasted into the bottom-right corner of every output image
+RENDER_CROSS_WIDTH        = 20                   # Line width of the red cross on false statements
+RESULT_MAX_AGE            = 24 * 3600            # Seconds clients may cache output images (Cache-Control max-age)
+
+# Database of the web app, created on first run. The DATABASE_URL environment variable overrides it (the tests use a temporary one)
+DATABASE_URL              = os.environ.get("DATABASE_URL", "sqlite:///image_records.db")
+
+# Admin API
+ADMIN_TOKEN               = None                 # Bearer token for /admin routes, None disables them
+
+# Search index reloads (see search_context.py)
+SEARCH_STATE_URL          = DATABASE_URL         # Requested and live index generations shared by all worker processes
+SEARCH_INDEX_CHECK_INTERVAL = 5                  # Seconds between checks of a worker for a requested reload
 
+# Job API for /process-image/jobs
+JOB_WORKERS               = 16                   # Pipelines running at once, mostly waiting on the LLM
+JOB_OCR_WORKERS           = None                 # Concurrent tesseract runs (warm workers with tesserocr), None: number of CPU cores
+JOB_MAX_PENDING           = 64                   # Queued + running jobs before new uploads get 429
+JOB_RESULT_TTL            = 600                  # Seconds finished jobs stay available for polling
+JOB_STORE_URL             = DATABASE_URL         # Job states shared by all worker processes (see jobs.py)
@@ -0,0 +1,94 @@
+# Request-scoped image state of one upload.
+#
+# The pipeline stages (saving the input, OCR, rendering, saving and sending the
+# output) all need the upload's pixels. ImageContext decodes the upload and
+# converts it to RGB once, on first use, and encodes the output image once; the
+# same JPEG bytes are written to disk and sent in the response.
+#
+# The output image needs less resolution than OCR. output_image() reduces the
+# decoded image by an integer factor, or, once it was released, decodes a JPEG
+# upload again in draft mode (the decoder scales by 1/2, 1/4 or 1/8 while
+# decoding, which is cheaper than a full decode).
+
+from io import BytesIO
+from PIL import Image
+
+
+JPEG_SIGNATURE = b"\xff\xd8\xff"
+
+
+def to_rgb(image: Image.Image) -> Image.Image:
+    """Converts modes JPEG can't store (RGBA, P, LA, CMYK, ...) to RGB."""
+    return image if image.mode == "RGB" else image.convert("RGB")
+
+
+def reduction_factor(size, min_side):
+    """The largest of 1, 2, 4 and 8 that keeps the longest side of an image at least min_side."""
+    factor = 1
+    while factor < 8 and max(size) // (factor * 2) >= min_side:
+        factor *= 2
+    return factor
+
+
+def encode_jpeg(image: Image.Image, quality: int = 75) -> bytes:
+    output = BytesIO()
+    image.save(output, format="JPEG", quality=quality)
+    return output.getvalue()
+
+
+class ImageContext:
+    """
+    Holds the bytes of an upload, its decoded RGB image (decoded on first
+    access of .image) and, once encode_output() was called, the encoded
+    output image.
+    """
+
+    def __init__(self, file_bytes: bytes):
+        self.file_bytes = file_bytes
+        self.output_bytes = None
+        self._image = None
+
+    @property
+    def image(self) -> Image.Image:
+        if self._image is None:
+            with Image.open(BytesIO(self.file_bytes)) as image:
+                image.load()
+                self._image = to_rgb(image)
+        return self._image
+
+    @property
+    def is_jpeg(self) -> bool:
+        return self.file_bytes[:3] == JPEG_SIGNATURE
+
+    def input_jpeg(self) -> bytes:
+        """The upload as JPEG, without re-encoding uploads that already are JPEGs."""
+        if self.is_jpeg:
+            return self.file_bytes
+        return encode_jpeg(self.image)
+
+    def output_image(self, min_side: int = None) -> Image.Image:
+        """
+        The upload as RGB image, reduced by 1/2, 1/4 or 1/8 as long as its
+        longest side stays at least min_side (None for full resolution).
+        Shares memory with .image when no reduction is needed.
+        """
+        if min_side is None:
+            return self.image
+        if self._image is None and self.is_jpeg:
+            with Image.open(BytesIO(self.file_bytes)) as image:
+                factor = reduction_factor(image.size, min_side)
+                image.draft("RGB", (image.width // factor, image.height // factor))
+                image.load()
+                return to_rgb(image)
+        factor = reduction_factor(self.image.size, min_side)
+        return self.image.reduce(factor) if factor > 1 else self.image
+
+    def encode_output(self, image: Image.Image, quality: int = 75) -> bytes:
+        """Encodes the output image once, later calls return the same bytes."""
+        if self.output_bytes is None:
+            self.output_bytes = encode_jpeg(image, quality)
+        return self.output_bytes
+
+    def release(self):
+        """Drops the decoded image so its memory is freed before the request ends."""
+        self._image = None
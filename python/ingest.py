@@ -0,0 +1,531 @@
+# Incremental corpus ingestion: adds new and changed publications to an
+# embedding directory without rebuilding it.
+#
+# Every PDF under config.PUBLICATIONS_DIR is fingerprinted (size, modification
+# time and SHA-256). The fingerprints and the chunk IDs of each PDF are kept in
+# a manifest next to the index (config.INGEST_MANIFEST_FILE), PDFs whose
+# content did not change are skipped. New PDFs are extracted and chunked in a
+# process pool, embedded in large batches and appended with add_with_ids to
+# every FAISS index of the directory; their chunks and metadata are appended to
+# the store files (see chunk_store.py). The vectors of changed and deleted PDFs
+# are removed from the indexes. Their rows stay in the stores, nothing points
+# to them any more.
+#
+# Chunk IDs are row numbers of the stores. An index built with add() is
+# converted to an IndexIDMap2 with the same IDs from its stored vectors (IVF
+# indexes map IDs themselves; HNSW can't delete, it is rebuilt without the
+# removed vectors). New indexes get the structure config.FAISS_INDEX_FACTORY,
+# --rebuild-index converts existing ones to it. A float16 copy of every
+# embedding (config.VECTORS_FILE, row = chunk ID) is kept next to the indexes,
+# compressed indexes (PQ, SQ) are re-ranked exactly against it and rebuilt
+# from it. The BM25 text index (config.TEXT_INDEX_FILE, see text_index.py) is
+# built again over the chunks of the ingested PDFs. The first run against a
+# directory without a manifest adopts the PDFs already in its metadata (by
+# their "file_name" or the file name of their "PDF URL").
+#
+#   python ingest.py --model all-mpnet-base-v2
+#   python ingest.py --model all-mpnet-base-v2 --publications-dir pdf/ --workers 8 --dry-run
+#   python ingest.py --model all-mpnet-base-v2 --rebuild-index
+
+import os
+import csv
+import json
+import time
+import hashlib
+import argparse
+import multiprocessing
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+
+import faiss
+import numpy as np
+from PyPDF2 import PdfReader
+
+import config
+import search_faiss
+from chunk_store import CHUNK_COLUMN, ChunkStore, ColumnStore, append_column_store, convert_json_files
+from text_index import build_text_index
+
+
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_fingerprint(path):
+    """Size, modification time and SHA-256 of a file."""
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime": stat.st_mtime, "sha256": file_sha256(path)}
+
+
+def list_pdfs(publications_dir):
+    """Paths of all PDFs under the publications directory relative to it, sorted."""
+    names = []
+    for root, _, filenames in os.walk(publications_dir):
+        for filename in filenames:
+            if filename.lower().endswith(".pdf"):
+                path = os.path.relpath(os.path.join(root, filename), publications_dir)
+                names.append(path.replace(os.sep, "/"))
+    return sorted(names)
+
+
+def id_ranges(ids):
+    """Sorted IDs as [start, stop) ranges of consecutive IDs."""
+    ranges = []
+    for i in ids:
+        if ranges and ranges[-1][1] == i:
+            ranges[-1][1] = i + 1
+        else:
+            ranges.append([i, i + 1])
+    return ranges
+
+
+def ids_from_ranges(ranges):
+    if not ranges:
+        return np.empty(0, dtype="int64")
+    return np.concatenate([np.arange(start, stop, dtype="int64") for start, stop in ranges])
+
+
+def load_manifest(path):
+    """The manifest's files (name -> fingerprint and chunk ID ranges), None if there is no manifest."""
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["files"]
+
+
+def save_manifest(path, files):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"files": files}, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def files_in_store(metadata_store_file):
+    """Chunk IDs of every PDF in a metadata store, by "file_name" or the file name of the "PDF URL"."""
+    store = ColumnStore(metadata_store_file)
+    file_names, urls = store.column("file_name"), store.column("PDF URL")
+    ids = {}
+    for i in range(len(store)):
+        name = file_names[i] if file_names is not None else None
+        if name is None and urls is not None and urls[i]:
+            name = urls[i].split("/")[-1]
+        if name:
+            ids.setdefault(name, []).append(i)
+    store.close()
+    return ids
+
+
+def plan_ingest(publications_dir, files, adopted=None):
+    """
+    Compares the PDFs on disk with the manifest's files.
+
+    Parameters:
+        publications_dir (str): Directory of the PDFs.
+        files (dict): Manifest entries of the PDFs ingested before.
+        adopted (dict): File name -> chunk IDs of PDFs in the stores without a
+            manifest entry, kept as they are if they are on disk.
+
+    Returns:
+        dict: "new", "changed" and "unchanged" lists of (name, manifest entry
+        without "ids" for new and changed PDFs) and the "removed" names.
+    """
+    names = list_pdfs(publications_dir)
+    plan = {"new": [], "changed": [], "unchanged": [], "removed": sorted(set(files) - set(names))}
+    for name in names:
+        path = os.path.join(publications_dir, name)
+        entry = files.get(name)
+        if entry is not None:
+            stat = os.stat(path)
+            # Size and modification time unchanged, no need to read the file
+            if stat.st_size == entry["size"] and stat.st_mtime == entry["mtime"]:
+                plan["unchanged"].append((name, entry))
+                continue
+            fingerprint = file_fingerprint(path)
+            if fingerprint["sha256"] == entry["sha256"]:
+                plan["unchanged"].append((name, {**entry, **fingerprint}))
+            else:
+                plan["changed"].append((name, fingerprint))
+            continue
+
+        adopted_ids = (adopted or {}).get(name, (adopted or {}).get(os.path.basename(name)))
+        if adopted_ids is not None:
+            plan["unchanged"].append((name, {**file_fingerprint(path), "ids": id_ranges(adopted_ids)}))
+        else:
+            plan["new"].append((name, file_fingerprint(path)))
+    return plan
+
+
+def extract_text_from_pdf(pdf_path):
+    """Returns the text of all pages of a PDF and its title (None if not set)."""
+    reader = PdfReader(pdf_path)
+    text = "\n".join(page.extract_text() or "" for page in reader.pages)
+    title = reader.metadata.title if reader.metadata else None
+    return text, title
+
+
+def chunk_text(text, chunk_size=None):
+    """Yields chunks of `chunk_size` (default config.CHUNK_SIZE) words."""
+    chunk_size = chunk_size or config.CHUNK_SIZE
+    words = text.split()
+    for start in range(0, len(words), chunk_size):
+        yield " ".join(words[start:start + chunk_size])
+
+
+def extract_and_chunk(pdf_path, chunk_size=None):
+    """Process pool worker: (chunks, title, error message or None) of one PDF."""
+    try:
+        text, title = extract_text_from_pdf(pdf_path)
+    except Exception as e:
+        return [], None, f"{type(e).__name__}: {e}"
+    return list(chunk_text(text, chunk_size)), title, None
+
+
+def load_publication_metadata(csv_path):
+    """Rows of the publications metadata CSV keyed by the file name of their "PDF URL"."""
+    if not csv_path or not os.path.exists(csv_path):
+        print(f"No publication metadata at {csv_path}, chunks get their PDF title only")
+        return {}
+    publications = {}
+    with open(csv_path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            row = {key: value for key, value in row.items() if key and value not in (None, "")}
+            if row.get("PDF URL"):
+                publications[row["PDF URL"].split("/")[-1]] = row
+    return publications
+
+
+def chunk_metadata(name, publication, title, count):
+    """Metadata entries of the `count` chunks of a PDF."""
+    entry = dict(publication) if publication else {"Title": title or os.path.splitext(os.path.basename(name))[0]}
+    return [{**entry, "file_name": name, "chunk_index": i} for i in range(count)]
+
+
+def appendable_index(index):
+    """
+    Returns the index in a form that takes add_with_ids and remove_ids. IVF
+    indexes map IDs themselves. Any other index built with add() is copied
+    into an IndexIDMap2 with IDs 0 ... ntotal - 1 (its vector positions).
+    """
+    if isinstance(index, faiss.IndexIDMap) or faiss.try_extract_index_ivf(index) is not None:
+        return index
+    vectors, ids = search_faiss.index_vectors(index)
+    inner = faiss.clone_index(index)
+    inner.reset()
+    id_map = faiss.IndexIDMap2(inner)
+    if len(ids):
+        id_map.add_with_ids(vectors, ids)
+    return id_map
+
+
+def remove_vectors(index, ids):
+    """
+    Removes the IDs from the index and returns it. Structures that can't
+    delete (HNSW) are rebuilt from their remaining vectors.
+    """
+    try:
+        index.remove_ids(ids)
+        return index
+    except RuntimeError:
+        vectors, all_ids = search_faiss.index_vectors(index)
+        keep = ~np.isin(all_ids, ids)
+        inner = faiss.clone_index(faiss.downcast_index(index.index))
+        inner.reset()
+        rebuilt = faiss.IndexIDMap2(inner)
+        rebuilt.add_with_ids(vectors[keep], all_ids[keep])
+        return search_faiss.configure_index(rebuilt)
+
+
+def vectors_source(indexes):
+    """The index to copy exact vectors from: the L2 index, or another uncompressed one, None if there is none."""
+    for metric in sorted(indexes, key=lambda metric: metric != "L2"):
+        index = indexes[metric]
+        if index is not None and not search_faiss.is_compressed_index(index):
+            return index
+    return None
+
+
+def write_vectors_file(path, index, rows):
+    """
+    Writes the float16 vectors file (config.VECTORS_FILE) from an uncompressed
+    index: row i holds the vector with ID i, rows of IDs not in the index
+    (removed chunks) are zero.
+    """
+    vectors, ids = search_faiss.index_vectors(index)
+    rows = max(rows, int(ids.max()) + 1 if len(ids) else 0)
+    array = np.zeros((rows, index.d), dtype="float16")
+    array[ids] = vectors
+    tmp_path = path + ".tmp"
+    array.tofile(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def append_vectors(path, embeddings, first_id):
+    """
+    Writes embeddings as float16 rows first_id, first_id + 1, ... of the
+    vectors file, dropping rows an interrupted run left behind. Rows before
+    first_id are never rewritten, so a search server mapping the file keeps
+    reading valid rows.
+    """
+    embeddings = np.asarray(embeddings, dtype="float16")
+    offset = first_id * 2 * embeddings.shape[1]
+    with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+        f.truncate(offset)
+        f.seek(offset)
+        f.write(embeddings.tobytes())
+
+
+def write_index(index, path):
+    tmp_path = path + ".tmp"
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def add_embeddings(indexes, model, texts, first_id, batch_size, vectors_file=None):
+    """
+    Embeds the texts and adds them with IDs first_id, first_id + 1, ... to
+    every index (metric -> index) and, if given, to the vectors file.
+    """
+    embeddings = np.asarray(
+        model.encode(texts, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False),
+        dtype="float32"
+    ).reshape(len(texts), -1)
+    ids = np.arange(first_id, first_id + len(texts), dtype="int64")
+    if vectors_file is not None:
+        append_vectors(vectors_file, embeddings, first_id)
+    for metric in indexes:
+        vectors = embeddings
+        if metric != "L2":
+            # Cosine indexes hold normalised vectors, like the queries searched against them
+            vectors = embeddings.copy()
+            faiss.normalize_L2(vectors)
+        if indexes[metric] is None:
+            indexes[metric] = faiss.IndexIDMap2(faiss.IndexFlatL2(vectors.shape[1]))
+        indexes[metric].add_with_ids(vectors, ids)
+
+
+def ingest(directory, model, publications_dir=None, metadata_csv=None, metrics=None,
+           workers=None, batch_size=None, flush_rows=None, dry_run=False):
+    """
+    Brings an embedding directory up to date with the PDFs in publications_dir.
+
+    Parameters:
+        directory (str): Embedding directory (index, store and manifest files).
+        model: The embedding model, anything with a SentenceTransformer-like encode().
+        publications_dir (str): PDFs to ingest, default config.PUBLICATIONS_DIR.
+        metadata_csv (str): Publication metadata, default config.PUBLICATIONS_METADATA_FILE.
+        metrics (list): Indexes to update (keys of config.FAISS_INDEX_FILES),
+            default all index files in the directory or all metrics for a new one.
+        workers (int): Processes extracting and chunking PDFs, default config.INGEST_WORKERS.
+        batch_size (int): Chunks per model.encode batch, default config.INGEST_BATCH_SIZE.
+        flush_rows (int): Chunks embedded and added at a time, default config.INGEST_FLUSH_ROWS.
+        dry_run (bool): Only compare the PDFs with the manifest.
+
+    Returns:
+        dict: Numbers of new, changed, removed, unchanged and failed PDFs, of
+        chunks added and chunk IDs removed, and the seconds taken.
+    """
+    start_time = time.time()
+    publications_dir = publications_dir or config.PUBLICATIONS_DIR
+    metadata_csv = metadata_csv or config.PUBLICATIONS_METADATA_FILE
+    workers = workers or config.INGEST_WORKERS or os.cpu_count()
+    batch_size = batch_size or config.INGEST_BATCH_SIZE
+    flush_rows = flush_rows or config.INGEST_FLUSH_ROWS
+
+    manifest_file = os.path.join(directory, config.INGEST_MANIFEST_FILE)
+    chunk_store_file = os.path.join(directory, config.CHUNKS_STORE_FILE)
+    metadata_store_file = os.path.join(directory, config.METADATA_STORE_FILE)
+    os.makedirs(directory, exist_ok=True)
+
+    # Appending works on the store files, convert the JSON files of a full build once
+    json_files = os.path.join(directory, config.METADATA_FILE), os.path.join(directory, config.CHUNKS_FILE)
+    has_stores = os.path.exists(chunk_store_file) and os.path.exists(metadata_store_file)
+    if not has_stores and all(os.path.exists(path) for path in json_files) and not dry_run:
+        print(f"Converting {config.METADATA_FILE} and {config.CHUNKS_FILE} to store files...")
+        convert_json_files(*json_files, metadata_store_file, chunk_store_file)
+        has_stores = True
+
+    stored_rows = 0
+    if os.path.exists(chunk_store_file):
+        store = ColumnStore(chunk_store_file)
+        stored_rows = len(store)
+        store.close()
+
+    previous = load_manifest(manifest_file)
+    adopted = None
+    if previous is None and os.path.exists(metadata_store_file):
+        adopted = files_in_store(metadata_store_file)
+    plan = plan_ingest(publications_dir, previous or {}, adopted)
+
+    summary = {key: len(plan[key]) for key in ("new", "changed", "removed", "unchanged")}
+    summary.update(failed=0, chunks_added=0, ids_removed=0)
+    print(f"{summary['new']} new, {summary['changed']} changed, {summary['removed']} removed "
+          f"and {summary['unchanged']} unchanged PDFs in {publications_dir}")
+    files = dict(plan["unchanged"])
+    if dry_run or not (plan["new"] or plan["changed"] or plan["removed"]):
+        if not dry_run and files != previous:
+            save_manifest(manifest_file, files)
+        summary["seconds"] = time.time() - start_time
+        return summary
+
+    # The indexes to update, new ones are created on the first embeddings
+    if metrics is None:
+        metrics = [m for m, f in config.FAISS_INDEX_FILES.items() if os.path.exists(os.path.join(directory, f))]
+        metrics = metrics or list(config.FAISS_INDEX_FILES)
+    indexes, created = {}, []
+    for metric in metrics:
+        index_file = os.path.join(directory, config.FAISS_INDEX_FILES[metric])
+        if os.path.exists(index_file):
+            indexes[metric] = appendable_index(faiss.read_index(index_file))
+        elif stored_rows:
+            raise ValueError(f"No {metric} index in {directory} for its {stored_rows} stored chunks")
+        else:
+            indexes[metric] = None
+            created.append(metric)
+
+    # Exact copy of the embeddings, created from the index of a directory that has none
+    vectors_file = os.path.join(directory, config.VECTORS_FILE)
+    if stored_rows and not os.path.exists(vectors_file):
+        source = vectors_source(indexes)
+        if source is None:
+            print(f"The indexes are compressed, no exact vectors to write {config.VECTORS_FILE} from")
+            vectors_file = None
+        else:
+            write_vectors_file(vectors_file, source, stored_rows)
+
+    # Drop the chunks of changed and deleted PDFs, their IDs are not reused
+    for name in [name for name, _ in plan["changed"]] + plan["removed"]:
+        ids = ids_from_ranges(previous[name]["ids"])
+        for metric in indexes:
+            indexes[metric] = remove_vectors(indexes[metric], ids)
+        summary["ids_removed"] += len(ids)
+
+    publications = load_publication_metadata(metadata_csv)
+    new_chunks, new_metadata = [], []
+    embedded = 0
+    to_extract = plan["new"] + plan["changed"]
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(workers, max(1, len(to_extract))), mp_context=context) as pool:
+        paths = [os.path.join(publications_dir, name) for name, _ in to_extract]
+        for (name, fingerprint), (chunks, title, error) in zip(to_extract, pool.map(extract_and_chunk, paths, repeat(config.CHUNK_SIZE))):
+            if error is not None:
+                # Not in the manifest, the next run retries it
+                print(f"Error extracting {name}: {error}")
+                summary["failed"] += 1
+                continue
+            first_id = stored_rows + len(new_chunks)
+            new_chunks.extend(chunks)
+            new_metadata.extend(chunk_metadata(name, publications.get(os.path.basename(name)), title, len(chunks)))
+            files[name] = {**fingerprint, "ids": [[first_id, first_id + len(chunks)]] if chunks else []}
+
+            # Embed while the pool extracts the next PDFs
+            if len(new_chunks) - embedded >= flush_rows:
+                add_embeddings(indexes, model, new_chunks[embedded:], stored_rows + embedded, batch_size, vectors_file)
+                embedded = len(new_chunks)
+                print(f"Embedded {embedded} chunks")
+    if len(new_chunks) > embedded:
+        add_embeddings(indexes, model, new_chunks[embedded:], stored_rows + embedded, batch_size, vectors_file)
+
+    # New indexes were filled as flat indexes, build them with the tuned structure
+    for metric in created:
+        if indexes[metric] is not None and config.FAISS_INDEX_FACTORY != "Flat":
+            indexes[metric] = search_faiss.build_faiss_index(*search_faiss.index_vectors(indexes[metric]))
+
+    # Stores first, then the indexes, then the manifest: every ID in an index has its row
+    if new_chunks:
+        append_column_store(chunk_store_file, {CHUNK_COLUMN: new_chunks}, len(new_chunks))
+        keys = list(dict.fromkeys(key for meta in new_metadata for key in meta))
+        append_column_store(metadata_store_file, {key: [meta.get(key) for meta in new_metadata] for key in keys}, len(new_metadata))
+    for metric, index in indexes.items():
+        if index is not None:
+            write_index(index, os.path.join(directory, config.FAISS_INDEX_FILES[metric]))
+    save_manifest(manifest_file, files)
+
+    # The BM25 text index covers the chunks of the ingested PDFs, build it again
+    if config.USE_TEXT_INDEX_FILE and os.path.exists(chunk_store_file):
+        chunks = ChunkStore(chunk_store_file)
+        build_text_index(os.path.join(directory, config.TEXT_INDEX_FILE), chunks,
+                         ids_from_ranges([r for entry in files.values() for r in entry["ids"]]))
+        chunks.close()
+
+    summary["chunks_added"] = len(new_chunks)
+    summary["seconds"] = time.time() - start_time
+    print(f"Added {len(new_chunks)} chunks and removed {summary['ids_removed']} in {summary['seconds']:.1f}s")
+    return summary
+
+
+def rebuild_indexes(directory, metrics=None, factory=None):
+    """
+    Rebuilds the index files of an embedding directory with the structure
+    config.FAISS_INDEX_FACTORY (tuned with benchmarks/bench_faiss_index.py)
+    from their vectors, keeping the chunk IDs. Nothing is embedded again.
+    The vectors file (config.VECTORS_FILE) is written first if missing;
+    compressed indexes (PQ, SQ) are rebuilt from it instead of their
+    approximations.
+    """
+    factory = factory or config.FAISS_INDEX_FACTORY
+    metrics = [m for m in metrics or list(config.FAISS_INDEX_FILES)
+               if os.path.exists(os.path.join(directory, config.FAISS_INDEX_FILES[m]))]
+
+    vectors_file = os.path.join(directory, config.VECTORS_FILE)
+    if not os.path.exists(vectors_file):
+        source = vectors_source({m: faiss.read_index(os.path.join(directory, config.FAISS_INDEX_FILES[m])) for m in metrics})
+        if source is not None:
+            chunk_store_file = os.path.join(directory, config.CHUNKS_STORE_FILE)
+            rows = 0
+            if os.path.exists(chunk_store_file):
+                store = ColumnStore(chunk_store_file)
+                rows = len(store)
+                store.close()
+            write_vectors_file(vectors_file, source, rows)
+            print(f"Wrote {vectors_file}")
+
+    for metric in metrics:
+        index_file = os.path.join(directory, config.FAISS_INDEX_FILES[metric])
+        start_time = time.time()
+        index = faiss.read_index(index_file)
+        vectors, ids = search_faiss.index_vectors(index)
+        if search_faiss.is_compressed_index(index) and os.path.exists(vectors_file):
+            vectors = np.ascontiguousarray(search_faiss.read_vectors_file(vectors_file, index.d)[ids], dtype="float32")
+            if metric != "L2":
+                faiss.normalize_L2(vectors)
+        index = search_faiss.build_faiss_index(vectors, ids, factory=factory)
+        write_index(index, index_file)
+        print(f"Rebuilt {index_file} as {factory} ({index.ntotal} vectors) in {time.time() - start_time:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Add new and changed publications to an embedding directory.")
+    parser.add_argument("--model", default="all-mpnet-base-v2", choices=sorted(config.EMBEDDING_MODELS))
+    parser.add_argument("--directory", help="Embedding directory, default the model's in config.EMBEDDING_MODELS")
+    parser.add_argument("--publications-dir", default=config.PUBLICATIONS_DIR)
+    parser.add_argument("--metadata-csv", default=config.PUBLICATIONS_METADATA_FILE)
+    parser.add_argument("--metric", action="append", choices=sorted(config.FAISS_INDEX_FILES),
+                        help="Index to update (repeatable), default all index files in the directory")
+    parser.add_argument("--workers", type=int, default=config.INGEST_WORKERS)
+    parser.add_argument("--batch-size", type=int, default=config.INGEST_BATCH_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="Only list what would be ingested")
+    parser.add_argument("--rebuild-index", action="store_true",
+                        help="Afterwards rebuild the indexes with the structure of config.FAISS_INDEX_FACTORY")
+    args = parser.parse_args()
+    directory = args.directory or config.EMBEDDING_MODELS[args.model]
+
+    model = None
+    if not args.dry_run:
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(args.model)
+
+    ingest(
+        directory, model,
+        publications_dir=args.publications_dir, metadata_csv=args.metadata_csv, metrics=args.metric,
+        workers=args.workers, batch_size=args.batch_size, dry_run=args.dry_run
+    )
+    if args.rebuild_index and not args.dry_run:
+        rebuild_indexes(directory, args.metric)
+
+
+if __name__ == "__main__":
+    main()
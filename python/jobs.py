@@ -0,0 +1,319 @@
+# Background job queue for the image processing pipeline.
+#
+# A request only enqueues the upload and returns a job ID, the pipeline runs on
+# a bounded thread pool. The stages are I/O bound from Python's point of view:
+# the LLM calls wait on the network, and pytesseract runs tesseract as a
+# subprocess, so OCR gets its own smaller pool sized to the CPU cores while
+# the pipeline pool can hold many jobs waiting on the LLM.
+#
+# A job runs in the worker process that accepted it, but with a JobStore its
+# state is also written to a database shared by all worker processes: a poll
+# that lands on another gunicorn worker reads the job from there, and jobs
+# left unfinished by a worker that died are reported as failed instead of
+# disappearing.
+
+import os
+import json
+import time
+import uuid
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine, Column, String, Float, Text
+from sqlalchemy.orm import sessionmaker, declarative_base
+
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class QueueFull(Exception):
+    """Raised when the number of unfinished jobs reached the limit."""
+
+
+def process_owner():
+    """"host:pid" of this process, read per job since preloading servers fork after import."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class Job:
+    def __init__(self, job_id, owner=None):
+        self.id = job_id
+        self.owner = owner or process_owner()  # Worker process running the job
+        self.status = QUEUED
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED)
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "queued_seconds": round((self.started_at or time.time()) - self.created_at, 3),
+            "run_seconds": round((self.finished_at or time.time()) - self.started_at, 3) if self.started_at else None,
+            "error": self.error,
+        }
+
+
+Base = declarative_base()
+
+class JobRecord(Base):
+    __tablename__ = 'jobs'
+    id = Column(String, primary_key=True)
+    owner = Column(String)
+    status = Column(String)
+    created_at = Column(Float)
+    started_at = Column(Float)
+    finished_at = Column(Float, index=True)
+    result = Column(Text)  # JSON
+    error = Column(Text)
+
+
+def owner_alive(owner):
+    """
+    Whether the worker process "host:pid" still runs. Processes on other
+    hosts can't be checked and count as alive.
+    """
+    host, _, pid = owner.rpartition(":")
+    if host != socket.gethostname():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, ValueError):
+        return True
+    return True
+
+
+class JobStore:
+    """
+    Job states in a database shared by all worker processes (SQLite by
+    default). Results must be JSON serialisable.
+    """
+
+    def __init__(self, database_url):
+        self.engine = create_engine(database_url)
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+
+    def save(self, job):
+        session = self.Session()
+        try:
+            session.merge(JobRecord(
+                id=job.id, owner=job.owner, status=job.status, created_at=job.created_at,
+                started_at=job.started_at, finished_at=job.finished_at,
+                result=json.dumps(job.result) if job.result is not None else None, error=job.error
+            ))
+            session.commit()
+        finally:
+            session.close()
+
+    def load(self, job_id):
+        """Returns the stored job, or None if it is unknown or expired."""
+        session = self.Session()
+        try:
+            record = session.get(JobRecord, job_id)
+        finally:
+            session.close()
+        if record is None:
+            return None
+        job = Job(record.id, record.owner)
+        job.status = record.status
+        job.created_at = record.created_at
+        job.started_at = record.started_at
+        job.finished_at = record.finished_at
+        job.result = json.loads(record.result) if record.result is not None else None
+        job.error = record.error
+        return job
+
+    def purge(self, cutoff):
+        """Deletes the jobs finished before `cutoff`."""
+        session = self.Session()
+        try:
+            session.query(JobRecord).filter(JobRecord.finished_at < cutoff).delete(synchronize_session=False)
+            session.commit()
+        finally:
+            session.close()
+
+    def fail_orphans(self):
+        """Marks the unfinished jobs of worker processes that no longer run as failed."""
+        session = self.Session()
+        try:
+            now = time.time()
+            for record in session.query(JobRecord).filter(JobRecord.status.in_([QUEUED, RUNNING])):
+                if not owner_alive(record.owner):
+                    record.status = FAILED
+                    record.finished_at = now
+                    record.error = "The worker process running the job stopped, upload the image again"
+            session.commit()
+        finally:
+            session.close()
+
+
+class JobQueue:
+    """
+    Runs submitted functions on a bounded worker pool and keeps their results
+    for `result_ttl` seconds. At most `max_pending` jobs may be queued or
+    running in this process; submit() raises QueueFull beyond that. With a
+    `store` the jobs of all worker processes can be polled from any of them,
+    foreign jobs are re-read every `poll_interval` seconds while waiting.
+    """
+
+    def __init__(self, max_workers, max_pending, ocr_workers=None, result_ttl=600, store=None, poll_interval=0.5):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self.store = store
+        self.poll_interval = poll_interval
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._ocr_executor = ThreadPoolExecutor(max_workers=ocr_workers or os.cpu_count() or 1, thread_name_prefix="ocr")
+        self._jobs = {}
+        self._changed = threading.Condition()
+        self._pending = 0
+        self._counts = {"submitted": 0, "rejected": 0, "cached": 0, DONE: 0, FAILED: 0}
+        self._run_seconds = 0.0
+        self._queued_seconds = 0.0
+        if self.store is not None:
+            self.store.fail_orphans()
+
+    def _purge(self):
+        cutoff = time.time() - self.result_ttl
+        expired = [job_id for job_id, job in self._jobs.items() if job.finished and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+        if self.store is not None and expired:
+            self.store.purge(cutoff)
+
+    def _save(self, job):
+        if self.store is None:
+            return
+        try:
+            self.store.save(job)
+        except Exception as e:
+            # This process still serves the job, only polls on other workers miss the update
+            print(f"Error storing job {job.id}:", e)
+
+    def submit(self, function, *args, **kwargs) -> Job:
+        """Queues function(*args, **kwargs), its return value becomes the job result."""
+        with self._changed:
+            self._purge()
+            if self._pending >= self.max_pending:
+                self._counts["rejected"] += 1
+                raise QueueFull(f"{self._pending} jobs are pending, try again later")
+            job = Job(uuid.uuid4().hex)
+            self._jobs[job.id] = job
+            self._pending += 1
+            self._counts["submitted"] += 1
+        self._save(job)
+        self._executor.submit(self._run, job, function, args, kwargs)
+        return job
+
+    def complete(self, result) -> Job:
+        """Registers an already finished job, e.g. for results served from the cache."""
+        job = Job(uuid.uuid4().hex)
+        job.started_at = job.finished_at = job.created_at
+        job.status = DONE
+        job.result = result
+        with self._changed:
+            self._purge()
+            self._jobs[job.id] = job
+            self._counts["cached"] += 1
+        self._save(job)
+        return job
+
+    def _set_status(self, job, status, result=None, error=None):
+        with self._changed:
+            job.status = status
+            if status == RUNNING:
+                job.started_at = time.time()
+                self._queued_seconds += job.started_at - job.created_at
+            else:
+                job.finished_at = time.time()
+                job.result = result
+                job.error = error
+                self._pending -= 1
+                self._counts[status] += 1
+                self._run_seconds += job.finished_at - job.started_at
+            self._changed.notify_all()
+        self._save(job)
+
+    def _run(self, job, function, args, kwargs):
+        self._set_status(job, RUNNING)
+        try:
+            result = function(*args, **kwargs)
+        except Exception as e:
+            print(f"Job {job.id} failed:", e)
+            self._set_status(job, FAILED, error=str(e))
+        else:
+            self._set_status(job, DONE, result=result)
+
+    def run_ocr(self, function, *args):
+        """Runs an OCR call on the OCR pool and waits for its result."""
+        return self._ocr_executor.submit(function, *args).result()
+
+    def get(self, job_id):
+        """
+        Returns the job, read from the store if another worker process runs
+        it, or None if it is unknown or expired.
+        """
+        with self._changed:
+            job = self._jobs.get(job_id)
+        if job is not None or self.store is None:
+            return job
+        job = self.store.load(job_id)
+        if job is not None and not job.finished and not owner_alive(job.owner):
+            self.store.fail_orphans()
+            job = self.store.load(job_id)
+        return job
+
+    def wait(self, job, timeout, last_status=None):
+        """
+        Blocks until the job's status differs from last_status (default: until
+        it finished) or the timeout expires, and returns the current status.
+        Jobs of other worker processes are updated in place from the store.
+        """
+        deadline = time.time() + timeout
+        with self._changed:
+            local = self._jobs.get(job.id) is job
+            while local:
+                changed = job.status != last_status if last_status is not None else job.finished
+                remaining = deadline - time.time()
+                if changed or remaining <= 0:
+                    return job.status
+                self._changed.wait(remaining)
+
+        while True:
+            changed = job.status != last_status if last_status is not None else job.finished
+            remaining = deadline - time.time()
+            if changed or remaining <= 0 or self.store is None:
+                return job.status
+            time.sleep(min(self.poll_interval, remaining))
+            stored = self.get(job.id)
+            if stored is not None:
+                job.__dict__.update(stored.__dict__)
+
+    def metrics(self):
+        with self._changed:
+            running = sum(1 for job in self._jobs.values() if job.status == RUNNING)
+            finished = self._counts[DONE] + self._counts[FAILED]
+            return {
+                "queue_depth": self._pending - running,
+                "running": running,
+                "pending": self._pending,
+                "max_pending": self.max_pending,
+                "workers": self.max_workers,
+                "submitted": self._counts["submitted"],
+                "rejected": self._counts["rejected"],
+                "cached": self._counts["cached"],
+                "done": self._counts[DONE],
+                "failed": self._counts[FAILED],
+                "avg_queued_seconds": round(self._queued_seconds / finished, 3) if finished else None,
+                "avg_run_seconds": round(self._run_seconds / finished, 3) if finished else None,
+            }
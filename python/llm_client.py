@@ -0,0 +1,340 @@
+# LLM backends for the fact check.
+#
+# LLMBackend is the interface ai_service dispatches to: blocking and streaming
+# completions plus per-call statistics. AsyncLLMClient implements it for the
+# OpenAI Chat Completions API, ollama.OllamaBackend for a local Ollama server.
+#
+# AsyncLLMClient is asyncio-based. All calls share one HTTP connection pool and
+# go through a semaphore on in-flight requests and a token bucket on the
+# request rate. Rate limits (429), timeouts, connection errors and 5xx
+# responses are retried with jittered exponential backoff, every failure
+# reaches the caller as LLMError. Every call records its queueing time,
+# latency, attempts and token usage.
+#
+# Synchronous code (the Flask routes) calls complete_sync() or stream_sync(),
+# which run the request on a background event loop shared by all threads.
+
+import abc
+import time
+import queue
+import random
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import numpy as np
+import openai
+from openai import AsyncOpenAI
+
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+_END_OF_STREAM = object()
+
+
+class LLMError(Exception):
+    """Raised when a completion failed, after all retries for retryable errors."""
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average with bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class LLMBackend(abc.ABC):
+    """
+    Interface of the LLM backends. Subclasses implement complete_sync() and
+    stream_sync() and pass a timing dict per call to _record().
+
+    Parameters:
+        model (str): Model name, part of the verdict cache key.
+        max_in_flight (int): Maximum concurrent requests.
+    """
+
+    name = None
+
+    def __init__(self, model, max_in_flight):
+        self.model = model
+        self.max_in_flight = max_in_flight
+        self._timings = deque(maxlen=1000)
+        self._totals = {"calls": 0, "errors": 0, "retries": 0, "rate_limited": 0,
+                        "prompt_tokens": 0, "completion_tokens": 0}
+        self._stats_lock = threading.Lock()
+
+    @abc.abstractmethod
+    def complete_sync(self, system_instructions, user_prompt, response_format=None, max_tokens=300, temperature=0.7):
+        """Returns the answer text of one completion, raises LLMError on failure."""
+
+    @abc.abstractmethod
+    def stream_sync(self, system_instructions, user_prompt, response_format=None, max_tokens=300, temperature=0.7):
+        """Yields the answer text in pieces as the model produces them, raises LLMError on failure."""
+
+    def complete_many(self, prompts, **kwargs):
+        """
+        Completes (system_instructions, user_prompt) pairs concurrently, up to
+        max_in_flight at a time, and returns the answers in order.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+            return list(pool.map(lambda prompt: self.complete_sync(*prompt, **kwargs), prompts))
+
+    @staticmethod
+    def _new_timing():
+        return {"started_at": time.time(), "queue_seconds": 0.0, "latency_seconds": 0.0, "attempts": 0,
+                "rate_limited": 0, "status": "ok", "prompt_tokens": 0, "completion_tokens": 0}
+
+    def _record(self, timing):
+        with self._stats_lock:
+            self._timings.append(timing)
+            self._totals["calls"] += 1
+            self._totals["errors"] += timing["status"] != "ok"
+            self._totals["retries"] += timing["attempts"] - 1
+            self._totals["rate_limited"] += timing["rate_limited"]
+            self._totals["prompt_tokens"] += timing["prompt_tokens"]
+            self._totals["completion_tokens"] += timing["completion_tokens"]
+
+    def stats(self):
+        """Totals since start and latency percentiles of the most recent calls."""
+        with self._stats_lock:
+            totals = dict(self._totals)
+            timings = list(self._timings)
+
+        def percentiles(key):
+            values = [t[key] for t in timings if t.get(key) is not None]
+            if not values:
+                return None
+            return {f"p{q}": round(float(np.percentile(values, q)), 3) for q in (50, 90, 99)}
+
+        return {
+            **totals,
+            "backend": self.name,
+            "model": self.model,
+            "max_in_flight": self.max_in_flight,
+            "latency_seconds": percentiles("latency_seconds"),
+            "total_seconds": percentiles("total_seconds"),
+            "queue_seconds": percentiles("queue_seconds"),
+            "first_token_seconds": percentiles("first_token_seconds"),
+        }
+
+    def recent_calls(self, limit=50):
+        with self._stats_lock:
+            return list(self._timings)[-limit:]
+
+
+class AsyncLLMClient(LLMBackend):
+    """
+    OpenAI backend.
+
+    Parameters:
+        api_key (str): OpenAI API key.
+        model (str): Chat model name.
+        base_url (str): API base URL, None for the OpenAI default.
+        max_in_flight (int): Maximum concurrent requests.
+        requests_per_second (float): Average request rate, None for no limit.
+        burst (int): Requests allowed at once before the rate applies.
+        max_retries (int): Retries of a retryable error before giving up.
+        backoff_base (float): Backoff of the first retry in seconds, doubled per retry.
+        backoff_max (float): Upper bound of a single backoff in seconds.
+        timeout (float): Timeout of a single request in seconds.
+        max_connections (int): Size of the HTTP connection pool.
+    """
+
+    name = "openai"
+
+    def __init__(self, api_key, model, base_url=None, max_in_flight=8, requests_per_second=None, burst=10,
+                 max_retries=4, backoff_base=0.5, backoff_max=20.0, timeout=30.0, max_connections=20):
+        super().__init__(model, max_in_flight)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            timeout=timeout,
+            max_retries=0,  # Retries are handled here, with jitter and shared rate limiting
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+                timeout=timeout,
+            ),
+        )
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        # Created on first use, inside the event loop running the requests
+        self._semaphore = None
+        self._bucket = None
+        self._loop = None
+        self._loop_lock = threading.Lock()
+
+    def _backoff(self, attempt, error):
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        try:
+            delay = max(delay, float(retry_after)) if retry_after else delay
+        except ValueError:
+            pass
+        return delay
+
+    def _new_timing(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+            if self.requests_per_second:
+                self._bucket = TokenBucket(self.requests_per_second, self.burst)
+        return super()._new_timing()
+
+    async def _create(self, timing, queued, system_instructions, user_prompt, response_format, max_tokens,
+                      temperature, **kwargs):
+        """Sends the request with retries, returns (completion or stream, start time of the last attempt)."""
+        extra_args = {"response_format": response_format} if response_format else {}
+        for attempt in range(self.max_retries + 1):
+            if self._bucket is not None:
+                await self._bucket.acquire()
+            if attempt == 0:
+                timing["queue_seconds"] = time.perf_counter() - queued
+            timing["attempts"] += 1
+            start = time.perf_counter()
+            try:
+                result = await self._client.chat.completions.create(
+                    model=self.model,
+                    messages=[
+                        {"role": "system", "content": system_instructions},
+                        {"role": "user", "content": user_prompt},
+                    ],
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    **extra_args,
+                    **kwargs
+                )
+            except RETRYABLE_ERRORS as e:
+                timing["latency_seconds"] = time.perf_counter() - start
+                timing["rate_limited"] += isinstance(e, openai.RateLimitError)
+                if attempt == self.max_retries:
+                    raise LLMError(f"Giving up after {timing['attempts']} attempts: {e}") from e
+                await asyncio.sleep(self._backoff(attempt, e))
+                continue
+            except Exception as e:
+                # Non-retryable API errors and anything httpx or asyncio raise outside the openai hierarchy
+                raise LLMError(f"{type(e).__name__}: {e}") from e
+            return result, start
+
+    @staticmethod
+    def _record_usage(timing, usage):
+        timing["prompt_tokens"] = getattr(usage, "prompt_tokens", 0) or 0
+        timing["completion_tokens"] = getattr(usage, "completion_tokens", 0) or 0
+
+    async def complete(self, system_instructions, user_prompt, response_format=None, max_tokens=300, temperature=0.7):
+        """Returns the answer text of one chat completion, raises LLMError on failure."""
+        timing = self._new_timing()
+        queued = time.perf_counter()
+        try:
+            async with self._semaphore:
+                completion, start = await self._create(
+                    timing, queued, system_instructions, user_prompt, response_format, max_tokens, temperature
+                )
+                timing["latency_seconds"] = time.perf_counter() - start
+                self._record_usage(timing, getattr(completion, "usage", None))
+                content = completion.choices[0].message.content if completion.choices else None
+                if content is None:
+                    raise LLMError("The completion has no content")
+                return content.strip()
+        except LLMError:
+            timing["status"] = "error"
+            raise
+        except Exception as e:
+            timing["status"] = "error"
+            raise LLMError(f"{type(e).__name__}: {e}") from e
+        finally:
+            timing["total_seconds"] = time.perf_counter() - queued
+            self._record(timing)
+
+    async def stream(self, system_instructions, user_prompt, response_format=None, max_tokens=300, temperature=0.7):
+        """
+        Yields the answer text in pieces as the model produces them, raises
+        LLMError on failure. Only failures before the first piece are retried.
+        """
+        timing = self._new_timing()
+        timing["first_token_seconds"] = None
+        queued = time.perf_counter()
+        try:
+            async with self._semaphore:
+                chunks, start = await self._create(
+                    timing, queued, system_instructions, user_prompt, response_format, max_tokens, temperature,
+                    stream=True, stream_options={"include_usage": True}
+                )
+                try:
+                    async for chunk in chunks:
+                        if chunk.usage is not None:
+                            self._record_usage(timing, chunk.usage)
+                        if not chunk.choices or not chunk.choices[0].delta.content:
+                            continue
+                        if timing["first_token_seconds"] is None:
+                            timing["first_token_seconds"] = time.perf_counter() - start
+                        yield chunk.choices[0].delta.content
+                except Exception as e:
+                    raise LLMError(f"Stream interrupted: {type(e).__name__}: {e}") from e
+                finally:
+                    timing["latency_seconds"] = time.perf_counter() - start
+        except LLMError:
+            timing["status"] = "error"
+            raise
+        except Exception as e:
+            timing["status"] = "error"
+            raise LLMError(f"{type(e).__name__}: {e}") from e
+        finally:
+            timing["total_seconds"] = time.perf_counter() - queued
+            self._record(timing)
+
+    def _event_loop(self):
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="llm-client-loop", daemon=True).start()
+        return self._loop
+
+    def complete_sync(self, *args, **kwargs):
+        """complete() for synchronous callers, runs on the client's background event loop."""
+        return asyncio.run_coroutine_threadsafe(self.complete(*args, **kwargs), self._event_loop()).result()
+
+    def stream_sync(self, *args, **kwargs):
+        """stream() for synchronous callers, a generator fed from the client's background event loop."""
+        pieces = queue.Queue()
+
+        async def pump():
+            try:
+                async for piece in self.stream(*args, **kwargs):
+                    pieces.put(piece)
+            except Exception as e:
+                pieces.put(e)
+            pieces.put(_END_OF_STREAM)
+
+        asyncio.run_coroutine_threadsafe(pump(), self._event_loop())
+        while True:
+            piece = pieces.get()
+            if piece is _END_OF_STREAM:
+                return
+            if isinstance(piece, Exception):
+                raise piece
+            yield piece
@@ -0,0 +1,194 @@
+# OCR of uploaded screenshots.
+#
+# Tesseract reads text best when capital letters are about 30 px high; phone
+# screenshots are often far larger and slow it down without improving the
+# result. Before OCR the image is reduced to grayscale, cropped to the region
+# containing text lines (found from the row and column profiles of an Otsu
+# binarisation) and scaled so the median text line (ascender to descender) is
+# OCR_TEXT_HEIGHT pixels high. Binarising to dark text on white is optional,
+# on the sharepics in pics/ Tesseract's own thresholding did better.
+#
+# With tesserocr installed every worker thread keeps its own initialised
+# Tesseract API (a warm worker, no process start or model loading per image,
+# the GIL is released during recognition). It is an optional speed-up, not in
+# requirements.txt: it needs the Tesseract headers and has no wheels on some
+# platforms. Without it pytesseract runs one tesseract process per image (with
+# a warning); the thread pool still runs them in parallel.
+
+import threading
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+import pytesseract
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+
+ANALYSIS_SIZE = 1000  # Longest side of the reduced copy used to find text lines
+OCR_DPI = 300         # Resolution reported to Tesseract for the normalised image
+
+
+def otsu_threshold(gray: np.ndarray) -> int:
+    """Returns the gray level that best separates a uint8 image into two classes."""
+    histogram = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    levels = np.arange(256)
+    weight_background = np.cumsum(histogram)
+    weight_foreground = weight_background[-1] - weight_background
+    sum_background = np.cumsum(histogram * levels)
+    mean_background = sum_background / np.maximum(weight_background, 1)
+    mean_foreground = (sum_background[-1] - sum_background) / np.maximum(weight_foreground, 1)
+    between_variance = weight_background * weight_foreground * (mean_background - mean_foreground) ** 2
+    return int(np.argmax(between_variance))
+
+
+def ink_mask(gray: np.ndarray, threshold: int = None) -> np.ndarray:
+    """Boolean mask of the minority class of the binarised image (the text)."""
+    threshold = otsu_threshold(gray) if threshold is None else threshold
+    dark = gray <= threshold
+    return dark if dark.mean() < 0.5 else ~dark
+
+
+def _runs(flags: np.ndarray):
+    """(start, end) of the runs of True values."""
+    padded = np.concatenate(([False], flags, [False]))
+    changes = np.flatnonzero(padded[1:] != padded[:-1])
+    return list(zip(changes[::2], changes[1::2]))
+
+
+def find_text_lines(mask: np.ndarray, min_height: int = 4, max_fill: float = 0.5):
+    """
+    Returns (top, bottom, left, right) boxes of the horizontal bands of the
+    ink mask that look like text lines: at least min_height rows and less
+    than max_fill of the band's bounding box covered (photos and solid
+    blocks are mostly filled).
+    """
+    lines = []
+    for top, bottom in _runs(mask.any(axis=1)):
+        if bottom - top < min_height:
+            continue
+        band = mask[top:bottom]
+        columns = np.flatnonzero(band.any(axis=0))
+        left, right = columns[0], columns[-1] + 1
+        if band[:, left:right].mean() < max_fill:
+            lines.append((top, bottom, left, right))
+    return lines
+
+
+def detect_text_region(gray: Image.Image):
+    """
+    Finds the text lines of a grayscale image.
+    Returns ((left, top, right, bottom), median line height) in pixels of the
+    given image, or (None, None) if no text lines were found.
+    """
+    scale = min(1.0, ANALYSIS_SIZE / max(gray.size))
+    small = gray.resize((max(1, round(gray.width * scale)), max(1, round(gray.height * scale))), Image.BILINEAR) \
+        if scale < 1.0 else gray
+    lines = find_text_lines(ink_mask(np.asarray(small)))
+    if not lines:
+        return None, None
+
+    boxes = np.array(lines, dtype=np.float64) / scale
+    line_height = float(np.median(boxes[:, 1] - boxes[:, 0]))
+    margin = line_height / 2
+    region = (
+        max(0, int(boxes[:, 2].min() - margin)),
+        max(0, int(boxes[:, 0].min() - margin)),
+        min(gray.width, int(np.ceil(boxes[:, 3].max() + margin))),
+        min(gray.height, int(np.ceil(boxes[:, 1].max() + margin))),
+    )
+    return region, line_height
+
+
+def prepare_image(image: Image.Image, text_height: int = 40, max_pixels: int = 4_000_000,
+                  binarize: bool = False) -> Image.Image:
+    """
+    Converts an image into the input Tesseract works best on: grayscale,
+    cropped to its text region and scaled so text lines are text_height
+    pixels high (but at most max_pixels in total), optionally binarised to
+    dark text on white.
+    """
+    gray = image.convert("L")
+    region, line_height = detect_text_region(gray)
+    if region is not None:
+        gray = gray.crop(region)
+        scale = min(4.0, text_height / line_height)
+    else:
+        scale = 1.0
+    scale = min(scale, (max_pixels / (gray.width * gray.height)) ** 0.5)
+    if abs(scale - 1.0) > 0.1:
+        size = (max(1, round(gray.width * scale)), max(1, round(gray.height * scale)))
+        gray = gray.resize(size, Image.LANCZOS if scale < 1.0 else Image.BICUBIC)
+
+    if binarize:
+        mask = ink_mask(np.asarray(gray))
+        gray = Image.fromarray(np.where(mask, 0, 255).astype(np.uint8))
+    return gray
+
+
+class OCREngine:
+    """
+    Preprocesses images and runs Tesseract on them.
+
+    Parameters:
+        lang (str): Tesseract language(s), e.g. "eng" or "eng+deu".
+        workers (int): Threads used by map(), None for the number of CPU cores.
+        text_height (int): Height in pixels text lines are scaled to.
+        max_pixels (int): Upper bound for the size of the image passed to Tesseract.
+        binarize (bool): Binarise to dark text on white before OCR.
+        preprocess (bool): False passes the image unchanged, as pytesseract would.
+    """
+
+    def __init__(self, lang="eng", workers=None, text_height=40, max_pixels=4_000_000, binarize=False,
+                 preprocess=True):
+        self.lang = lang
+        self.workers = workers
+        self.text_height = text_height
+        self.max_pixels = max_pixels
+        self.binarize = binarize
+        self.preprocess = preprocess
+        self.backend = "tesserocr" if tesserocr is not None else "pytesseract"
+        if tesserocr is None:
+            print("Warning: tesserocr is not installed, OCR falls back to pytesseract and starts "
+                  "one tesseract process per image (pip install tesserocr for warm workers)")
+        self._local = threading.local()
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _api(self):
+        """The calling thread's Tesseract API, initialised on its first use."""
+        api = getattr(self._local, "api", None)
+        if api is None:
+            api = tesserocr.PyTessBaseAPI(lang=self.lang, psm=tesserocr.PSM.AUTO)
+            self._local.api = api
+        return api
+
+    def prepare(self, image: Image.Image) -> Image.Image:
+        if not self.preprocess:
+            return image.convert("RGB") if image.mode == "RGBA" else image
+        return prepare_image(image, self.text_height, self.max_pixels, self.binarize)
+
+    def image_to_string(self, image: Image.Image) -> str:
+        """Recognises the text of a PIL image in the calling thread."""
+        prepared = self.prepare(image)
+        if self.backend == "tesserocr":
+            api = self._api()
+            api.SetImage(prepared)
+            api.SetSourceResolution(OCR_DPI)
+            return api.GetUTF8Text()
+        config = f"--psm 3 --dpi {OCR_DPI}" if self.preprocess else ""
+        return pytesseract.image_to_string(prepared, lang=self.lang, config=config)
+
+    def bytes_to_string(self, image_bytes: bytes) -> str:
+        return self.image_to_string(Image.open(BytesIO(image_bytes)))
+
+    def map(self, images):
+        """Recognises several images in parallel on the engine's worker threads."""
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ocr")
+        return list(self._pool.map(self.image_to_string, images))
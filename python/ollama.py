@@ -1,3 +1,169 @@
+# Local LLM backend using an Ollama server, plus the helpers of the earlier
+# Ollama RAG prototype.
+#
+# Ollama answers with one JSON object per line when streaming. All requests
+# share one requests.Session, so connections to the server are kept alive.
+# Ollama runs up to OLLAMA_NUM_PARALLEL requests of a model at once and batches
+# them on the GPU, so OllamaBackend sends up to max_in_flight prompts
+# concurrently and complete_many() fills these slots.
+
+import os
+import json
+import time
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from llm_client import LLMBackend, LLMError
+
+
+def iter_ollama_parts(response, chat=False):
+    """
+    Yields the text parts of a streamed /api/generate (or with chat=True,
+    /api/chat) response line by line. The final line, with the token counts,
+    is the generator's return value.
+    """
+    for line in response.iter_lines():
+        if line:
+            try:
+                data = json.loads(line.decode("utf-8"))
+            except ValueError as e:
+                raise LLMError(f"Malformed Ollama response line: {e}") from e
+            if not isinstance(data, dict):
+                raise LLMError(f"Malformed Ollama response line: {line[:200]!r}")
+            if "error" in data:
+                raise LLMError(f"Ollama error: {data['error']}")
+            part = data.get("message", {}).get("content", "") if chat else data.get("response", "")
+            if part:
+                yield part
+            if data.get("done", False):
+                return data
+    return {}
+
+
+class OllamaBackend(LLMBackend):
+    """
+    Ollama backend using the /api/chat endpoint.
+
+    Parameters:
+        model (str): Ollama model name, e.g. "llama3.2".
+        server_url (str): Base URL of the Ollama server.
+        max_in_flight (int): Concurrent requests, match the server's OLLAMA_NUM_PARALLEL.
+        timeout (float): Timeout of a single request in seconds.
+    """
+
+    name = "ollama"
+
+    def __init__(self, model="llama3.2", server_url="http://localhost:11435", max_in_flight=4, timeout=120.0):
+        super().__init__(model, max_in_flight)
+        self.server_url = server_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_in_flight)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+
+    def _payload(self, system_instructions, user_prompt, response_format, max_tokens, temperature, stream):
+        payload = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_instructions},
+                {"role": "user", "content": user_prompt},
+            ],
+            "stream": stream,
+            "options": {"num_predict": max_tokens, "temperature": temperature},
+        }
+        if (response_format or {}).get("type") == "json_object":
+            payload["format"] = "json"
+        return payload
+
+    def _post(self, payload, timing, queued):
+        """Waits for a free slot (the caller releases it) and sends the request."""
+        self._slots.acquire()
+        timing["queue_seconds"] = time.perf_counter() - queued
+        timing["attempts"] = 1
+        try:
+            response = self.session.post(f"{self.server_url}/api/chat", json=payload,
+                                         stream=payload["stream"], timeout=self.timeout)
+        except requests.RequestException as e:
+            self._slots.release()
+            raise LLMError(f"Ollama request failed: {e}") from e
+        if response.status_code != 200:
+            self._slots.release()
+            raise LLMError(f"Error: {response.status_code} - {response.text}")
+        return response
+
+    @staticmethod
+    def _record_usage(timing, data):
+        timing["prompt_tokens"] = data.get("prompt_eval_count", 0)
+        timing["completion_tokens"] = data.get("eval_count", 0)
+
+    def complete_sync(self, system_instructions, user_prompt, response_format=None, max_tokens=300, temperature=0.7):
+        timing = self._new_timing()
+        queued = time.perf_counter()
+        try:
+            response = self._post(
+                self._payload(system_instructions, user_prompt, response_format, max_tokens, temperature, False),
+                timing, queued
+            )
+            try:
+                data = response.json()
+            except ValueError as e:
+                raise LLMError(f"Malformed Ollama response: {e}") from e
+            finally:
+                self._slots.release()
+                timing["latency_seconds"] = time.perf_counter() - queued - timing["queue_seconds"]
+            content = data.get("message", {}).get("content") if isinstance(data, dict) else None
+            if not isinstance(content, str):
+                raise LLMError(f"Malformed Ollama response: {response.text[:200]}")
+            self._record_usage(timing, data)
+            return content.strip()
+        except LLMError:
+            timing["status"] = "error"
+            raise
+        finally:
+            timing["total_seconds"] = time.perf_counter() - queued
+            self._record(timing)
+
+    def stream_sync(self, system_instructions, user_prompt, response_format=None, max_tokens=300, temperature=0.7):
+        timing = self._new_timing()
+        timing["first_token_seconds"] = None
+        queued = time.perf_counter()
+        try:
+            response = self._post(
+                self._payload(system_instructions, user_prompt, response_format, max_tokens, temperature, True),
+                timing, queued
+            )
+            start = queued + timing["queue_seconds"]
+            try:
+                parts = iter_ollama_parts(response, chat=True)
+                while True:
+                    try:
+                        part = next(parts)
+                    except StopIteration as end:
+                        self._record_usage(timing, end.value or {})
+                        break
+                    if timing["first_token_seconds"] is None:
+                        timing["first_token_seconds"] = time.perf_counter() - start
+                    yield part
+            except requests.RequestException as e:
+                raise LLMError(f"Stream interrupted: {e}") from e
+            finally:
+                response.close()
+                self._slots.release()
+                timing["latency_seconds"] = time.perf_counter() - start
+        except LLMError:
+            timing["status"] = "error"
+            raise
+        finally:
+            timing["total_seconds"] = time.perf_counter() - queued
+            self._record(timing)
+
+
+# Shared by the prototype helpers below
+_session = requests.Session()
 
 
 def generate_answer(query, context):
@@ -34,21 +200,16 @@ def query_ollama(prompt, model="llama3.2", server_url="http://localhost:11435/ap
     headers = {"Content-Type": "application/json"}
     payload = {"model": model, "prompt": prompt}
 
-    response = requests.post(server_url, headers=headers, json=payload, stream=True)
+    response = _session.post(server_url, headers=headers, json=payload, stream=True)
     if response.status_code != 200:
         raise Exception(f"Error: {response.status_code} - {response.text}")
 
     # Print and collect the streamed response
     print("Response: ", end="", flush=True)  # Start the response line
     full_response = ""
-    for line in response.iter_lines():
-        if line:
-            data = json.loads(line.decode("utf-8"))
-            part = data.get("response", "")
-            print(part, end="", flush=True)  # Print the response part immediately
-            full_response += part
-            if data.get("done", False):
-                break
+    for part in iter_ollama_parts(response):
+        print(part, end="", flush=True)  # Print the response part immediately
+        full_response += part
 
     print()  # Finish the response line
     return full_response
@@ -59,6 +220,7 @@ def summarize_context(context):
 
 # Step 1: Extract text from multiple PDFs
 def process_multiple_pdfs(folder_path):
+    from ingest import chunk_text, extract_text_from_pdf
     all_chunks = []
     chunk_metadata = []  # Store metadata for each chunk
     for filename in os.listdir(folder_path):
@@ -105,28 +267,3 @@ def generate_answer_with_citation(query, chunks, metadata):
     citation_text = "\n".join(citations)
 
     return f"{answer}\n\nCitations:\n{citation_text}"
-
-# Small and fast embedding model
-embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-
-# Folder containing multiple PDFs
-folder_path = r"C:\Users\TE\Documents\fake_news_sharepics\my-cross-platform-app\python\reports"  # Replace with your folder path
-
-# Process all PDFs in the folder
-#all_chunks, chunk_metadata = process_multiple_pdfs(folder_path)
-
-# Step 3: Create FAISS index
-#index, embeddings = create_faiss_index(all_chunks, embedding_model)
-
-#def check_truth_with_ollama(extracted_text):
-#
-#
-#    # Step 3: Query and retrieve relevant chunks with metadata
-#    query = f"Keep your answer very short. Is the statement true or false? {extracted_text}"
-#    print("Asking ollama: ", query)
-#    retrieved_chunks, retrieved_metadata = retrieve_with_metadata(query, index, embedding_model, all_chunks, chunk_metadata)
-#
-#    # Step 4: Generate answer with citations
-#    answer_with_citation = generate_answer_with_citation(query, retrieved_chunks, retrieved_metadata)
-#
-#    return answer_with_citation
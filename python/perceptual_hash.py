@@ -0,0 +1,95 @@
+# Perceptual hashing for near-duplicate image lookup.
+#
+# Viral sharepics are re-encoded, resized or watermarked on every platform, so
+# their SHA-256 differs while their dHash stays within a few bits. Stored hashes
+# are kept in a BK-tree, which finds all hashes within a Hamming distance
+# without comparing against every stored image.
+
+import threading
+from io import BytesIO
+from PIL import Image
+
+
+HASH_SIZE = 8  # 8x8 gradient bits, a 64-bit hash
+
+
+def dhash(image: Image.Image, hash_size: int = HASH_SIZE) -> int:
+    """
+    Computes the difference hash of an image: shrink to (hash_size + 1) x hash_size
+    grayscale pixels and set one bit per horizontal gradient sign.
+    """
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = small.tobytes()
+    bits = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return bits
+
+
+def dhash_bytes(image_bytes: bytes, hash_size: int = HASH_SIZE) -> int:
+    """Computes the dHash of encoded image bytes, decoding JPEGs at reduced size."""
+    image = Image.open(BytesIO(image_bytes))
+    # Let the JPEG decoder skip detail we throw away anyway
+    image.draft("L", (hash_size * 8, hash_size * 8))
+    return dhash(image, hash_size)
+
+
+def hash_to_hex(value: int, hash_size: int = HASH_SIZE) -> str:
+    return f"{value:0{hash_size * hash_size // 4}x}"
+
+
+def hex_to_hash(value: str) -> int:
+    return int(value, 16)
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over integer hashes with the Hamming distance as
+    metric. Each node keeps the values (e.g. record IDs) stored under its hash.
+    Thread-safe for concurrent add and search.
+    """
+
+    def __init__(self):
+        self._root = None  # [hash, values, {distance: child}]
+        self._lock = threading.Lock()
+        self.size = 0
+
+    def add(self, hash_value: int, value):
+        with self._lock:
+            self.size += 1
+            if self._root is None:
+                self._root = [hash_value, [value], {}]
+                return
+            node = self._root
+            while True:
+                distance = hamming_distance(hash_value, node[0])
+                if distance == 0:
+                    node[1].append(value)
+                    return
+                child = node[2].get(distance)
+                if child is None:
+                    node[2][distance] = [hash_value, [value], {}]
+                    return
+                node = child
+
+    def search(self, hash_value: int, max_distance: int):
+        """Returns (distance, value) pairs within max_distance, closest first."""
+        matches = []
+        with self._lock:
+            stack = [self._root] if self._root is not None else []
+            while stack:
+                node = stack.pop()
+                distance = hamming_distance(hash_value, node[0])
+                if distance <= max_distance:
+                    matches.extend((distance, value) for value in node[1])
+                # Triangle inequality: only children within [d - max, d + max] can match
+                for child_distance, child in node[2].items():
+                    if distance - max_distance <= child_distance <= distance + max_distance:
+                        stack.append(child)
+        return sorted(matches, key=lambda match: match[0])
@@ -0,0 +1,448 @@
+# Lazily initialised search state (embedding model, FAISS index, chunks, metadata).
+#
+# Loading the model and the index takes tens of seconds. The SearchContext
+# loads them in a background thread so the web app can start serving routes
+# that don't need them (gallery, cached results, health checks) right away.
+#
+# The index, chunks and metadata are versioned: each load is a numbered
+# SearchGeneration. reload() loads a new generation in the background (after a
+# corpus update with ingest.py), keeping the embedding model, checks that it
+# fits together and swaps it in. Requests hold the generation they started on
+# with acquire(), so they finish on it; the replaced generation is closed (store
+# files and index unmapped) once its last request released it.
+#
+# Every worker process has its own SearchContext. With a GenerationStore the
+# requested generation number lives in a database shared by all of them: a
+# reload request bumps it, and each worker notices the newer number on its
+# next acquire() (at most every check_interval seconds) and reloads in the
+# background. Workers record the generation they serve in the same database.
+
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import faiss
+import numpy as np
+from sqlalchemy import create_engine, Column, Integer, String, Float, Text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker, declarative_base
+
+import search_faiss
+from jobs import process_owner, owner_alive
+
+
+PROBE_QUERY = "climate change"  # Searched in every new generation before it goes live
+
+
+class SearchContextUnavailable(Exception):
+    """Raised when the search context is not ready in time or failed to load."""
+
+
+Base = declarative_base()
+
+class RequestedGenerationRecord(Base):
+    """The generation number the last reload request asked for, a single row."""
+    __tablename__ = 'search_index_generation'
+    id = Column(Integer, primary_key=True)
+    number = Column(Integer)
+    requested_at = Column(Float)
+
+
+class WorkerGenerationRecord(Base):
+    __tablename__ = 'search_index_workers'
+    owner = Column(String, primary_key=True)  # "host:pid" of the worker process
+    generation = Column(Integer)              # Live generation
+    reload_generation = Column(Integer)       # Generation of the last reload
+    reload_status = Column(String)            # "loading", "done" or "failed"
+    error = Column(Text)
+    updated_at = Column(Float)
+
+
+class GenerationStore:
+    """
+    Search index generations in a database shared by all worker processes
+    (SQLite by default): the requested one and the one each worker serves.
+    Without a reload request generation 1 is requested.
+    """
+
+    def __init__(self, database_url):
+        self.engine = create_engine(database_url)
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+
+    def requested(self):
+        session = self.Session()
+        try:
+            record = session.get(RequestedGenerationRecord, 1)
+            return record.number if record is not None else 1
+        finally:
+            session.close()
+
+    def request(self):
+        """Asks all workers for the next generation, returns its number."""
+        session = self.Session()
+        try:
+            for _ in range(2):
+                updated = session.query(RequestedGenerationRecord).filter(RequestedGenerationRecord.id == 1).update(
+                    {RequestedGenerationRecord.number: RequestedGenerationRecord.number + 1,
+                     RequestedGenerationRecord.requested_at: time.time()}, synchronize_session=False)
+                if not updated:
+                    session.add(RequestedGenerationRecord(id=1, number=2, requested_at=time.time()))
+                try:
+                    session.commit()
+                    break
+                except IntegrityError:
+                    # Another worker inserted the row first, increment it instead
+                    session.rollback()
+            return session.get(RequestedGenerationRecord, 1).number
+        finally:
+            session.close()
+
+    def report(self, owner, **fields):
+        """Updates the worker's record with the given columns."""
+        session = self.Session()
+        try:
+            record = session.get(WorkerGenerationRecord, owner) or WorkerGenerationRecord(owner=owner)
+            for key, value in fields.items():
+                setattr(record, key, value)
+            record.updated_at = time.time()
+            session.merge(record)
+            session.commit()
+        finally:
+            session.close()
+
+    def workers(self):
+        """The records of the running worker processes, those of stopped ones are deleted."""
+        session = self.Session()
+        try:
+            workers = []
+            for record in session.query(WorkerGenerationRecord).order_by(WorkerGenerationRecord.owner):
+                if not owner_alive(record.owner):
+                    session.delete(record)
+                    continue
+                workers.append({
+                    "worker": record.owner,
+                    "generation": record.generation,
+                    "reload_generation": record.reload_generation,
+                    "reload_status": record.reload_status,
+                    "error": record.error,
+                })
+            session.commit()
+            return workers
+        finally:
+            session.close()
+
+
+class SearchGeneration:
+    """One loaded version of the search index (search_faiss.SearchIndex)."""
+
+    def __init__(self, number, search_index, embedding_model, normalise):
+        self.number = number
+        self.search_index = search_index
+        self.embedding_model = embedding_model
+        self.normalise = normalise
+        self.loaded_at = time.time()
+        self.users = 0        # Requests holding the generation, see SearchContext.acquire
+        self.retired = False  # Replaced by a newer generation
+        self.closed = False
+
+    @property
+    def faiss_index(self):
+        return self.search_index.faiss_index
+
+    @property
+    def all_chunks(self):
+        return self.search_index.chunks
+
+    @property
+    def metadata(self):
+        return self.search_index.metadata
+
+    def close(self):
+        """Releases the search index, the embedding model is shared between generations."""
+        if self.closed:
+            return
+        self.search_index.close()
+        self.closed = True
+
+    def describe(self):
+        return {
+            "generation": self.number,
+            "vectors": getattr(self.faiss_index, "ntotal", None),
+            "chunks": len(self.all_chunks) if self.all_chunks is not None else None,
+            "loaded_at": datetime.fromtimestamp(self.loaded_at, timezone.utc).isoformat(),
+            "requests": self.users,
+        }
+
+
+def validate_generation(generation):
+    """
+    Raises ValueError if the index, chunks and metadata of a generation don't
+    fit together or the embedding model, or a probe search finds nothing.
+    """
+    index, chunks, metadata = generation.faiss_index, generation.all_chunks, generation.metadata
+    if index.ntotal == 0:
+        raise ValueError("The index is empty")
+    if len(chunks) != len(metadata):
+        raise ValueError(f"{len(chunks)} chunks but {len(metadata)} metadata entries")
+
+    if isinstance(index, faiss.IndexIDMap):
+        max_id = int(faiss.vector_to_array(index.id_map).max())
+    else:
+        max_id = index.ntotal - 1
+    if max_id >= len(chunks):
+        raise ValueError(f"The index has chunk ID {max_id} but there are {len(chunks)} chunks")
+    rerank_vectors = generation.search_index.rerank_vectors
+    if rerank_vectors is not None and max_id >= len(rerank_vectors):
+        raise ValueError(f"The index has chunk ID {max_id} but there are {len(rerank_vectors)} re-ranking vectors")
+
+    query = np.array(generation.embedding_model.encode([PROBE_QUERY]), dtype="float32").reshape(1, -1)
+    if query.shape[1] != index.d:
+        raise ValueError(f"The index has {index.d} dimensions, the embedding model {query.shape[1]}")
+    if generation.normalise:
+        faiss.normalize_L2(query)
+    _, ids = index.search(query, 1)
+    if ids[0, 0] < 0:
+        raise ValueError("The probe search found nothing")
+
+
+class SearchContext:
+    """
+    Holds everything check_truth_with_chatgpt needs from the search side.
+    Call start() to begin loading in the background and wait() before use.
+    Requests use acquire() to search one generation from start to end. With
+    a `store` the context follows the generation requested through it, see
+    refresh().
+    """
+
+    def __init__(self, model_name, similarity_metric, store=None, check_interval=5.0, owner=None):
+        self.model_name = model_name
+        self.similarity_metric = similarity_metric
+        self.store = store
+        self.check_interval = check_interval
+        self.owner = owner or process_owner()
+
+        self.error = None
+        self.started_at = None
+        self.loaded_at = None
+        self.reload_state = None
+        self._generation = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._reload_thread = None
+        self._checked_at = 0.0
+        self._failed_generation = None  # Not retried until a newer one is requested
+
+    def start(self):
+        """Starts loading in a background thread, does nothing if already started."""
+        with self._lock:
+            if self._thread is None:
+                self.started_at = time.time()
+                self._thread = threading.Thread(target=self._load, name="search-context-loader", daemon=True)
+                self._thread.start()
+        return self
+
+    def _report(self, **fields):
+        if self.store is None:
+            return
+        try:
+            self.store.report(self.owner, **fields)
+        except Exception as e:
+            print("Error storing the search index generation:", e)
+
+    def _requested(self):
+        """The generation requested through the store, None without one or if it can't be read."""
+        if self.store is None:
+            return None
+        try:
+            return self.store.requested()
+        except Exception as e:
+            print("Error reading the requested search index generation:", e)
+            return None
+
+    def _load(self):
+        try:
+            number = self._requested() or 1
+            self._checked_at = time.time()
+            search_index, embedding_model, normalise = search_faiss.initialize_search_index(
+                model_name=self.model_name,
+                similarity_metric=self.similarity_metric
+            )
+            self._swap(SearchGeneration(number, search_index, embedding_model, normalise))
+            self.loaded_at = time.time()
+            print(f"Search context loaded in {self.loaded_at - self.started_at:.1f}s")
+            self._report(generation=number)
+        except Exception as e:
+            print("Error loading the search context:", e)
+            self.error = e
+            self._report(generation=None, error=str(e))
+        finally:
+            self._ready.set()
+
+    # The live generation's objects, for callers that don't hold a generation
+    @property
+    def generation(self):
+        return self._generation
+
+    @property
+    def search_index(self):
+        return self._generation.search_index if self._generation else None
+
+    @property
+    def faiss_index(self):
+        return self._generation.faiss_index if self._generation else None
+
+    @property
+    def embedding_model(self):
+        return self._generation.embedding_model if self._generation else None
+
+    @property
+    def all_chunks(self):
+        return self._generation.all_chunks if self._generation else None
+
+    @property
+    def metadata(self):
+        return self._generation.metadata if self._generation else None
+
+    @property
+    def normalise(self):
+        return self._generation.normalise if self._generation else None
+
+    @property
+    def ready(self):
+        return self._ready.is_set() and self.error is None
+
+    def wait(self, timeout=None):
+        """
+        Starts loading if needed and blocks until the context is ready.
+        Raises SearchContextUnavailable on timeout or if loading failed.
+        """
+        self.start()
+        if not self._ready.wait(timeout):
+            raise SearchContextUnavailable("The search index is still loading")
+        if self.error is not None:
+            raise SearchContextUnavailable(f"The search index failed to load: {self.error}")
+        return self
+
+    @contextmanager
+    def acquire(self):
+        """
+        Yields the live SearchGeneration and keeps it open until the block
+        ends, even if a reload swaps in a newer one meanwhile.
+        """
+        self.refresh()
+        with self._lock:
+            generation = self._generation
+            if generation is None:
+                raise SearchContextUnavailable("The search index is not loaded")
+            generation.users += 1
+        try:
+            yield generation
+        finally:
+            with self._lock:
+                generation.users -= 1
+                close = generation.retired and generation.users == 0
+            if close:
+                self._close(generation)
+
+    def _swap(self, generation):
+        with self._lock:
+            previous = self._generation
+            self._generation = generation
+            close = previous is not None and previous.users == 0
+            if previous is not None:
+                previous.retired = True
+        if close:
+            self._close(previous)
+        return previous
+
+    def _close(self, generation):
+        generation.close()
+        print(f"Search index generation {generation.number} released")
+
+    def refresh(self, force=False):
+        """
+        Starts a reload if the store requests a newer generation than the live
+        one. The store is read at most every check_interval seconds unless
+        `force`. Returns the reload thread or None.
+        """
+        if self.store is None or self._generation is None:
+            return None
+        now = time.time()
+        with self._lock:
+            if not force and now - self._checked_at < self.check_interval:
+                return None
+            self._checked_at = now
+        requested = self._requested()
+        if requested is None or requested <= self._generation.number or requested == self._failed_generation:
+            return None
+        return self.reload(requested)
+
+    def reload(self, number=None):
+        """
+        Loads the index, chunks and metadata again in a background thread,
+        validates them and swaps them in as generation `number` (default: the
+        next one). Returns the reload thread, or None if the context is not
+        loaded yet or a reload is already running.
+        """
+        with self._lock:
+            if self._generation is None or (self._reload_thread is not None and self._reload_thread.is_alive()):
+                return None
+            number = number or self._generation.number + 1
+            self.reload_state = {"status": "loading", "generation": number, "started_at": time.time(),
+                                 "seconds": None, "error": None}
+            self._reload_thread = threading.Thread(target=self._reload, args=(number,), name="search-context-reload", daemon=True)
+            self._reload_thread.start()
+            return self._reload_thread
+
+    def _reload(self, number):
+        state = self.reload_state
+        search_index = None
+        self._report(reload_generation=number, reload_status="loading", error=None)
+        try:
+            # load_search_index closes what it opened if it fails itself
+            search_index = search_faiss.load_search_index(self.model_name, self.similarity_metric)
+            live = self._generation
+            generation = SearchGeneration(number, search_index, live.embedding_model, live.normalise)
+            validate_generation(generation)
+            self._swap(generation)
+            search_index = None  # Owned by the context from here on
+            state["status"] = "done"
+            print(f"Search index generation {number} is live ({generation.faiss_index.ntotal} vectors)")
+            self._report(generation=number, reload_status="done")
+        except Exception as e:
+            print(f"Error loading search index generation {number}:", e)
+            state.update(status="failed", error=str(e))
+            self._failed_generation = number
+            self._report(reload_status="failed", error=str(e))
+            if search_index is not None:
+                try:
+                    search_index.close()
+                except Exception as close_error:
+                    print(f"Error closing search index generation {number}:", close_error)
+        finally:
+            state["seconds"] = round(time.time() - state["started_at"], 1)
+
+    def status(self):
+        """Returns a JSON-serialisable description of the loading state."""
+        if self.ready:
+            state = "ready"
+        elif self.error is not None:
+            state = "failed"
+        elif self._thread is not None:
+            state = "loading"
+        else:
+            state = "not started"
+        generation = self._generation
+        return {
+            "status": state,
+            "worker": self.owner,
+            "model": self.model_name,
+            "similarity_metric": self.similarity_metric,
+            "load_seconds": round(self.loaded_at - self.started_at, 1) if self.loaded_at else None,
+            "error": str(self.error) if self.error is not None else None,
+            "generation": generation.describe() if generation is not None else None,
+            "reload": {key: value for key, value in self.reload_state.items() if key != "started_at"} if self.reload_state else None,
+        }
@@ -1,21 +1,41 @@
 import os
 import json
+import threading
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from datetime import datetime
+from datetime import datetime, timedelta
 import faiss
 import config
+from chunk_store import ChunkStore, MetadataStore
+from text_index import TextIndex
+
+
+PUBLICATION_DATE_FORMAT = "%b %d, %Y, %I:%M:%S %p"
+EPOCH = datetime(1970, 1, 1)
 
 
 # Load FAISS index, metadata, and chunks
-def load_faiss_index(index_file, metadata_file, chunk_file):
+def load_faiss_index(index_file, metadata_file, chunk_file, metadata_store_file=None, chunk_store_file=None):
+    """
+    Loads the FAISS index with its metadata and chunks. If memory-mapped store
+    files (see chunk_store.py) exist they are used instead of the JSON files,
+    so chunks and metadata entries are only decoded when accessed.
+    """
+    use_stores = (
+        metadata_store_file is not None and chunk_store_file is not None
+        and os.path.exists(metadata_store_file) and os.path.exists(chunk_store_file)
+    )
+    if use_stores:
+        metadata_file, chunk_file = metadata_store_file, chunk_store_file
 
     print(f"Loading FAISS index ({index_file}), metadata ({metadata_file}), and chunks ({chunk_file})...")
 
     if not os.path.exists(index_file) or not os.path.exists(metadata_file) or not os.path.exists(chunk_file):
-        raise ValueError("No FAISS index available. Please create it using embeddings/build_faiss.py")
+        raise ValueError("No FAISS index available. Please create it with ingest.py")
+
+    index = read_faiss_index(index_file)
+    if use_stores:
+        return index, MetadataStore(metadata_file), ChunkStore(chunk_file)
 
-    index = faiss.read_index(index_file)
     with open(metadata_file, "r", encoding="utf-8") as f:
         metadata = json.load(f)
     with open(chunk_file, "r", encoding="utf-8") as f:
@@ -24,21 +44,466 @@ def load_faiss_index(index_file, metadata_file, chunk_file):
     return index, metadata, chunks
 
 
-# Initialize the FAISS index (build or load)
-def initialize_search_index(model_name, similarity_metric):
-    print(f"Using embedding model {model_name}")
-    embedding_model = SentenceTransformer(model_name)
+def read_faiss_index(index_file, load_mode=None):
+    """
+    Reads a FAISS index in the given load mode (default config.FAISS_INDEX_LOAD_MODE).
+
+    "mmap" maps the index file read-only instead of copying it into the process,
+    so all workers serving the same index share one copy in the page cache.
+    "memory" reads a private copy; combined with a preloading server (e.g.
+    gunicorn --preload) forked workers still share it copy-on-write.
+    """
+    load_mode = load_mode or config.FAISS_INDEX_LOAD_MODE
+    if load_mode not in ("mmap", "memory"):
+        raise ValueError(f"Unknown FAISS index load mode: {load_mode}")
+
+    if load_mode == "mmap":
+        io_flags = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+        if io_flags is None:
+            print("This FAISS version cannot memory-map indexes, reading the index into memory")
+        else:
+            try:
+                return faiss.read_index(index_file, io_flags | faiss.IO_FLAG_READ_ONLY)
+            except RuntimeError as e:
+                print(f"Memory-mapped loading failed ({e}), reading the index into memory")
+
+    return faiss.read_index(index_file)
+
+
+def index_kind(index):
+    """
+    Structure of an index as far as searching it is concerned: "ivf", "hnsw"
+    or "flat" (everything searched without structure parameters).
+    """
+    if faiss.try_extract_index_ivf(index) is not None:
+        return "ivf"
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(inner, faiss.IndexHNSW):
+        return "hnsw"
+    return "flat"
+
+
+def index_search_parameters(kind, id_selector=None, nprobe=None, ef_search=None):
+    """
+    FAISS search parameters for an index kind (see index_kind) with the tuned
+    nprobe (config.FAISS_NPROBE) or efSearch (config.FAISS_EF_SEARCH).
+    """
+    if kind == "ivf":
+        return faiss.SearchParametersIVF(sel=id_selector, nprobe=nprobe or config.FAISS_NPROBE)
+    if kind == "hnsw":
+        return faiss.SearchParametersHNSW(sel=id_selector, efSearch=ef_search or config.FAISS_EF_SEARCH)
+    return faiss.SearchParameters(sel=id_selector)
+
+
+def configure_index(index, nprobe=None, ef_search=None):
+    """Sets the tuned nprobe or efSearch on the index itself, for searches without parameters."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = nprobe or config.FAISS_NPROBE
+    elif index_kind(index) == "hnsw":
+        inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+        inner.hnsw.efSearch = ef_search or config.FAISS_EF_SEARCH
+    return index
+
+
+def build_faiss_index(vectors, ids=None, factory=None):
+    """
+    Builds an index of the given structure (a FAISS index factory string,
+    default config.FAISS_INDEX_FACTORY) from the vectors, with IDs 0 ...
+    len(vectors) - 1 unless given. IVF indexes map IDs themselves, other
+    structures are wrapped in an IndexIDMap2. Raises ValueError for
+    structures that can't be searched with an IDSelector.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    ids = np.arange(len(vectors), dtype="int64") if ids is None else np.asarray(ids, dtype="int64")
+    index = faiss.index_factory(vectors.shape[1], factory or config.FAISS_INDEX_FACTORY)
+    if not index.is_trained:
+        index.train(vectors)
+    if faiss.try_extract_index_ivf(index) is None:
+        index = faiss.IndexIDMap2(index)
+    index.add_with_ids(vectors, ids)
+
+    # search_pdfs restricts every search to publication types with an IDSelector,
+    # which some structures (e.g. PQ without IVF) don't support: probe it once
+    try:
+        index.search(vectors[:1], 1, params=index_search_parameters(index_kind(index), faiss.IDSelectorRange(0, 1)))
+    except RuntimeError:
+        raise ValueError(f"A {factory or config.FAISS_INDEX_FACTORY} index can't be searched with an IDSelector, "
+                         "use e.g. an IVF or HNSW structure") from None
+    return configure_index(index)
+
+
+def index_ids(index):
+    """IDs of all vectors in an index, in the order index_vectors returns them."""
+    if isinstance(index, faiss.IndexIDMap):
+        return faiss.vector_to_array(index.id_map).copy()
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        invlists = ivf.invlists
+        return np.concatenate([np.empty(0, dtype="int64")] + [
+            faiss.rev_swig_ptr(invlists.get_ids(l), invlists.list_size(l)).copy()
+            for l in range(ivf.nlist) if invlists.list_size(l)
+        ])
+    return np.arange(index.ntotal, dtype="int64")
+
+
+def index_vectors(index):
+    """
+    (vectors, ids) of all vectors in an index. Compressed indexes (PQ, SQ)
+    return their approximations of the vectors.
+    """
+    ids = index_ids(index)
+    if isinstance(index, faiss.IndexIDMap):
+        inner = faiss.downcast_index(index.index)
+        if faiss.try_extract_index_ivf(inner) is not None:
+            raise ValueError("Can't read the vectors of an IVF index wrapped in an IndexIDMap")
+        return inner.reconstruct_n(0, inner.ntotal), ids
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+        return index.reconstruct_batch(ids), ids
+    return index.reconstruct_n(0, index.ntotal), ids
+
+
+def index_code_size(index):
+    """Bytes an index stores per vector, 4 * d for uncompressed float32 vectors."""
+    inner = faiss.downcast_index(index.index if isinstance(index, faiss.IndexIDMap) else index)
+    if isinstance(inner, faiss.IndexPreTransform):
+        return index_code_size(inner.index)
+    ivf = faiss.try_extract_index_ivf(inner)
+    if ivf is not None:
+        return ivf.code_size
+    if isinstance(inner, faiss.IndexHNSW):
+        inner = faiss.downcast_index(inner.storage)
+    return getattr(inner, "code_size", 4 * inner.d)
+
+
+def is_compressed_index(index):
+    """Whether the index only keeps approximations of its vectors (PQ, SQ, dimension reduction)."""
+    return index_code_size(index) < 4 * index.d
+
+
+def read_vectors_file(path, dimension):
+    """
+    Memory-maps a float16 vectors file (config.VECTORS_FILE, written by
+    ingest.py) as a (rows, dimension) array, row i holds the vector of chunk i.
+    """
+    if os.path.getsize(path) == 0:
+        return np.empty((0, dimension), dtype="float16")
+    return np.memmap(path, dtype="float16", mode="r").reshape(-1, dimension)
+
+
+def rerank_exact(query_embeddings, indices, vectors, normalise=False, top_k=None, metric_type=faiss.METRIC_L2):
+    """
+    Re-ranks the candidates of a compressed index by their exact distance to
+    the query, computed from the float16 vectors (row = chunk ID), in the
+    index's metric: squared L2 (ascending) or, for faiss.METRIC_INNER_PRODUCT,
+    the inner product (descending). Cosine indexes hold normalised vectors,
+    with `normalise` the stored vectors are normalised like them.
+
+    Returns:
+        tuple: (distances, indices) of the best `top_k` (default
+        config.FAISS_TOP_K) candidates per query, padded with inf (-inf for
+        inner products) and -1 like a FAISS search.
+    """
+    top_k = top_k or config.FAISS_TOP_K
+    inner_product = metric_type == faiss.METRIC_INNER_PRODUCT
+    distances = np.full((len(indices), top_k), -np.inf if inner_product else np.inf, dtype="float32")
+    result = np.full((len(indices), top_k), -1, dtype="int64")
+    for row, (query, candidates) in enumerate(zip(query_embeddings, indices)):
+        # Sorted IDs read the memory map front to back
+        candidates = np.unique(candidates[(candidates >= 0) & (candidates < len(vectors))])
+        if len(candidates) == 0:
+            continue
+        candidate_vectors = vectors[candidates].astype("float32")
+        if normalise:
+            faiss.normalize_L2(candidate_vectors)
+        if inner_product:
+            exact = candidate_vectors @ query
+            best = np.argsort(-exact, kind="stable")[:top_k]
+        else:
+            exact = ((candidate_vectors - query) ** 2).sum(axis=1)
+            best = np.argsort(exact, kind="stable")[:top_k]
+        distances[row, :len(best)] = exact[best]
+        result[row, :len(best)] = candidates[best]
+    return distances, result
+
+
+def load_text_index(path, chunks, index):
+    """
+    Opens the BM25 text index (see text_index.py) of the chunks. Returns None,
+    so searches are FAISS only, if it is missing or doesn't hold the chunks
+    the FAISS index holds: it is built by ingest.py or text_index.py, not by
+    the worker processes loading it.
+    """
+    if not os.path.exists(path):
+        print(f"No text index {path}, searching without keyword hits (build it with text_index.py)")
+        return None
+    text_index = TextIndex(path)
+    if len(text_index) == len(chunks) and text_index.documents == index.ntotal:
+        return text_index
+    text_index.close()
+    print(f"The text index {path} is out of date, searching without keyword hits (rebuild it with text_index.py)")
+    return None
+
+
+def reciprocal_rank_fusion(rankings, k=None):
+    """
+    Fuses ranked lists of chunk IDs (best first): every ID scores the sum of
+    1 / (k + rank) over the lists it is in, rank counted from 1, with k
+    default config.RRF_K.
+
+    Returns:
+        tuple: (chunk IDs, fused scores) by descending score.
+    """
+    k = config.RRF_K if k is None else k
+    ids = np.concatenate([np.asarray(ranking, dtype="int64") for ranking in rankings])
+    ranks = np.concatenate([np.arange(1, len(ranking) + 1) for ranking in rankings])
+    fused_ids, inverse = np.unique(ids, return_inverse=True)
+    scores = np.bincount(inverse, weights=1.0 / (k + ranks), minlength=len(fused_ids))
+    order = np.argsort(-scores, kind="stable")
+    return fused_ids[order], scores[order]
+
+
+def process_memory_usage():
+    """
+    Returns the resident memory of this process in MB, split into private
+    (anonymous) memory and shared file-backed pages, or None where /proc is
+    not available.
+    """
+    try:
+        with open("/proc/self/status", "r") as f:
+            status = dict(line.split(":", 1) for line in f if line.startswith("Rss"))
+    except OSError:
+        return None
+    kilobytes = {key: int(value.split()[0]) for key, value in status.items()}
+    return {
+        "private_mb": kilobytes.get("RssAnon", 0) / 1024,
+        "shared_mb": (kilobytes.get("RssFile", 0) + kilobytes.get("RssShmem", 0)) / 1024,
+    }
+
+
+# Load the FAISS index, chunks and metadata of an embedding model
+def load_search_index(model_name, similarity_metric):
+    """
+    Loads the FAISS index, chunks and metadata from the embedding model's
+    directory (config.EMBEDDING_MODELS) with their metadata lookups,
+    re-ranking vectors and text index. Returns a SearchIndex; if loading
+    fails, the files opened so far are closed again.
+    """
     directory  = config.EMBEDDING_MODELS[model_name]
     faiss_path = os.path.join(directory, config.FAISS_INDEX_FILES[similarity_metric])
     meta_path  = os.path.join(directory, config.METADATA_FILE)
     chunk_path = os.path.join(directory, config.CHUNKS_FILE)
+    meta_store_path  = os.path.join(directory, config.METADATA_STORE_FILE)
+    chunk_store_path = os.path.join(directory, config.CHUNKS_STORE_FILE)
+
+    faiss_index, metadata_list, chunks = load_faiss_index(faiss_path, meta_path, chunk_path, meta_store_path, chunk_store_path)
+    rerank_vectors = text_index = None
+    try:
+        # Tuned search parameters (see benchmarks/bench_faiss_index.py)
+        configure_index(faiss_index)
+        print(f"FAISS index: {index_kind(faiss_index)}, {faiss_index.ntotal} vectors of {index_code_size(faiss_index)} bytes")
 
-    faiss_index, metadata_list, chunks = load_faiss_index(faiss_path, meta_path, chunk_path)
+        # Compressed indexes are re-ranked exactly against the memory-mapped float16 vectors
+        vectors_path = os.path.join(directory, config.VECTORS_FILE)
+        if is_compressed_index(faiss_index):
+            if os.path.exists(vectors_path):
+                rerank_vectors = read_vectors_file(vectors_path, faiss_index.d)
+                print(f"Re-ranking {config.FAISS_RERANK_K} candidates against {vectors_path}")
+            else:
+                print(f"Compressed index without {config.VECTORS_FILE}, searching without exact re-ranking")
+
+        # BM25 keyword search fused with the FAISS results
+        if config.USE_TEXT_INDEX_FILE:
+            text_index = load_text_index(os.path.join(directory, config.TEXT_INDEX_FILE), chunks, faiss_index)
+
+        # Build the metadata lookups once so searches don't rescan the metadata
+        search_index = SearchIndex(faiss_index, chunks, metadata_list,
+                                   rerank_vectors=rerank_vectors, text_index=text_index)
+    except BaseException:
+        close_stores(chunks, metadata_list, text_index)
+        raise
+
+    memory = process_memory_usage()
+    if memory:
+        print(f"Resident memory after loading ({config.FAISS_INDEX_LOAD_MODE}): "
+              f"{memory['private_mb']:.0f} MB private, {memory['shared_mb']:.0f} MB shared")
+
+    return search_index
+
+
+# Initialize the FAISS index (build or load)
+def initialize_search_index(model_name, similarity_metric):
+    """Loads the embedding model and its search index. Returns (SearchIndex, embedding_model, normalise)."""
+    from sentence_transformers import SentenceTransformer
+    print(f"Using embedding model {model_name}")
+    embedding_model = SentenceTransformer(model_name)
+    search_index = load_search_index(model_name, similarity_metric)
+    return search_index, embedding_model, similarity_metric != "L2"
+
+def metadata_column(metadata, key, default):
+    """
+    Returns the value of `key` for every metadata entry. Reads the column directly
+    from a MetadataStore instead of decoding every entry.
+    """
+    if isinstance(metadata, MetadataStore):
+        column = metadata.column(key)
+        if column is None:
+            return [default] * len(metadata)
+        return [default if value is None else value for value in column]
+    return [meta.get(key, default) for meta in metadata]
+
+
+def parse_publication_days(metadata):
+    """
+    Parse the "Publication Date" of every metadata entry into days since the Unix
+    epoch. Entries without a parseable date are NaN.
+    """
+    days = np.full(len(metadata), np.nan)
+    for idx, publication_date_str in enumerate(metadata_column(metadata, "Publication Date", "Unknown Date")):
+        try:
+            publication_date = datetime.strptime(publication_date_str, PUBLICATION_DATE_FORMAT)
+        except (TypeError, ValueError):
+            continue
+        days[idx] = (publication_date - EPOCH).total_seconds() / 86400
+    return days
+
+
+def format_publication_day(days):
+    """Format days since the Unix epoch the way search results display dates."""
+    if np.isnan(days):
+        return "Unknown Date"
+    return (EPOCH + timedelta(days=float(days))).strftime("%B %d, %Y")
+
+
+class MetadataIndex:
+    """
+    Column views of the metadata used by every search:
+
+    - each "Publication Type" mapped to the sorted array of chunk IDs carrying it,
+      with one chunk ID mask and FAISS IDSelector cached per distinct set of
+      types (filled under a lock, the selector reads the cached bitmap);
+    - the publication date of every chunk as days since the Unix epoch.
+    """
+
+    def __init__(self, metadata):
+        self.size = len(metadata)
+        self.publication_days = parse_publication_days(metadata)
+        types = np.array(metadata_column(metadata, "Publication Type", "Unknown Type"), dtype=object)
+        self.ids_by_type = {
+            publication_type: np.flatnonzero(types == publication_type).astype("int64")
+            for publication_type in set(types.tolist())
+        }
+        self._selectors = {}
+        self._masks = {}
+        self._lock = threading.Lock()
+
+    def ids_for(self, publication_types):
+        """Return the sorted chunk IDs belonging to any of the given publication types."""
+        arrays = [self.ids_by_type[t] for t in set(publication_types or []) if t in self.ids_by_type]
+        if not arrays:
+            return np.empty(0, dtype="int64")
+        return np.sort(np.concatenate(arrays))
+
+    def mask_for(self, publication_types):
+        """Return a cached boolean mask over the chunk IDs, True for the given publication types."""
+        key = frozenset(publication_types or [])
+        with self._lock:
+            mask = self._masks.get(key)
+            if mask is None:
+                mask = np.zeros(self.size, dtype=bool)
+                mask[self.ids_for(key)] = True
+                self._masks[key] = mask
+        return mask
+
+    def selector_for(self, publication_types):
+        """
+        Return a cached FAISS IDSelector over the chunk IDs of the given
+        publication types, or None if no chunk matches the selection.
+        """
+        key = frozenset(publication_types or [])
+        mask = self.mask_for(key)
+        with self._lock:
+            # Built once per key: a selector replaced in the cache would lose its bitmap mid-search
+            if key not in self._selectors:
+                if not mask.any():
+                    self._selectors[key] = None
+                else:
+                    bitmap = np.packbits(mask, bitorder="little")
+                    # FAISS does not own the bitmap, keep it alive with the selector
+                    self._selectors[key] = (faiss.IDSelectorBitmap(self.size, faiss.swig_ptr(bitmap)), bitmap)
+            entry = self._selectors[key]
+        return entry[0] if entry else None
+
+    def search_params(self, publication_types, kind="flat"):
+        """
+        Return FAISS search parameters restricting the search to the given
+        publication types, or None if no chunk matches the selection. `kind` is
+        the index structure (see index_kind), IVF and HNSW parameters carry the
+        tuned nprobe and efSearch.
+
+        Only the selector is cached: the parameters are built per call because
+        searching an IndexIDMap swaps their selector for a translated one while
+        the search runs, so concurrent searches must not share them.
+        """
+        id_selector = self.selector_for(publication_types)
+        if id_selector is None:
+            return None
+        return index_search_parameters(kind, id_selector)
+
+
+# MetadataIndex of the metadata searched last without a SearchIndex, as
+# (metadata, metadata_index): direct callers searching one corpus repeatedly
+# parse the publication dates once, and at most one corpus stays referenced
+_last_metadata_index = None
+_last_metadata_index_lock = threading.Lock()
+
+
+def metadata_index_for(metadata):
+    """The MetadataIndex of the metadata, reused while the same metadata object is searched."""
+    global _last_metadata_index
+    with _last_metadata_index_lock:
+        if _last_metadata_index is not None and _last_metadata_index[0] is metadata:
+            return _last_metadata_index[1]
+    metadata_index = MetadataIndex(metadata)
+    with _last_metadata_index_lock:
+        _last_metadata_index = (metadata, metadata_index)
+    return metadata_index
+
+
+class SearchIndex:
+    """
+    A loaded FAISS index with its chunks and metadata and what is searched
+    alongside them: the MetadataIndex, the float16 vectors compressed indexes
+    are re-ranked against (see rerank_exact) and the BM25 text index. Pass it
+    to search_pdfs as `search_index`; close() releases the store files.
+    """
+
+    def __init__(self, faiss_index, chunks, metadata, metadata_index=None, rerank_vectors=None, text_index=None):
+        self.faiss_index = faiss_index
+        self.chunks = chunks
+        self.metadata = metadata
+        self.metadata_index = metadata_index if metadata_index is not None else MetadataIndex(metadata)
+        self.rerank_vectors = rerank_vectors
+        self.text_index = text_index
+
+    def close(self):
+        """Closes the chunk, metadata and text index files, searches must have finished."""
+        close_stores(self.chunks, self.metadata, self.text_index)
+        self.faiss_index = self.chunks = self.metadata = None
+        self.metadata_index = self.rerank_vectors = self.text_index = None
+
+
+def close_stores(*stores):
+    """Closes the memory-mapped stores among the arguments (plain lists and None are skipped)."""
+    for store in stores:
+        if hasattr(store, "close"):
+            store.close()
 
-    return faiss_index, embedding_model, chunks, metadata_list, similarity_metric != "L2"
 
 # Perform semantic search
-def search_pdfs(query, index, model, chunks, metadata, normalise = False, alpha=0.00, publication_types=None):
+def search_pdfs(query, index, model, chunks, metadata, normalise = False, alpha=0.00, publication_types=None, query_embedding=None, search_index=None):
     """
     Perform a semantic search with date-based weighting on results.
 
@@ -50,67 +515,159 @@ def search_pdfs(query, index, model, chunks, metadata, normalise = False, alpha=
         metadata (list): List of metadata for each chunk.
         normalise (bool): Whether to normalise query embeddings.
         alpha (float): Decay factor for date weighting.
+        publication_types (list): Publication types to restrict the search to.
+        query_embedding (np.ndarray): Embedding of the query if already computed.
+        search_index (SearchIndex): The loaded index the other arguments belong
+            to, see search_pdfs_batch.
 
     Returns:
         list: A list of search results with date-weighted scoring.
     """
-    query_embedding = model.encode(query).astype("float32").reshape(1, -1)
+    return search_pdfs_batch(
+        [query], index, model, chunks, metadata,
+        normalise=normalise, alpha=alpha, publication_types=publication_types,
+        query_embeddings=None if query_embedding is None else [query_embedding],
+        search_index=search_index
+    )[0]
+
+
+def search_pdfs_batch(queries, index, model, chunks, metadata, normalise = False, alpha=0.00, publication_types=None, batch_size=32, query_embeddings=None, search_index=None):
+    """
+    Perform a semantic search with date-based weighting for many queries at once.
+
+    All queries are encoded in batches of `batch_size` and searched with a single
+    multi-row index.search call. If the search index has a BM25 text index
+    (see load_search_index), its hits for each query are fused with the FAISS
+    candidates by reciprocal rank fusion before the date weighting.
+
+    Parameters:
+        queries (list): The search queries.
+        batch_size (int): Number of queries the embedding model encodes at a time.
+        query_embeddings (array-like): Embeddings of the queries if already computed.
+        search_index (SearchIndex): The loaded index the other arguments belong
+            to. Its metadata lookups, re-ranking vectors and text index are
+            used; without it the metadata lookups are built once per metadata
+            object (see metadata_index_for) and the search is FAISS only,
+            without re-ranking.
+        Other parameters as in search_pdfs.
+
+    Returns:
+        list: One list of date-weighted search results per query.
+    """
+    queries = list(queries)
+    if not queries:
+        return []
+
+    metadata_index = search_index.metadata_index if search_index is not None else metadata_index_for(metadata)
+
+    # Look up the cached selector for this set of publication types
+    search_params = metadata_index.search_params(publication_types, index_kind(index))
+
+    # Return no results for empty selection
+    if search_params is None:
+        return [[] for _ in queries]
+
+    if query_embeddings is None:
+        query_embeddings = model.encode(queries, batch_size=batch_size)
+    # Copy, normalize_L2 works in place
+    query_embeddings = np.array(query_embeddings, dtype="float32").reshape(len(queries), -1)
 
     # Debug dimension mismatch in search_pdfs
     if normalise:
-        faiss.normalize_L2(query_embedding)
+        faiss.normalize_L2(query_embeddings)
 
-    # Filter IDs based on metadata
-    filtered_ids = [
-        idx for idx, meta in enumerate(metadata)
-        if meta.get("Publication Type", "Unknown Type") in publication_types
-    ]
+    # Compressed indexes return a wider candidate set, re-ranked exactly before the date weighting
+    rerank_vectors = search_index.rerank_vectors if search_index is not None else None
+    k = config.FAISS_TOP_K if rerank_vectors is None else max(config.FAISS_RERANK_K, config.FAISS_TOP_K)
 
-    # Return no results for empty selection
-    if not filtered_ids:
+    print(f"Performing search for {len(queries)} queries with IDSelector...")
+    distances, indices = index.search(query_embeddings, k, params=search_params)
+    if rerank_vectors is not None:
+        distances, indices = rerank_exact(query_embeddings, indices, rerank_vectors, normalise, metric_type=index.metric_type)
+
+    # Keyword hits are fused with the FAISS ranking, queries without any are ranked by distance
+    text_index = search_index.text_index if search_index is not None and config.USE_TEXT_INDEX_FILE else None
+    results = []
+    for row, query in enumerate(queries):
+        text_ids = np.empty(0, dtype="int64")
+        if text_index is not None:
+            text_ids, _ = text_index.search(query, config.TEXT_TOP_K, metadata_index.mask_for(publication_types))
+        if len(text_ids):
+            found = indices[row] >= 0
+            dense_ids = indices[row][found]
+            fused_ids, fused_scores = reciprocal_rank_fusion([dense_ids, text_ids])
+            # FAISS distances of the fused hits, NaN for hits of the text index only
+            dense_distances = dict(zip(dense_ids.tolist(), distances[row][found].tolist()))
+            fused_distances = np.array([dense_distances.get(i, np.nan) for i in fused_ids.tolist()])
+            results.append(rank_results(fused_ids, fused_distances, chunks, metadata, metadata_index, alpha,
+                                        scores=fused_scores, metric_type=index.metric_type))
+        else:
+            results.append(rank_results(indices[row], distances[row], chunks, metadata, metadata_index, alpha,
+                                        metric_type=index.metric_type))
+    return results
+
+
+def rank_results(indices, distances, chunks, metadata, metadata_index, alpha, top_k=None, scores=None,
+                 metric_type=faiss.METRIC_L2):
+    """
+    Apply date-based weighting to one row of FAISS hits and build result dicts
+    for the best `top_k` (default config.SEARCH_RESULT_K) of them. The
+    distances are in the index's metric: L2 distances become 1 / (1 + d),
+    inner products (faiss.METRIC_INNER_PRODUCT, cosine similarity on
+    normalised vectors) (1 + ip) / 2, so the best match scores 1. `scores`
+    (higher is better, e.g. reciprocal rank fusion scores) rank the hits
+    instead of the similarity derived from the distances and are returned as
+    "rrf_score"; "score" stays the FAISS similarity, None for hits without a
+    distance (NaN).
+    """
+    top_k = config.SEARCH_RESULT_K if top_k is None else top_k
+
+    # Drop padding (-1) and out-of-range hits
+    valid = (indices >= 0) & (indices < len(chunks))
+    indices = indices[valid]
+    if len(indices) == 0:
         return []
 
-    # Create IDSelector for filtering
-    id_selector = faiss.IDSelectorArray(filtered_ids)
+    # Calculate date weights using exponential decay, undated chunks are not penalised
+    current_day = (datetime.now() - EPOCH).total_seconds() / 86400
+    days_since_pub = np.floor(current_day - metadata_index.publication_days[indices])
+    date_weights = np.exp(-alpha * np.nan_to_num(days_since_pub) / 365)
+
+    # Combine the similarity or the given scores and date weight
+    distances = distances[valid].astype("float64")
+    if metric_type == faiss.METRIC_INNER_PRODUCT:
+        similarity_scores = (1 + distances) / 2  # Inner products: higher is better
+    else:
+        similarity_scores = 1 / (1 + distances)  # Convert FAISS distance (lower is better) to a similarity score
+    fused_scores = None if scores is None else np.asarray(scores, dtype="float64")[valid]
+    weighted_scores = (similarity_scores if fused_scores is None else fused_scores) * date_weights
 
-    print(f"Performing search with IDSelector...")
-    distances, indices = index.search(query_embedding, config.FAISS_TOP_K, params=faiss.SearchParametersIVF(sel=id_selector))
+    # Select the top results by weighted score in descending order
+    if len(weighted_scores) > top_k:
+        top = np.argpartition(-weighted_scores, top_k - 1)[:top_k]
+    else:
+        top = np.arange(len(weighted_scores))
+    top = top[np.argsort(-weighted_scores[top], kind="stable")]
 
-    # Prepare the results with metadata and date weighting
+    # Prepare the results with metadata for the surviving rows only
     results = []
-    current_date = datetime.now()
-
-    for i, distance in zip(indices[0], distances[0]):
-        if i < len(chunks):  # Ensure the index is within bounds
-            metadata_entry = metadata[i]  # Get metadata for the chunk
-
-            # Extract publication date
-            publication_date_str = metadata_entry.get("Publication Date", "Unknown Date")
-            publication_date = datetime.strptime(publication_date_str, "%b %d, %Y, %I:%M:%S %p")
-            days_since_pub = (current_date - publication_date).days
-
-            # Calculate date weight using exponential decay
-            date_weight = np.exp(-alpha * days_since_pub/365)
-
-            # Combine similarity distance (lower is better) and date weight
-            similarity_score = 1 / (1 + distance)  # Convert FAISS distance to a similarity score
-            weighted_score = similarity_score * date_weight
-
-            results.append({
-                "filename": metadata_entry.get("PDF URL", "No PDF URL").split('/')[-1],
-                "title": metadata_entry.get("Title", "Unknown Title"),
-                "summary": metadata_entry.get("Summary", "No Summary"),
-                "publication_date": publication_date.strftime("%B %d, %Y"),
-                "publication_type": metadata_entry.get("Publication Type", "Unknown Type"),
-                "url": metadata_entry.get("Article URL", "No URL"),
-                "pdf_url": metadata_entry.get("PDF URL", "No PDF URL"),
-                "snippet": chunks[i][:500].replace("\n", " "),  # Add a snippet from the chunk
-                "score": similarity_score,
-                "date_weight": date_weight,
-                "weighted_score": weighted_score,
-            })
-
-    # Sort results by weighted score in descending order
-    results = sorted(results, key=lambda x: x['weighted_score'], reverse=True)[:config.SEARCH_RESULT_K]
+    for row in top:
+        i = indices[row]
+        metadata_entry = metadata[i]  # Get metadata for the chunk
+        results.append({
+            "chunk_id": int(i),
+            "filename": metadata_entry.get("PDF URL", "No PDF URL").split('/')[-1],
+            "title": metadata_entry.get("Title", "Unknown Title"),
+            "summary": metadata_entry.get("Summary", "No Summary"),
+            "publication_date": format_publication_day(metadata_index.publication_days[i]),
+            "publication_type": metadata_entry.get("Publication Type", "Unknown Type"),
+            "url": metadata_entry.get("Article URL", "No URL"),
+            "pdf_url": metadata_entry.get("PDF URL", "No PDF URL"),
+            "snippet": chunks[i][:500].replace("\n", " "),  # Add a snippet from the chunk
+            "score": None if np.isnan(similarity_scores[row]) else float(similarity_scores[row]),
+            "rrf_score": None if fused_scores is None else float(fused_scores[row]),
+            "date_weight": float(date_weights[row]),
+            "weighted_score": float(weighted_scores[row]),
+        })
 
     return results
@@ -0,0 +1,8 @@
+# tests/conftest.py
+
+import os
+import tempfile
+
+# Tests importing app get a temporary database instead of image_records.db,
+# set before config is first imported
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'image_records.db')}")
@@ -0,0 +1,128 @@
+# tests/test_chunk_store.py
+
+import json
+import pytest
+
+import sys
+import os
+
+# setting path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chunk_store import ChunkStore, MetadataStore, append_column_store, convert_json_files, write_column_store
+import search_faiss
+
+
+@pytest.fixture
+def json_files(tmp_path):
+    """Writes small chunk and metadata JSON files like the embedding builder does."""
+    chunks = ["First chunk", "Zweiter Abschnitt – ünïcödé", "", "Last chunk"]
+    metadata = [
+        {"Title": "A", "Publication Type": "Report", "Publication Date": "Jan 15, 2024, 10:00:00 AM", "Pages": 12},
+        {"Title": "B", "Publication Type": "Briefing"},
+        {"Title": "C", "Summary": ""},
+        {"Title": "D", "Publication Type": "Report", "Pages": None},
+    ]
+    metadata_file = os.path.join(tmp_path, "metadata.json")
+    chunk_file = os.path.join(tmp_path, "chunks")
+    with open(metadata_file, "w", encoding="utf-8") as f:
+        json.dump(metadata, f)
+    with open(chunk_file, "w", encoding="utf-8") as f:
+        json.dump(chunks, f)
+    return tmp_path, metadata_file, chunk_file, metadata, chunks
+
+
+def test_convert_and_read_back(json_files):
+    """Converted stores return the same chunks and metadata entries as the JSON files."""
+    tmp_path, metadata_file, chunk_file, metadata, chunks = json_files
+    metadata_store_file = os.path.join(tmp_path, "metadata.bin")
+    chunk_store_file = os.path.join(tmp_path, "chunks.bin")
+    convert_json_files(metadata_file, chunk_file, metadata_store_file, chunk_store_file)
+
+    chunk_store = ChunkStore(chunk_store_file)
+    metadata_store = MetadataStore(metadata_store_file)
+
+    assert len(chunk_store) == len(chunks)
+    assert list(chunk_store) == chunks
+    assert chunk_store[-1] == "Last chunk"
+    with pytest.raises(IndexError):
+        chunk_store[len(chunks)]
+
+    assert len(metadata_store) == len(metadata)
+    expected = [{k: v for k, v in meta.items() if v is not None} for meta in metadata]
+    assert [metadata_store[i] for i in range(len(metadata))] == expected
+    assert metadata_store[0]["Pages"] == 12
+    assert metadata_store[1].get("Publication Type", "Unknown Type") == "Briefing"
+    assert metadata_store[2].get("Publication Type", "Unknown Type") == "Unknown Type"
+
+
+def test_metadata_index_reads_store_columns(json_files):
+    """The search metadata index is built from store columns like from JSON lists."""
+    tmp_path, metadata_file, chunk_file, metadata, _ = json_files
+    metadata_store_file = os.path.join(tmp_path, "metadata.bin")
+    convert_json_files(metadata_file, chunk_file, metadata_store_file, os.path.join(tmp_path, "chunks.bin"))
+
+    from_store = search_faiss.MetadataIndex(MetadataStore(metadata_store_file))
+    from_json = search_faiss.MetadataIndex(metadata)
+    assert from_store.ids_for(["Report"]).tolist() == from_json.ids_for(["Report"]).tolist() == [0, 3]
+    assert from_store.ids_for(["Unknown Type"]).tolist() == [2]
+    assert from_store.publication_days[0] == from_json.publication_days[0]
+
+
+def test_write_column_store_rejects_ragged_columns(tmp_path):
+    with pytest.raises(ValueError):
+        write_column_store(os.path.join(tmp_path, "bad.bin"), {"a": ["x"], "b": ["x", "y"]}, 1)
+
+
+def test_append_column_store(tmp_path):
+    """Appended rows follow the existing ones, columns missing on either side are None."""
+    path = os.path.join(tmp_path, "metadata.bin")
+    assert append_column_store(path, {"Title": ["A", "B"]}, 2) == 2
+    assert append_column_store(path, {"Title": ["C"], "file_name": ["c.pdf"]}, 1) == 3
+
+    store = MetadataStore(path)
+    assert [store[i] for i in range(3)] == [{"Title": "A"}, {"Title": "B"}, {"Title": "C", "file_name": "c.pdf"}]
+    store.close()
+
+    with pytest.raises(ValueError):
+        append_column_store(path, {"Title": ["D", "E"]}, 1)
+
+
+def test_append_writes_only_new_rows(tmp_path):
+    """Appending leaves the bytes of the existing rows untouched, open readers keep their rows."""
+    path = os.path.join(tmp_path, "chunks.bin")
+    write_column_store(path, {"text": ["first", "second"]}, 2)
+    with open(path, "rb") as f:
+        before = f.read()
+    reader = ChunkStore(path)
+
+    append_column_store(path, {"text": ["third"]}, 1)
+    append_column_store(path, {"text": ["fourth", None]}, 2)
+    with open(path, "rb") as f:
+        after = f.read()
+    # Only the header pointer changes in front of the appended segments
+    assert after[24:len(before)] == before[24:]
+
+    assert len(reader) == 2 and list(reader) == ["first", "second"]
+    reader.close()
+    assert list(ChunkStore(path)) == ["first", "second", "third", "fourth", None]
+
+
+def test_append_to_first_version_store(tmp_path):
+    """Stores written before appends were segmented are read and rewritten on the first append."""
+    header = json.dumps({"count": 1, "columns": {"Title": {"encoding": "utf-8", "offsets": 0, "present": 16, "blob": 24}}})
+    header = header.encode("utf-8") + b" " * ((-len(header)) % 8)
+    path = os.path.join(tmp_path, "metadata.bin")
+    with open(path, "wb") as f:
+        f.write(b"CFFSTOR1" + len(header).to_bytes(8, "little") + header)
+        f.write((0).to_bytes(8, "little") + (1).to_bytes(8, "little") + b"\1" + b"\0" * 7 + b"A" + b"\0" * 7)
+
+    store = MetadataStore(path)
+    assert store[0] == {"Title": "A"}
+    store.close()
+
+    assert append_column_store(path, {"Title": ["B"]}, 1) == 2
+    assert append_column_store(path, {"Pages": [3]}, 1) == 3
+    store = MetadataStore(path)
+    assert [store[i] for i in range(3)] == [{"Title": "A"}, {"Title": "B"}, {"Pages": 3}]
+    store.close()
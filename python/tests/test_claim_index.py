@@ -0,0 +1,61 @@
+# tests/test_claim_index.py
+
+import numpy as np
+
+import sys
+import os
+
+# setting path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import faiss
+
+from claim_index import ClaimIndex, read_claim_index_file
+
+
+def test_claim_index_finds_similar_claims(tmp_path):
+    """A claim close to a stored one returns its record ID, a distant one nothing."""
+    rng = np.random.default_rng(0)
+    index = ClaimIndex()
+    claims = rng.standard_normal((5, 16)).astype("float32")
+    for record_id, claim in zip([10, 11, 12, 13, 14], claims):
+        index.add(claim, record_id)
+
+    restated = claims[2] + 0.05 * rng.standard_normal(16).astype("float32")
+    record_id, similarity = index.search(restated, min_similarity=0.9)
+    assert record_id == 12
+    assert similarity > 0.9
+
+    assert index.search(rng.standard_normal(16), min_similarity=0.9) is None
+
+
+def test_claim_embeddings_round_trip():
+    """Stored embeddings are normalised and decode to the same claim."""
+    claim = np.array([3, 4, 0, 0], dtype="float32")
+    decoded = ClaimIndex.decode(ClaimIndex.encode(claim))
+    assert np.allclose(decoded, [0.6, 0.8, 0, 0])
+
+    index = ClaimIndex()
+    index.add(decoded, 42)
+    index.add(-decoded, 7)
+    assert index.last_id == 42
+    assert index.search(2 * claim, min_similarity=0.99)[0] == 42
+
+
+def test_read_claim_index_file(tmp_path):
+    """Claim index files of earlier versions are read back as record ID -> embedding."""
+    path = os.path.join(tmp_path, "claims.bin")
+    assert read_claim_index_file(path) == {}
+    old_index = faiss.IndexIDMap2(faiss.IndexFlatIP(8))
+    old_index.add_with_ids(np.eye(8, dtype="float32")[:2], np.array([5, 9], dtype="int64"))
+    faiss.write_index(old_index, path)
+
+    embeddings = read_claim_index_file(path)
+    assert sorted(embeddings) == [5, 9]
+    assert np.allclose(embeddings[9], np.eye(8)[1])
+
+
+def test_empty_claim_index():
+    index = ClaimIndex()
+    assert len(index) == 0
+    assert index.search(np.ones(8), min_similarity=0.5) is None
@@ -0,0 +1,83 @@
+# tests/test_image_context.py
+
+from io import BytesIO
+from PIL import Image
+
+import sys
+import os
+
+# setting path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image_context import ImageContext, encode_jpeg, reduction_factor, to_rgb
+
+
+def encoded(image, fmt):
+    buffer = BytesIO()
+    image.save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+def test_jpeg_upload_is_saved_without_reencoding():
+    file_bytes = encoded(Image.new("RGB", (40, 30), "blue"), "JPEG")
+    context = ImageContext(file_bytes)
+    assert context.is_jpeg
+    assert context.input_jpeg() is file_bytes
+    assert context._image is None  # Nothing decoded yet
+
+
+def test_png_upload_is_decoded_once_as_rgb():
+    file_bytes = encoded(Image.new("RGBA", (40, 30), (255, 0, 0, 128)), "PNG")
+    context = ImageContext(file_bytes)
+    image = context.image
+    assert image.mode == "RGB"
+    assert image.size == (40, 30)
+    assert context.image is image
+
+    input_jpeg = context.input_jpeg()
+    assert not context.is_jpeg
+    assert Image.open(BytesIO(input_jpeg)).format == "JPEG"
+
+
+def test_output_is_encoded_once():
+    context = ImageContext(encoded(Image.new("RGB", (40, 30), "white"), "PNG"))
+    output_bytes = context.encode_output(context.image)
+    assert context.encode_output(Image.new("RGB", (10, 10))) is output_bytes
+    assert Image.open(BytesIO(output_bytes)).size == (40, 30)
+
+
+def test_release_drops_the_decoded_image():
+    context = ImageContext(encoded(Image.new("RGB", (40, 30), "white"), "JPEG"))
+    context.image
+    context.release()
+    assert context._image is None
+
+
+def test_to_rgb_and_encode_jpeg():
+    image = Image.new("RGB", (8, 8))
+    assert to_rgb(image) is image
+    assert to_rgb(Image.new("P", (8, 8))).mode == "RGB"
+    assert encode_jpeg(image)[:3] == b"\xff\xd8\xff"
+
+
+def test_reduction_factor():
+    assert reduction_factor((1170, 2532), 1000) == 2
+    assert reduction_factor((1080, 1080), 1000) == 1
+    assert reduction_factor((4000, 3000), 400) == 8
+
+
+def test_output_image_is_reduced():
+    image = Image.new("RGB", (1200, 2400), "white")
+    for fmt in ("JPEG", "PNG"):
+        context = ImageContext(encoded(image, fmt))
+        assert context.output_image(1000).size == (600, 1200)
+        assert context.output_image(None) is context.image
+        assert context.output_image(3000) is context.image
+
+
+def test_jpeg_output_image_is_decoded_in_draft_mode():
+    context = ImageContext(encoded(Image.new("RGB", (1200, 2400), "white"), "JPEG"))
+    image = context.output_image(500)
+    assert image.size == (300, 600)
+    assert image.mode == "RGB"
+    assert context._image is None  # The full-size image was not decoded
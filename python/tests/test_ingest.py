@@ -0,0 +1,320 @@
+# tests/test_ingest.py
+
+import csv
+import json
+import zlib
+import pytest
+import numpy as np
+import faiss
+
+import sys
+import os
+
+# setting path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+import ingest
+import search_faiss
+
+
+DIMENSION = 8
+
+
+class FakeModel:
+    """Deterministic stand-in for a SentenceTransformer, records the texts it embedded."""
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts, **kwargs):
+        self.encoded.extend(texts)
+        return np.stack([
+            np.random.default_rng(zlib.crc32(text.encode("utf-8"))).standard_normal(DIMENSION).astype("float32")
+            for text in texts
+        ])
+
+
+def write_pdf(path, text, title=None):
+    """Writes a one-page PDF showing `text`."""
+    stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode("latin-1")
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R "
+        b"/Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    if title:
+        objects.append(f"<< /Title ({title}) >>".encode("latin-1"))
+    data, offsets = b"%PDF-1.4\n", []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(data))
+        data += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(data)
+    data += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    data += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    info = b" /Info 6 0 R" if title else b""
+    data += b"trailer\n<< /Size %d /Root 1 0 R%s >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, info, xref)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    """A publications directory with two PDFs, their metadata CSV and an empty embedding directory."""
+    monkeypatch.setattr(config, "CHUNK_SIZE", 4)
+    publications = tmp_path / "pdf"
+    publications.mkdir()
+    write_pdf(publications / "cars.pdf", "electric cars need fewer parts than combustion cars do", title="Cars")
+    write_pdf(publications / "ships.pdf", "shipping emissions keep growing")
+    metadata_csv = tmp_path / "metadata.csv"
+    with open(metadata_csv, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, ["Title", "Publication Type", "Publication Date", "PDF URL"])
+        writer.writeheader()
+        writer.writerow({"Title": "Electric cars", "Publication Type": "Report",
+                         "Publication Date": "Jan 15, 2024, 10:00:00 AM", "PDF URL": "https://example.org/files/cars.pdf"})
+    directory = tmp_path / "embeddings"
+
+    def run(model=None, **kwargs):
+        return ingest.ingest(str(directory), model or FakeModel(), publications_dir=str(publications),
+                             metadata_csv=str(metadata_csv), workers=2, **kwargs)
+
+    return publications, directory, run
+
+
+def load(directory, metric="L2"):
+    return search_faiss.load_faiss_index(
+        os.path.join(directory, config.FAISS_INDEX_FILES[metric]),
+        os.path.join(directory, config.METADATA_FILE), os.path.join(directory, config.CHUNKS_FILE),
+        os.path.join(directory, config.METADATA_STORE_FILE), os.path.join(directory, config.CHUNKS_STORE_FILE),
+    )
+
+
+def test_chunk_text():
+    assert list(ingest.chunk_text("a b c d e", 2)) == ["a b", "c d", "e"]
+    assert list(ingest.chunk_text("", 2)) == []
+
+
+def test_id_ranges_round_trip():
+    ranges = ingest.id_ranges([0, 1, 2, 5, 7, 8])
+    assert ranges == [[0, 3], [5, 6], [7, 9]]
+    assert ingest.ids_from_ranges(ranges).tolist() == [0, 1, 2, 5, 7, 8]
+
+
+def test_extract_text_from_pdf(tmp_path):
+    write_pdf(tmp_path / "a.pdf", "hello world", title="Greeting")
+    text, title = ingest.extract_text_from_pdf(str(tmp_path / "a.pdf"))
+    assert "hello world" in text
+    assert title == "Greeting"
+
+
+def test_first_ingest_builds_indexes_and_stores(corpus):
+    _, directory, run = corpus
+    model = FakeModel()
+    summary = run(model)
+    assert summary["new"] == 2
+    assert summary["chunks_added"] == 4  # 3 chunks of cars.pdf (10 words), 1 of ships.pdf
+    assert len(model.encoded) == 4
+
+    index, metadata, chunks = load(directory)
+    assert isinstance(index, faiss.IndexIDMap2)
+    assert index.ntotal == len(chunks) == len(metadata) == 4
+    assert chunks[0] == "electric cars need fewer"
+    assert metadata[0]["Title"] == "Electric cars"
+    assert metadata[0]["Publication Type"] == "Report"
+    assert metadata[3] == {"Title": "ships", "file_name": "ships.pdf", "chunk_index": 0}
+
+    # Cosine index holds normalised vectors
+    cosine, _, _ = load(directory, "Cosine")
+    assert np.allclose(np.linalg.norm(cosine.reconstruct(2)), 1)
+
+
+def test_unchanged_pdfs_are_skipped(corpus):
+    publications, directory, run = corpus
+    run()
+    os.utime(publications / "cars.pdf")  # New modification time, same content
+    model = FakeModel()
+    summary = run(model)
+    assert summary["unchanged"] == 2
+    assert summary["chunks_added"] == 0
+    assert model.encoded == []
+
+
+def test_new_pdf_is_appended(corpus):
+    publications, directory, run = corpus
+    run()
+    write_pdf(publications / "trains.pdf", "night trains are back")
+    model = FakeModel()
+    summary = run(model)
+    assert (summary["new"], summary["unchanged"]) == (1, 2)
+    assert model.encoded == ["night trains are back"]
+
+    index, metadata, chunks = load(directory)
+    assert index.ntotal == len(chunks) == 5
+    assert chunks[4] == "night trains are back"
+    query = FakeModel().encode(["night trains are back"])
+    assert index.search(query, 1)[1][0, 0] == 4
+
+    manifest = ingest.load_manifest(os.path.join(directory, config.INGEST_MANIFEST_FILE))
+    assert manifest["trains.pdf"]["ids"] == [[4, 5]]
+
+
+def test_changed_and_removed_pdfs_are_replaced(corpus):
+    publications, directory, run = corpus
+    run()
+    write_pdf(publications / "ships.pdf", "shipping emissions finally fall")
+    os.remove(publications / "cars.pdf")
+    summary = run()
+    assert (summary["changed"], summary["removed"], summary["ids_removed"]) == (1, 1, 4)
+
+    index, metadata, chunks = load(directory)
+    assert index.ntotal == 1
+    assert len(chunks) == 5  # Old rows stay, their IDs are gone from the index
+    _, ids = index.search(FakeModel().encode(["shipping emissions keep growing"]), 5)
+    assert set(ids[0]) - {-1} == {4}
+    assert chunks[4] == "shipping emissions finally fall"
+
+
+def test_search_with_publication_types_after_ingest(corpus):
+    _, directory, run = corpus
+    run()
+    index, metadata, chunks = load(directory)
+    results = search_faiss.search_pdfs("cars", index, FakeModel(), chunks, metadata, publication_types=["Report"])
+    assert results and all(result["publication_type"] == "Report" for result in results)
+
+
+def test_failed_pdf_is_retried(corpus):
+    publications, directory, run = corpus
+    (publications / "broken.pdf").write_bytes(b"not a pdf")
+    summary = run()
+    assert summary["failed"] == 1
+    manifest = ingest.load_manifest(os.path.join(directory, config.INGEST_MANIFEST_FILE))
+    assert "broken.pdf" not in manifest
+    assert run()["new"] == 1
+
+
+def test_existing_flat_index_is_adopted(corpus):
+    """A directory built in one go (JSON files, flat index) keeps its vectors and only gets new PDFs."""
+    publications, directory, run = corpus
+    directory.mkdir()
+    embeddings = np.random.default_rng(0).standard_normal((3, DIMENSION)).astype("float32")
+    flat = faiss.IndexFlatL2(DIMENSION)
+    flat.add(embeddings)
+    faiss.write_index(flat, os.path.join(directory, config.FAISS_INDEX_FILES["L2"]))
+    with open(os.path.join(directory, config.CHUNKS_FILE), "w", encoding="utf-8") as f:
+        json.dump(["old a", "old b", "old c"], f)
+    with open(os.path.join(directory, config.METADATA_FILE), "w", encoding="utf-8") as f:
+        json.dump([{"Title": "Cars", "PDF URL": "https://example.org/files/cars.pdf"}] * 2
+                  + [{"Title": "Gone", "PDF URL": "https://example.org/files/gone.pdf"}], f)
+
+    model = FakeModel()
+    summary = run(model)
+    assert (summary["new"], summary["unchanged"]) == (1, 1)
+    assert model.encoded == ["shipping emissions keep growing"]
+    assert not os.path.exists(os.path.join(directory, config.FAISS_INDEX_FILES["Cosine"]))
+
+    index, metadata, chunks = load(directory)
+    assert isinstance(index, faiss.IndexIDMap2)
+    assert index.ntotal == 4
+    assert np.allclose(index.reconstruct(1), embeddings[1])
+    assert chunks[3] == "shipping emissions keep growing"
+    manifest = ingest.load_manifest(os.path.join(directory, config.INGEST_MANIFEST_FILE))
+    assert manifest["cars.pdf"]["ids"] == [[0, 2]]
+
+
+def test_dry_run_writes_nothing(corpus):
+    _, directory, run = corpus
+    summary = run(dry_run=True)
+    assert summary["new"] == 2
+    assert not os.path.exists(os.path.join(directory, config.INGEST_MANIFEST_FILE))
+
+
+@pytest.mark.parametrize("factory", ["IVF2,Flat", "HNSW8"])
+def test_ingest_into_tuned_structures(corpus, monkeypatch, factory):
+    """New indexes get config.FAISS_INDEX_FACTORY, IVF deletes by ID and HNSW is rebuilt without removed vectors."""
+    publications, directory, run = corpus
+    monkeypatch.setattr(config, "FAISS_INDEX_FACTORY", factory)
+    for i in range(8):
+        write_pdf(publications / f"extra{i}.pdf", f"extra publication number {i} on freight")
+    run()
+    index, _, chunks = load(directory)
+    assert search_faiss.index_kind(index) == ("ivf" if factory.startswith("IVF") else "hnsw")
+
+    os.remove(publications / "cars.pdf")
+    write_pdf(publications / "trains.pdf", "night trains are back")
+    run()
+    index, _, chunks = load(directory)
+    assert index.ntotal == len(chunks) - 3
+    _, ids = search_faiss.index_vectors(index)
+    assert not set(ids.tolist()) & {0, 1, 2}  # The chunks of cars.pdf
+    assert chunks[int(ids.max())] == "night trains are back"
+
+
+def test_rebuild_indexes(corpus):
+    _, directory, run = corpus
+    run()
+    ingest.rebuild_indexes(str(directory), ["L2"], factory="HNSW8")
+    index, _, chunks = load(directory)
+    assert search_faiss.index_kind(index) == "hnsw"
+    assert sorted(search_faiss.index_vectors(index)[1].tolist()) == list(range(len(chunks)))
+
+
+def test_vectors_file_follows_ingest(corpus):
+    """Row i of the float16 vectors file is the embedding of chunk i, also for a directory adopted without one."""
+    publications, directory, run = corpus
+    run()
+    vectors_file = os.path.join(directory, config.VECTORS_FILE)
+    os.remove(vectors_file)
+    write_pdf(publications / "trains.pdf", "night trains are back")
+    run()
+
+    _, _, chunks = load(directory)
+    vectors = search_faiss.read_vectors_file(vectors_file, DIMENSION)
+    assert len(vectors) == len(chunks) == 5
+    assert np.allclose(vectors, FakeModel().encode(list(chunks)), atol=1e-2)
+
+
+def test_compressed_index_is_rebuilt_from_the_vectors_file(corpus, monkeypatch):
+    _, directory, run = corpus
+    run()
+    ingest.rebuild_indexes(str(directory), ["L2"], factory="SQ4")
+    ingest.rebuild_indexes(str(directory), ["L2"], factory="SQ8")  # From the exact vectors, not the 4-bit codes
+
+    monkeypatch.setitem(config.EMBEDDING_MODELS, "test-model", str(directory))
+    search_index = search_faiss.load_search_index("test-model", "L2")
+    index, chunks, metadata = search_index.faiss_index, search_index.chunks, search_index.metadata
+    assert search_faiss.index_code_size(index) == DIMENSION
+    sq8 = search_faiss.build_faiss_index(FakeModel().encode(list(chunks)), factory="SQ8")
+    assert np.allclose(search_faiss.index_vectors(index)[0], search_faiss.index_vectors(sq8)[0], atol=1e-2)
+
+    vectors = search_index.rerank_vectors
+    assert vectors is not None and len(vectors) == len(chunks)
+    results = search_faiss.search_pdfs("shipping emissions keep growing", index, FakeModel(), chunks, metadata,
+                                       publication_types=["Report", "Unknown Type"], search_index=search_index)
+    assert results[0]["snippet"] == "shipping emissions keep growing"
+    search_index.close()
+
+
+def test_text_index_covers_ingested_chunks(corpus, monkeypatch):
+    from text_index import TextIndex
+    publications, directory, run = corpus
+    run()
+    path = os.path.join(directory, config.TEXT_INDEX_FILE)
+    assert TextIndex(path).search("combustion", 5)[0].tolist() == [1]
+
+    os.remove(publications / "ships.pdf")
+    run()
+    assert len(TextIndex(path).search("shipping", 5)[0]) == 0
+
+    monkeypatch.setitem(config.EMBEDDING_MODELS, "test-model", str(directory))
+    search_index = search_faiss.load_search_index("test-model", "L2")
+    assert search_index.text_index.documents == search_index.faiss_index.ntotal == 3
+    search_index.close()
+
+    # Without the text index the search index loads without keyword search, it isn't built on load
+    os.remove(path)
+    search_index = search_faiss.load_search_index("test-model", "L2")
+    assert search_index.text_index is None and not os.path.exists(path)
+    search_index.close()
@@ -0,0 +1,96 @@
+# tests/test_jobs.py
+
+import socket
+import threading
+import subprocess
+import pytest
+
+import sys
+import os
+
+# setting path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jobs import Job, JobQueue, JobStore, QueueFull, DONE, FAILED, QUEUED, RUNNING
+
+
+def test_job_runs_and_returns_result():
+    queue = JobQueue(max_workers=2, max_pending=4)
+    job = queue.submit(lambda x: x * 2, 21)
+    assert queue.wait(job, timeout=5) == DONE
+    assert job.result == 42
+    assert queue.get(job.id) is job
+    assert queue.metrics()["done"] == 1
+
+
+def test_failed_job_keeps_error():
+    def fail():
+        raise ValueError("OCR failed")
+
+    queue = JobQueue(max_workers=1, max_pending=4)
+    job = queue.submit(fail)
+    assert queue.wait(job, timeout=5) == FAILED
+    assert job.error == "OCR failed"
+    assert queue.metrics()["failed"] == 1
+
+
+def test_backpressure_rejects_beyond_max_pending():
+    """Jobs beyond max_pending are rejected, queue depth counts waiting jobs."""
+    release = threading.Event()
+    queue = JobQueue(max_workers=1, max_pending=2)
+    running = queue.submit(release.wait, 5)
+    waiting = queue.submit(release.wait, 5)
+    assert queue.wait(running, timeout=5, last_status=QUEUED) == RUNNING
+
+    with pytest.raises(QueueFull):
+        queue.submit(release.wait, 5)
+
+    metrics = queue.metrics()
+    assert metrics["queue_depth"] == 1
+    assert metrics["running"] == 1
+    assert metrics["rejected"] == 1
+
+    release.set()
+    assert queue.wait(waiting, timeout=5) == DONE
+    assert queue.metrics()["pending"] == 0
+
+
+def test_completed_job_for_cached_results():
+    queue = JobQueue(max_workers=1, max_pending=1)
+    job = queue.complete({"output_path": "out.jpg"})
+    assert job.status == DONE
+    assert queue.wait(job, timeout=0) == DONE
+    assert queue.metrics()["cached"] == 1
+
+
+def test_run_ocr_uses_ocr_pool():
+    queue = JobQueue(max_workers=1, max_pending=1, ocr_workers=1)
+    assert queue.run_ocr(lambda: threading.current_thread().name).startswith("ocr")
+
+
+def test_jobs_are_shared_through_the_store(tmp_path):
+    """A job run by one worker process can be polled from another one sharing the store."""
+    store = JobStore(f"sqlite:///{tmp_path}/jobs.db")
+    release = threading.Event()
+    worker = JobQueue(max_workers=1, max_pending=1, store=store)
+    other_worker = JobQueue(max_workers=1, max_pending=1, store=store, poll_interval=0.01)
+    job = worker.submit(lambda: release.wait(5) and {"output_path": "out.jpg"})
+
+    polled = other_worker.get(job.id)
+    assert polled is not job and polled.status in (QUEUED, RUNNING)
+    release.set()
+    assert other_worker.wait(polled, timeout=5) == DONE
+    assert polled.result == {"output_path": "out.jpg"}
+    assert other_worker.get("unknown") is None
+
+
+def test_jobs_of_stopped_workers_fail(tmp_path):
+    """Unfinished jobs of a worker process that no longer runs are reported as failed."""
+    stopped = subprocess.Popen([sys.executable, "-c", "pass"])
+    stopped.wait()
+    store = JobStore(f"sqlite:///{tmp_path}/jobs.db")
+    store.save(Job("orphan", owner=f"{socket.gethostname()}:{stopped.pid}"))
+
+    job = JobQueue(max_workers=1, max_pending=1, store=store).get("orphan")
+    assert job.status == FAILED
+    assert job.error
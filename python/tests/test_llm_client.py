@@ -0,0 +1,122 @@
+# tests/test_llm_client.py
+
+import asyncio
+import time
+
+import pytest
+
+import sys
+import os
+
+# setting path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.mock_openai import MockOpenAIServer
+from llm_client import AsyncLLMClient, LLMError
+
+
+def make_client(server, **kwargs):
+    kwargs.setdefault("backoff_base", 0.01)
+    return AsyncLLMClient(api_key="mock", model="mock", base_url=server.base_url, **kwargs)
+
+
+def test_complete_records_usage():
+    with MockOpenAIServer(latency=0.0, completion_token_latency=0.0) as server:
+        client = make_client(server)
+        answer = client.complete_sync("System", "Probability True: XX%")
+
+    assert answer.startswith("- Probability True")
+    stats = client.stats()
+    assert stats["calls"] == 1 and stats["errors"] == 0 and stats["retries"] == 0
+    assert stats["prompt_tokens"] > 0 and stats["completion_tokens"] > 0
+    assert stats["latency_seconds"]["p50"] > 0
+    assert client.recent_calls()[0]["attempts"] == 1
+
+
+def test_rate_limited_requests_are_retried():
+    with MockOpenAIServer(latency=0.0, completion_token_latency=0.0, rate_limit_every=2) as server:
+        client = make_client(server)
+        answers = [client.complete_sync("System", f"Statement {i}") for i in range(3)]
+
+    assert len(answers) == 3
+    assert server.rate_limited >= 2
+    stats = client.stats()
+    assert stats["errors"] == 0
+    assert stats["retries"] == stats["rate_limited"] == server.rate_limited
+
+
+def test_retry_after_header_is_honoured():
+    with MockOpenAIServer(latency=0.0, completion_token_latency=0.0, rate_limit_every=1, retry_after=0.2) as server:
+        client = make_client(server, max_retries=1)
+        start = time.perf_counter()
+        with pytest.raises(LLMError):
+            client.complete_sync("System", "Statement")
+        elapsed = time.perf_counter() - start
+
+    assert elapsed >= 0.2
+    assert len(server.requests) == 2
+    assert client.stats()["errors"] == 1
+
+
+def test_in_flight_requests_are_bounded():
+    with MockOpenAIServer(latency=0.05, completion_token_latency=0.0) as server:
+        client = make_client(server, max_in_flight=3)
+
+        async def run():
+            await asyncio.gather(*(client.complete("System", f"Statement {i}") for i in range(12)))
+
+        asyncio.run(run())
+
+    assert server.max_in_flight == 3
+    assert client.stats()["calls"] == 12
+
+
+def test_request_rate_is_limited():
+    with MockOpenAIServer(latency=0.0, completion_token_latency=0.0) as server:
+        client = make_client(server, requests_per_second=20, burst=1)
+
+        async def run():
+            await asyncio.gather(*(client.complete("System", f"Statement {i}") for i in range(6)))
+
+        start = time.perf_counter()
+        asyncio.run(run())
+        elapsed = time.perf_counter() - start
+
+    # One request immediately, the other five at 20 per second
+    assert elapsed >= 0.2
+
+
+def test_stream_yields_pieces():
+    with MockOpenAIServer(latency=0.0, completion_token_latency=0.0) as server:
+        client = make_client(server)
+        pieces = list(client.stream_sync("System", "Statement"))
+
+    assert len(pieces) > 1
+    assert "".join(pieces).startswith("The statement is false.")
+    timing = client.recent_calls()[0]
+    assert timing["first_token_seconds"] <= timing["latency_seconds"]
+    assert timing["completion_tokens"] > 0
+
+
+def test_every_failure_is_an_llm_error(monkeypatch):
+    """Empty answers and errors outside the openai hierarchy are raised as LLMError."""
+    from types import SimpleNamespace
+
+    client = AsyncLLMClient(api_key="mock", model="mock")
+
+    async def no_content(**kwargs):
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=None))], usage=None)
+
+    async def broken(**kwargs):
+        raise RuntimeError("connection pool closed")
+
+    monkeypatch.setattr(client._client.chat.completions, "create", no_content)
+    with pytest.raises(LLMError, match="no content"):
+        client.complete_sync("System", "Statement")
+
+    monkeypatch.setattr(client._client.chat.completions, "create", broken)
+    with pytest.raises(LLMError, match="connection pool closed"):
+        client.complete_sync("System", "Statement")
+    with pytest.raises(LLMError):
+        list(client.stream_sync("System", "Statement"))
+    assert client.stats()["errors"] == 3
@@ -0,0 +1,81 @@
+# tests/test_ocr.py
+
+import shutil
+import pytest
+import numpy as np
+from PIL import Image, ImageDraw
+
+import sys
+import os
+
+# setting path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ocr import OCREngine, detect_text_region, ink_mask, otsu_threshold, prepare_image, tesserocr
+
+
+PICS = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "pics")
+
+requires_tesseract = pytest.mark.skipif(
+    tesserocr is None and shutil.which("tesseract") is None, reason="Tesseract is not installed"
+)
+
+
+def text_block(size=(600, 400), lines=3, line_height=20, top=100, left=50, background=255, ink=0):
+    """An image with dark bars shaped like text lines."""
+    image = Image.new("L", size, background)
+    draw = ImageDraw.Draw(image)
+    step = max(12, line_height // 2)
+    for i in range(lines):
+        y = top + i * line_height * 2
+        for x in range(left, left + 25 * step, step):
+            draw.rectangle((x, y, x + step // 4 - 1, y + line_height - 1), fill=ink)
+    return image
+
+
+def test_otsu_threshold_separates_classes():
+    gray = np.array([[20] * 50 + [230] * 50], dtype=np.uint8)
+    assert 20 <= otsu_threshold(gray) < 230
+    assert ink_mask(np.array([[20] * 10 + [230] * 90], dtype=np.uint8)).sum() == 10
+    # Light text on a dark background is the minority class as well
+    assert ink_mask(np.array([[230] * 10 + [20] * 90], dtype=np.uint8)).sum() == 10
+
+
+def test_detect_text_region():
+    region, line_height = detect_text_region(text_block())
+    left, top, right, bottom = region
+    assert line_height == pytest.approx(20)
+    assert left <= 50 and top <= 100
+    assert right >= 345 and bottom >= 180
+    assert right - left < 400 and bottom - top < 150
+
+
+def test_detect_text_region_without_text():
+    assert detect_text_region(Image.new("L", (100, 100), 128)) == (None, None)
+
+
+def test_prepare_image_scales_text_to_target_height():
+    prepared = prepare_image(text_block(size=(3000, 2000), line_height=100, top=500, left=250), text_height=40)
+    _, line_height = detect_text_region(prepared)
+    assert line_height == pytest.approx(40, abs=3)
+    assert prepared.width * prepared.height < 3000 * 2000 / 10
+
+
+def test_prepare_image_binarizes_light_text_to_dark():
+    prepared = prepare_image(text_block(background=10, ink=240), binarize=True)
+    pixels = np.asarray(prepared)
+    assert set(np.unique(pixels)) <= {0, 255}
+    assert (pixels == 255).mean() > 0.5
+
+
+def test_prepare_image_limits_size():
+    prepared = prepare_image(text_block(line_height=4), text_height=40, max_pixels=100_000)
+    assert prepared.width * prepared.height <= 100_000 * 1.01
+
+
+@requires_tesseract
+def test_recognizes_sharepic_text():
+    engine = OCREngine()
+    texts = engine.map([Image.open(os.path.join(PICS, name)) for name in ("warming.png", "flat_earth.jpg")])
+    assert "global warming" in texts[0].lower()
+    assert "earth" in texts[1].lower() and "flat" in texts[1].lower()
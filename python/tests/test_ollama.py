@@ -0,0 +1,93 @@
+# tests/test_ollama.py
+
+import json
+
+import pytest
+
+import sys
+import os
+
+# setting path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from mock_ollama import MockOllamaServer
+from llm_client import LLMError
+from ollama import OllamaBackend, query_ollama
+
+
+@pytest.fixture(scope="module")
+def server():
+    with MockOllamaServer(latency=0.0, prompt_token_latency=0.0, completion_token_latency=0.0, num_parallel=2) as mock:
+        yield mock
+
+
+def test_complete_and_usage(server):
+    backend = OllamaBackend(model="llama3.2", server_url=server.server_url)
+    answer = backend.complete_sync("System", "Probability True: XX%")
+
+    assert answer.startswith("- Probability True")
+    assert server.requests[-1]["stream"] is False
+    stats = backend.stats()
+    assert stats["backend"] == "ollama" and stats["calls"] == 1
+    assert stats["prompt_tokens"] > 0 and stats["completion_tokens"] > 0
+
+
+def test_json_format_and_streaming(server):
+    backend = OllamaBackend(model="llama3.2", server_url=server.server_url)
+    pieces = list(backend.stream_sync("System", "Statement", response_format={"type": "json_object"}))
+
+    assert len(pieces) > 1
+    assert server.requests[-1]["format"] == "json"
+    assert json.loads("".join(pieces))["probability_false"] == 90
+    assert backend.recent_calls()[0]["first_token_seconds"] is not None
+
+
+def test_complete_many_fills_parallel_slots():
+    with MockOllamaServer(latency=0.05, prompt_token_latency=0.0, completion_token_latency=0.0, num_parallel=8) as mock:
+        backend = OllamaBackend(model="llama3.2", server_url=mock.server_url, max_in_flight=3)
+        answers = backend.complete_many([("System", f"Statement {i}") for i in range(9)])
+
+    assert len(answers) == 9
+    assert mock.max_in_flight == 3
+
+
+def test_unreachable_server_raises_llm_error():
+    backend = OllamaBackend(model="llama3.2", server_url="http://127.0.0.1:9", timeout=1)
+    with pytest.raises(LLMError):
+        backend.complete_sync("System", "Statement")
+    assert backend.stats()["errors"] == 1
+
+
+def test_query_ollama_streams_generate_endpoint(server):
+    answer = query_ollama("Summarize the following text", server_url=f"{server.server_url}/api/generate")
+    assert answer.startswith("The statement is false.")
+
+
+class TruncatedResponse:
+    """A 200 response whose body was cut off mid-JSON."""
+    status_code = 200
+    text = '{"message": {"content": "The statem'
+
+    def json(self):
+        return json.loads(self.text)
+
+    def iter_lines(self):
+        yield b'{"message": {"content": "The "}, "done": false}'
+        yield self.text.encode("utf-8")
+
+    def close(self):
+        pass
+
+
+def test_malformed_responses_raise_llm_error(monkeypatch):
+    backend = OllamaBackend(model="llama3.2")
+    monkeypatch.setattr(backend.session, "post", lambda *args, **kwargs: TruncatedResponse())
+
+    with pytest.raises(LLMError):
+        backend.complete_sync("System", "Statement")
+    with pytest.raises(LLMError):
+        list(backend.stream_sync("System", "Statement"))
+    assert backend.stats()["errors"] == 2
+    # Both slots were released
+    assert backend._slots.acquire(blocking=False)
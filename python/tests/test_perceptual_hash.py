@@ -0,0 +1,72 @@
+# tests/test_perceptual_hash.py
+
+import random
+from io import BytesIO
+from PIL import Image, ImageDraw
+
+import sys
+import os
+
+# setting path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from perceptual_hash import BKTree, dhash, dhash_bytes, hamming_distance, hash_to_hex, hex_to_hash
+
+
+PICS = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "pics")
+
+
+def load_pic(name):
+    return Image.open(os.path.join(PICS, name)).convert("RGB")
+
+
+def encode(image, quality=90):
+    buffer = BytesIO()
+    image.save(buffer, "JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def test_near_duplicates_have_close_hashes():
+    """Re-encoded, resized and watermarked copies stay within a few bits."""
+    original = load_pic("flat_earth.jpg")
+    reference = dhash(original)
+
+    resized = original.resize((original.width // 2, original.height // 2))
+    watermarked = original.copy()
+    ImageDraw.Draw(watermarked).text((10, 10), "@reposter", fill="white")
+
+    assert hamming_distance(reference, dhash_bytes(encode(original, quality=40))) <= 6
+    assert hamming_distance(reference, dhash(resized)) <= 6
+    assert hamming_distance(reference, dhash(watermarked)) <= 6
+
+
+def test_different_images_have_distant_hashes():
+    assert hamming_distance(dhash(load_pic("flat_earth.jpg")), dhash(load_pic("warming.png"))) > 10
+
+
+def test_hex_round_trip():
+    value = dhash(load_pic("warming.png"))
+    assert len(hash_to_hex(value)) == 16
+    assert hex_to_hash(hash_to_hex(value)) == value
+
+
+def test_bk_tree_matches_linear_scan():
+    """The BK-tree returns exactly the hashes a linear scan finds."""
+    rng = random.Random(0)
+    hashes = [rng.getrandbits(64) for _ in range(500)]
+    tree = BKTree()
+    for record_id, value in enumerate(hashes):
+        tree.add(value, record_id)
+    tree.add(hashes[0], "duplicate")
+
+    for query in hashes[:20] + [rng.getrandbits(64) for _ in range(20)]:
+        expected = sorted(
+            (hamming_distance(query, value), record_id)
+            for record_id, value in enumerate(hashes)
+            if hamming_distance(query, value) <= 20
+        )
+        found = [(d, v) for d, v in tree.search(query, 20) if v != "duplicate"]
+        assert sorted(found) == expected
+
+    assert (0, "duplicate") in tree.search(hashes[0], 0)
+    assert tree.size == 501
@@ -0,0 +1,63 @@
+# tests/test_render.py
+
+from PIL import Image
+
+import sys
+import os
+
+# setting path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from render import LayerCache, VerdictRenderer, fade_table
+
+
+def logo_file(tmp_path, color=(0, 0, 255, 255)):
+    path = os.path.join(tmp_path, "logo.png")
+    Image.new("RGBA", (60, 20), color).save(path)
+    return path
+
+
+def test_fade_matches_blend_with_white():
+    image = Image.effect_noise((64, 48), 64).convert("RGB")
+    expected = Image.blend(image, Image.new("RGB", image.size, "white"), 0.5)
+    faded = image.point(fade_table(0.5))
+    assert max(abs(a - b) for a, b in zip(faded.tobytes(), expected.tobytes())) <= 1
+
+
+def test_cross_out_draws_one_red_cross():
+    image = Image.new("RGB", (200, 100), (0, 0, 0))
+    crossed = VerdictRenderer(cross_width=10).cross_out(image)
+    assert crossed.getpixel((100, 50)) == (255, 0, 0)
+    assert crossed.getpixel((100, 5)) == (128, 128, 128)
+    assert image.getpixel((100, 50)) == (0, 0, 0)  # The input is unchanged
+
+
+def test_logo_is_scaled_and_cached_per_width(tmp_path):
+    renderer = VerdictRenderer(logo_file(tmp_path), logo_fraction=0.5)
+    for _ in range(3):
+        edited = renderer.render(Image.new("RGB", (300, 200), "white"), is_likely_true=True)
+    assert edited.getpixel((299, 199)) == (0, 0, 255)
+    assert edited.getpixel((149, 199)) == (255, 255, 255)  # Logo is 150 px wide
+    assert edited.getpixel((299, 149)) == (255, 255, 255)  # and 50 px high
+    assert len(renderer._logos) == 1
+
+
+def test_transparent_logo_is_pasted_with_its_alpha_channel(tmp_path):
+    renderer = VerdictRenderer(logo_file(tmp_path, color=(0, 0, 255, 0)))
+    edited = renderer.render(Image.new("RGB", (300, 200), "white"), is_likely_true=True)
+    assert edited.getpixel((299, 199)) == (255, 255, 255)
+
+
+def test_missing_logo_is_skipped(tmp_path):
+    renderer = VerdictRenderer(os.path.join(tmp_path, "missing.png"))
+    image = Image.new("RGB", (30, 20), "white")
+    assert renderer.render(image, is_likely_true=True) is image
+
+
+def test_layer_cache_evicts_least_recently_used():
+    cache = LayerCache(2)
+    created = []
+    create = lambda key: created.append(key) or key
+    for key in (1, 2, 1, 3, 1, 2):
+        cache.get(key, create)
+    assert created == [1, 2, 3, 2]
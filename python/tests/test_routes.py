@@ -1,5 +1,7 @@
 # tests/test_routes.py
 
+import os
+import json
 import pytest
 from io import BytesIO
 from PIL import Image
@@ -75,14 +77,201 @@ def test_process_image_cached_upload(test_client, simple_jpeg):
 
 def test_gallery_images(test_client):
     """
-    Test the /api/gallery-images route.
-    Depending on your local environment, you might have to mock the filesystem
-    or place some test files in the uploads folder.
+    Test the /api/gallery-images route: one page of processed images and the
+    cursor of the next page.
     """
     response = test_client.get('/api/gallery-images')
     assert response.status_code == 200
     data = response.get_json()
-    assert isinstance(data, list)  # should return a list of dicts
-    # If your uploads folder is empty, this might be an empty list.
-    # If you want to test with real or mock files,
-    # create them before calling this test.
+    assert isinstance(data["images"], list)
+    assert "next_cursor" in data
+    assert test_client.get('/api/gallery-images?cursor=invalid').status_code == 400
+
+def test_gallery_pagination(test_client, tmp_path):
+    """Pages follow each other newest first, with thumbnails generated once."""
+    from ..app import Session, ImageRecord, create_and_commit_record
+
+    session = Session()
+    hashes = []
+    for i in range(3):
+        output_path = os.path.join(tmp_path, f"gallery{i}_output.jpg")
+        Image.new('RGB', (800, 600), color=(i * 80, 0, 0)).save(output_path, 'JPEG')
+        hashes.append(f"gallery-test-{i}")
+        create_and_commit_record(session, hashes[-1], None, output_path, "text", "False.")
+    try:
+        first = test_client.get('/api/gallery-images?limit=2').get_json()
+        assert [image["hash"] for image in first["images"]] == [hashes[2], hashes[1]]
+        assert first["next_cursor"]
+        thumbnail = first["images"][0]["output_thumbnail"]
+        assert thumbnail == "/thumbnails/gallery2_output.jpg"
+        response = test_client.get(thumbnail)
+        assert Image.open(BytesIO(response.data)).size == (320, 240)
+        assert 'immutable' in response.headers['Cache-Control']
+        assert test_client.get(thumbnail, headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+        webp = test_client.get(first["images"][0]["output_thumbnail_webp"])
+        assert webp.headers['Content-Type'] == 'image/webp'
+
+        second = test_client.get(f'/api/gallery-images?limit=2&cursor={first["next_cursor"]}').get_json()
+        assert second["images"][0]["hash"] == hashes[0]
+        record = session.query(ImageRecord).filter_by(hash=hashes[0]).one()
+        session.refresh(record)
+        assert record.output_thumbnail_path is not None
+    finally:
+        for record in session.query(ImageRecord).filter(ImageRecord.hash.in_(hashes)):
+            if record.output_thumbnail_path:
+                os.remove(record.output_thumbnail_path)
+                os.remove(record.output_thumbnail_path[:-len(".jpg")] + ".webp")
+            session.delete(record)
+        session.commit()
+        session.close()
+
+def test_liveness(test_client):
+    """The liveness probe answers while the search index may still be loading."""
+    response = test_client.get('/health/live')
+    assert response.status_code == 200
+    assert response.get_json() == {"status": "alive"}
+
+def test_readiness(test_client):
+    """The readiness probe reports the loading state of the search index."""
+    response = test_client.get('/health/ready')
+    assert response.status_code in (200, 503)
+    assert response.get_json()["status"] in ("ready", "loading", "failed")
+
+def test_admin_search_index(test_client, monkeypatch):
+    """The admin routes report the live index generation, need the admin token and are disabled without one."""
+    from ..app import config
+    monkeypatch.setattr(config, "ADMIN_TOKEN", None)
+    assert test_client.get('/admin/search-index').status_code == 403
+
+    monkeypatch.setattr(config, "ADMIN_TOKEN", "secret")
+    assert test_client.get('/admin/search-index').status_code == 403
+    assert test_client.post('/admin/search-index/reload').status_code == 403
+
+    response = test_client.get('/admin/search-index', headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 200
+    assert "generation" in response.get_json()
+
+def test_process_image_job(test_client, simple_jpeg):
+    """Submitting to the job API returns a job that can be polled until done."""
+    response = test_client.post('/process-image/jobs', data={'image': (simple_jpeg, 'test_image.jpg')},
+                                content_type='multipart/form-data')
+    assert response.status_code in (200, 202)
+    job = response.get_json()
+
+    status = test_client.get(f"{job['status_url']}?wait=30").get_json()
+    assert status["status"] == "done"
+    result = test_client.get(status["result_url"])
+    assert result.headers['Content-Type'] == 'image/jpeg'
+    assert 'x-description' in result.headers
+
+def test_process_image_stream(test_client, simple_jpeg):
+    """The streaming endpoint sends the status first and ends with the verdict and the result URL."""
+    response = test_client.post('/process-image/stream', data={'image': (simple_jpeg, 'test_image.jpg')},
+                                content_type='multipart/form-data')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+
+    import json
+    events = [
+        (block.split("\n")[0][len("event: "):], json.loads(block.split("\n")[1][len("data: "):]))
+        for block in response.get_data(as_text=True).strip().split("\n\n")
+    ]
+    names = [name for name, _ in events]
+    assert names[0] == "status"
+    assert names[-2:] == ["verdict", "done"]
+    assert "ocr" in names
+    assert events[-1][1]["status"] == "done"
+    assert test_client.get(events[-1][1]["result_url"]).headers['Content-Type'] == 'image/jpeg'
+
+def test_unknown_job(test_client):
+    assert test_client.get('/process-image/jobs/unknown').status_code == 404
+
+def test_job_metrics(test_client):
+    metrics = test_client.get('/api/job-metrics').get_json()
+    assert "queue_depth" in metrics
+
+def test_llm_stats(test_client):
+    stats = test_client.get('/api/llm-stats?calls=5').get_json()
+    assert "calls" in stats and "recent_calls" in stats
+
+def test_cached_result_with_conditional_get(test_client, tmp_path):
+    """A processed image is served from disk with its full verdict, an ETag and 304 on revalidation."""
+    from ..app import Session, ImageRecord, create_and_commit_record, generate_image_hash
+
+    upload = BytesIO()
+    Image.new('RGB', (64, 48), color=(12, 34, 56)).save(upload, 'JPEG')
+    image_hash = generate_image_hash(upload.getvalue())
+    output_path = os.path.join(tmp_path, "output.jpg")
+    Image.new('RGB', (64, 48), color='red').save(output_path, 'JPEG')
+    verdict = {"statement_analysis": "False.", "sources": {"1": ["Report", "https://example.org/1"]},
+               "probability_true": 5, "probability_false": 90, "probability_undecided": 5, "is_likely_true": False}
+
+    session = Session()
+    create_and_commit_record(session, image_hash, None, output_path, "text", "False.", verdict=verdict)
+    try:
+        response = test_client.post('/process-image', data={'image': (BytesIO(upload.getvalue()), 'upload.jpg')},
+                                    content_type='multipart/form-data')
+        assert response.status_code == 200
+        assert response.headers['ETag'] == f'"{image_hash}"'
+        assert 'Last-Modified' in response.headers
+        description = json.loads(response.headers['x-description'])
+        assert description["is_statement_true"] is False
+        assert description["probability_false"] == 90
+        assert description["sources"] == [{"title": "Report", "url": "https://example.org/1"}]
+
+        result = test_client.get(f'/results/{image_hash}')
+        assert result.status_code == 200
+        assert result.data == open(output_path, 'rb').read()
+
+        assert test_client.get(f'/results/{image_hash}',
+                               headers={'If-None-Match': f'"{image_hash}"'}).status_code == 304
+        assert test_client.get(f'/results/{image_hash}',
+                               headers={'If-Modified-Since': result.headers['Last-Modified']}).status_code == 304
+        assert test_client.get('/results/unknown').status_code == 404
+    finally:
+        session.query(ImageRecord).filter_by(hash=image_hash).delete()
+        session.commit()
+        session.close()
+
+def test_near_duplicate_of_record_stored_by_another_worker(test_client, tmp_path):
+    """Records inserted by other processes are found by the next near-duplicate lookup."""
+    from ..app import Session, ImageRecord, engine, find_near_duplicate, hash_to_hex
+    from sqlalchemy import text
+
+    output_path = os.path.join(tmp_path, "other_worker_output.jpg")
+    Image.new('RGB', (64, 48), color='red').save(output_path, 'JPEG')
+    phash = 0x0123456789abcdef
+    with engine.begin() as connection:
+        connection.execute(text(
+            "INSERT INTO image_records (hash, output_image_path, phash) VALUES (:hash, :path, :phash)"
+        ), {"hash": "other-worker-test", "path": output_path, "phash": hash_to_hex(phash)})
+
+    session = Session()
+    try:
+        record = find_near_duplicate(session, phash ^ 0b101)
+        assert record is not None and record.hash == "other-worker-test"
+    finally:
+        session.query(ImageRecord).filter_by(hash="other-worker-test").delete()
+        session.commit()
+        session.close()
+
+def test_similar_claim_stored_by_another_worker(test_client):
+    """Claims stored by other processes are found by the next claim lookup."""
+    from ..app import Session, ImageRecord, ClaimIndex, engine, find_similar_claim
+    from sqlalchemy import text
+    import numpy as np
+
+    claim = np.arange(1, 9, dtype="float32")
+    verdict = {"statement_analysis": "False.", "is_likely_true": False}
+    with engine.begin() as connection:
+        connection.execute(text(
+            "INSERT INTO image_records (hash, verdict, claim_embedding) VALUES (:hash, :verdict, :embedding)"
+        ), {"hash": "other-worker-claim", "verdict": json.dumps(verdict), "embedding": ClaimIndex.encode(claim)})
+
+    session = Session()
+    try:
+        assert find_similar_claim(session, 2 * claim) == verdict
+    finally:
+        session.query(ImageRecord).filter_by(hash="other-worker-claim").delete()
+        session.commit()
+        session.close()
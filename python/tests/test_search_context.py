@@ -0,0 +1,167 @@
+# tests/test_search_context.py
+
+import threading
+import pytest
+import numpy as np
+import faiss
+from unittest.mock import patch
+
+import sys
+import os
+
+# setting path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search_context import SearchContext, SearchContextUnavailable, SearchGeneration, GenerationStore, validate_generation
+from search_faiss import SearchIndex
+
+
+def test_search_context_loads_in_background():
+    """start() returns immediately, wait() blocks until the index is loaded."""
+    release = threading.Event()
+
+    def slow_initialize(model_name, similarity_metric):
+        release.wait(5)
+        return SearchIndex("index", ["chunk"], [{}]), "model", False
+
+    with patch("search_faiss.initialize_search_index", side_effect=slow_initialize):
+        context = SearchContext("model", "L2").start()
+        assert not context.ready
+        assert context.status()["status"] == "loading"
+        with pytest.raises(SearchContextUnavailable):
+            context.wait(timeout=0.01)
+
+        release.set()
+        context.wait(timeout=5)
+
+    assert context.ready
+    assert context.faiss_index == "index"
+    assert context.all_chunks == ["chunk"]
+    assert context.status()["status"] == "ready"
+
+
+def test_search_context_reports_failure():
+    """A loading error is kept and reported instead of crashing the app."""
+    with patch("search_faiss.initialize_search_index", side_effect=ValueError("No FAISS index available")):
+        context = SearchContext("model", "L2").start()
+        with pytest.raises(SearchContextUnavailable, match="No FAISS index available"):
+            context.wait(timeout=5)
+
+    assert not context.ready
+    assert context.status()["status"] == "failed"
+
+
+class FakeModel:
+    def encode(self, texts, **kwargs):
+        return np.ones((len(texts), 4), dtype="float32")
+
+
+class FakeStore(list):
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def flat_index(size, dimension=4):
+    index = faiss.IndexFlatL2(dimension)
+    index.add(np.random.default_rng(size).standard_normal((size, dimension)).astype("float32"))
+    return index
+
+
+def loaded_context(size=3, **kwargs):
+    chunks, metadata = FakeStore(f"chunk {i}" for i in range(size)), FakeStore({} for _ in range(size))
+    with patch("search_faiss.initialize_search_index",
+               return_value=(SearchIndex(flat_index(size), chunks, metadata), FakeModel(), False)):
+        context = SearchContext("model", "L2", **kwargs).wait(timeout=5)
+    return context, chunks
+
+
+def test_reload_swaps_generations_after_requests_finish():
+    """Requests finish on the generation they started on, it is closed after the last one."""
+    context, old_chunks = loaded_context(3)
+    new_chunks = FakeStore(f"new chunk {i}" for i in range(5))
+
+    with context.acquire() as generation:
+        with patch("search_faiss.load_search_index", return_value=SearchIndex(flat_index(5), new_chunks, FakeStore({} for _ in range(5)))):
+            context.reload().join(5)
+        assert context.status()["generation"]["generation"] == 2
+        assert context.all_chunks is new_chunks
+        # The request still searches generation 1
+        assert generation.number == 1
+        assert generation.all_chunks is old_chunks
+        assert not old_chunks.closed
+
+    assert old_chunks.closed
+    assert generation.faiss_index is None
+    assert context.status()["reload"]["status"] == "done"
+
+    # Without requests in flight the old generation is closed right away
+    with patch("search_faiss.load_search_index", return_value=SearchIndex(flat_index(5), FakeStore(range(5)), FakeStore({} for _ in range(5)))):
+        context.reload().join(5)
+    assert context.generation.number == 3
+    assert new_chunks.closed
+
+
+def test_reload_keeps_the_live_generation_if_the_new_one_is_invalid():
+    """A new generation whose index doesn't fit its chunks is never swapped in."""
+    context, old_chunks = loaded_context(3)
+    bad_chunks = FakeStore(["only one chunk"])
+    with patch("search_faiss.load_search_index", return_value=SearchIndex(flat_index(5), bad_chunks, FakeStore([{}]))):
+        context.reload().join(5)
+
+    status = context.status()
+    assert status["reload"]["status"] == "failed"
+    assert "chunks" in status["reload"]["error"]
+    assert status["generation"]["generation"] == 1
+    assert context.all_chunks is old_chunks
+    assert bad_chunks.closed
+
+
+def test_validate_generation_checks_the_embedding_dimension():
+    generation = SearchGeneration(1, SearchIndex(flat_index(3, dimension=8), ["a", "b", "c"], [{}, {}, {}]), FakeModel(), False)
+    with pytest.raises(ValueError, match="dimensions"):
+        validate_generation(generation)
+
+
+def test_reload_closes_the_new_index_if_validation_raises():
+    """A generation that fails in an unexpected way still releases its files."""
+    context, old_chunks = loaded_context(3)
+    new_chunks, new_metadata = FakeStore(range(5)), FakeStore({} for _ in range(5))
+    with patch("search_faiss.load_search_index", return_value=SearchIndex(flat_index(5), new_chunks, new_metadata)), \
+            patch("search_context.validate_generation", side_effect=RuntimeError("probe failed")):
+        context.reload().join(5)
+
+    assert context.status()["reload"]["status"] == "failed"
+    assert context.all_chunks is old_chunks
+    assert new_chunks.closed and new_metadata.closed
+
+
+def test_reload_request_reaches_every_worker(tmp_path):
+    """A reload requested through the shared store is picked up by each worker on its next request."""
+    store = GenerationStore(f"sqlite:///{tmp_path / 'search.db'}")
+    # Workers on other hosts, whose liveness can't be checked
+    first, _ = loaded_context(store=store, check_interval=0, owner="worker-a:1")
+    second, second_chunks = loaded_context(store=store, check_interval=0, owner="worker-b:2")
+    assert [w["generation"] for w in store.workers()] == [1, 1]
+
+    assert store.request() == 2
+    with patch("search_faiss.load_search_index",
+               side_effect=lambda *args: SearchIndex(flat_index(5), FakeStore(range(5)), FakeStore({} for _ in range(5)))):
+        for context in (first, second):
+            with context.acquire() as generation:
+                assert generation.number == 1  # The request that noticed the reload still searches the old one
+            context._reload_thread.join(5)
+
+    assert first.generation.number == second.generation.number == 2
+    assert second_chunks.closed
+    assert [(w["generation"], w["reload_status"]) for w in store.workers()] == [(2, "done"), (2, "done")]
+    # Nothing newer is requested, the next request doesn't reload
+    assert first.refresh(force=True) is None
+
+
+def test_reload_needs_a_loaded_context():
+    assert SearchContext("model", "L2").reload() is None
+    with pytest.raises(SearchContextUnavailable):
+        with SearchContext("model", "L2").acquire():
+            pass
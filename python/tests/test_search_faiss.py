@@ -0,0 +1,336 @@
+# tests/test_search_faiss.py
+
+import pytest
+import numpy as np
+import faiss
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import sys
+import os
+
+# setting path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import search_faiss
+from text_index import build_text_index
+
+
+DIMENSION = 8
+TYPES = ["Report", "Briefing", "Press Release"]
+
+
+class FakeModel:
+    """Deterministic stand-in for a SentenceTransformer."""
+
+    def encode(self, text, **kwargs):
+        if isinstance(text, list):
+            return np.stack([self.encode(t) for t in text])
+        rng = np.random.default_rng(zlib.crc32(text.encode("utf-8")))
+        return rng.standard_normal(DIMENSION).astype("float32")
+
+
+@pytest.fixture
+def corpus():
+    """A small in-memory corpus with a flat L2 index."""
+    rng = np.random.default_rng(0)
+    size = 60
+    embeddings = rng.standard_normal((size, DIMENSION)).astype("float32")
+    index = faiss.IndexFlatL2(DIMENSION)
+    index.add(embeddings)
+    metadata = [
+        {
+            "Title": f"Doc {i}",
+            "Publication Type": TYPES[i % len(TYPES)],
+            "Publication Date": "Jan 15, 2024, 10:00:00 AM",
+            "Article URL": f"https://example.org/{i}",
+            "PDF URL": f"https://example.org/{i}.pdf",
+        }
+        for i in range(size)
+    ]
+    chunks = [f"chunk {i}" for i in range(size)]
+    return index, metadata, chunks
+
+
+def test_publication_metadata_index_ids(corpus):
+    """Each type maps to the sorted IDs of its chunks."""
+    _, metadata, _ = corpus
+    metadata_index = search_faiss.MetadataIndex(metadata)
+    assert metadata_index.ids_for(["Report"]).tolist() == list(range(0, 60, 3))
+    assert metadata_index.ids_for(["Report", "Briefing"]).tolist() == [i for i in range(60) if i % 3 != 2]
+    assert len(metadata_index.ids_for(["Missing"])) == 0
+
+
+def test_publication_type_selector_is_cached(corpus):
+    """The same set of types reuses one selector, each search gets its own parameters."""
+    _, metadata, _ = corpus
+    metadata_index = search_faiss.MetadataIndex(metadata)
+    selector = metadata_index.selector_for(["Report", "Briefing"])
+    assert selector is metadata_index.selector_for(("Briefing", "Report"))
+    params = metadata_index.search_params(["Report", "Briefing"])
+    assert params is not metadata_index.search_params(("Briefing", "Report"))
+    assert metadata_index.selector_for(["Missing"]) is None
+    assert metadata_index.search_params(["Missing"]) is None
+
+
+def test_publication_type_selector_is_built_once_across_threads(corpus):
+    """Threads missing the cache at once all get the one cached selector."""
+    _, metadata, _ = corpus
+    metadata_index = search_faiss.MetadataIndex(metadata)
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        selectors = list(pool.map(lambda _: metadata_index.selector_for(TYPES), range(64)))
+    assert all(selector is selectors[0] for selector in selectors)
+
+
+def test_metadata_index_is_reused_for_the_same_metadata(corpus):
+    _, metadata, _ = corpus
+    metadata_index = search_faiss.metadata_index_for(metadata)
+    assert search_faiss.metadata_index_for(metadata) is metadata_index
+    assert search_faiss.metadata_index_for(list(metadata)) is not metadata_index
+
+
+def test_search_pdfs_filters_by_type(corpus):
+    """Only chunks of the selected types are returned."""
+    index, metadata, chunks = corpus
+    results = search_faiss.search_pdfs(
+        "electric cars", index, FakeModel(), chunks, metadata, publication_types=["Briefing"]
+    )
+    assert results
+    assert all(r["publication_type"] == "Briefing" for r in results)
+
+
+def test_search_pdfs_empty_selection(corpus):
+    """An empty type selection returns no results."""
+    index, metadata, chunks = corpus
+    assert search_faiss.search_pdfs("electric cars", index, FakeModel(), chunks, metadata, publication_types=[]) == []
+
+
+def test_parse_publication_days():
+    """Dates are parsed once into epoch days, unknown dates become NaN."""
+    days = search_faiss.parse_publication_days([
+        {"Publication Date": "Jan 02, 1970, 12:00:00 AM"},
+        {"Publication Date": "Unknown Date"},
+        {},
+    ])
+    assert days[0] == 1.0
+    assert np.isnan(days[1]) and np.isnan(days[2])
+    assert search_faiss.format_publication_day(days[0]) == "January 02, 1970"
+    assert search_faiss.format_publication_day(days[1]) == "Unknown Date"
+
+
+def test_rank_results_prefers_recent_publications(corpus):
+    """With a strong decay, a newer chunk outranks an equally similar older one."""
+    _, metadata, chunks = corpus
+    metadata = [dict(meta) for meta in metadata]
+    metadata[1]["Publication Date"] = "Jan 15, 2004, 10:00:00 AM"
+    metadata_index = search_faiss.MetadataIndex(metadata)
+
+    indices = np.array([1, 0, 2, -1])
+    distances = np.array([0.5, 0.5, 3.0, 0.0], dtype="float32")
+
+    results = search_faiss.rank_results(indices, distances, chunks, metadata, metadata_index, alpha=1.0, top_k=2)
+    assert [r["title"] for r in results] == ["Doc 0", "Doc 2"]
+    assert results[0]["weighted_score"] >= results[1]["weighted_score"]
+
+    results = search_faiss.rank_results(indices, distances, chunks, metadata, metadata_index, alpha=0.0, top_k=5)
+    assert [r["title"] for r in results] == ["Doc 1", "Doc 0", "Doc 2"]
+    assert results[0]["publication_date"] == "January 15, 2004"
+
+
+def test_search_pdfs_batch_matches_single_queries(corpus):
+    """The batch path returns the same results as one search_pdfs call per query."""
+    index, metadata, chunks = corpus
+    queries = ["electric cars", "biofuels", "aviation"]
+    batch = search_faiss.search_pdfs_batch(
+        queries, index, FakeModel(), chunks, metadata, alpha=0.05, publication_types=TYPES, batch_size=2
+    )
+    assert len(batch) == len(queries)
+    for query, results in zip(queries, batch):
+        single = search_faiss.search_pdfs(query, index, FakeModel(), chunks, metadata, alpha=0.05, publication_types=TYPES)
+        assert [r["title"] for r in results] == [r["title"] for r in single]
+
+
+def test_search_pdfs_batch_empty_selection(corpus):
+    """An empty type selection returns an empty result list for every query."""
+    index, metadata, chunks = corpus
+    assert search_faiss.search_pdfs_batch(["a", "b"], index, FakeModel(), chunks, metadata, publication_types=[]) == [[], []]
+
+
+@pytest.mark.parametrize("load_mode", ["mmap", "memory"])
+def test_read_faiss_index_load_modes(corpus, tmp_path, load_mode):
+    """Both load modes return an index giving the same search results."""
+    index, _, _ = corpus
+    index_file = os.path.join(tmp_path, "index.bin")
+    faiss.write_index(index, index_file)
+
+    loaded = search_faiss.read_faiss_index(index_file, load_mode)
+    query = FakeModel().encode("electric cars").reshape(1, -1)
+    assert loaded.ntotal == index.ntotal
+    assert loaded.search(query, 5)[1].tolist() == index.search(query, 5)[1].tolist()
+
+
+def test_read_faiss_index_unknown_mode(tmp_path):
+    with pytest.raises(ValueError):
+        search_faiss.read_faiss_index(os.path.join(tmp_path, "index.bin"), "shared")
+
+
+def test_process_memory_usage():
+    memory = search_faiss.process_memory_usage()
+    if memory is not None:
+        assert memory["private_mb"] > 0
+
+
+def test_search_pdfs_with_precomputed_embedding(corpus):
+    """A precomputed query embedding gives the same results as encoding the query."""
+    index, metadata, chunks = corpus
+    expected = search_faiss.search_pdfs("electric cars", index, FakeModel(), chunks, metadata, publication_types=TYPES)
+    results = search_faiss.search_pdfs(
+        "electric cars", index, None, chunks, metadata, publication_types=TYPES,
+        query_embedding=FakeModel().encode("electric cars")
+    )
+    assert [r["chunk_id"] for r in results] == [r["chunk_id"] for r in expected]
+
+
+@pytest.mark.parametrize("factory, kind", [("Flat", "flat"), ("IVF4,Flat", "ivf"), ("HNSW8", "hnsw")])
+def test_build_faiss_index_structures(corpus, factory, kind):
+    """Every structure keeps the chunk IDs, returns its vectors and is searched with matching parameters."""
+    index, metadata, chunks = corpus
+    vectors = index.reconstruct_n(0, index.ntotal)
+    built = search_faiss.build_faiss_index(vectors, factory=factory)
+    assert search_faiss.index_kind(built) == kind
+    assert built.ntotal == index.ntotal
+
+    stored, ids = search_faiss.index_vectors(built)
+    order = np.argsort(ids)
+    assert ids[order].tolist() == list(range(index.ntotal))
+    assert np.allclose(stored[order], vectors)
+
+    params = search_faiss.MetadataIndex(metadata).search_params(["Report"], kind)
+    assert type(params).__name__ == {"flat": "SearchParameters", "ivf": "SearchParametersIVF", "hnsw": "SearchParametersHNSW"}[kind]
+    results = search_faiss.search_pdfs("electric cars", built, FakeModel(), chunks, metadata, publication_types=["Report"])
+    assert results and all(r["publication_type"] == "Report" for r in results)
+
+
+def test_tuned_search_parameters(monkeypatch):
+    monkeypatch.setattr(search_faiss.config, "FAISS_NPROBE", 7)
+    monkeypatch.setattr(search_faiss.config, "FAISS_EF_SEARCH", 33)
+    assert search_faiss.index_search_parameters("ivf").nprobe == 7
+    assert search_faiss.index_search_parameters("ivf", nprobe=3).nprobe == 3
+    assert search_faiss.index_search_parameters("hnsw").efSearch == 33
+
+    vectors = np.random.default_rng(0).standard_normal((200, DIMENSION)).astype("float32")
+    ivf = search_faiss.build_faiss_index(vectors, factory="IVF4,Flat")
+    assert ivf.nprobe == 7
+    hnsw = search_faiss.build_faiss_index(vectors, factory="HNSW8")
+    assert faiss.downcast_index(hnsw.index).hnsw.efSearch == 33
+
+
+def test_index_code_size():
+    vectors = np.random.default_rng(0).standard_normal((200, DIMENSION)).astype("float32")
+    flat = search_faiss.build_faiss_index(vectors, factory="Flat")
+    sq8 = search_faiss.build_faiss_index(vectors, factory="SQ8")
+    ivf_pq = search_faiss.build_faiss_index(vectors, factory="IVF4,PQ2x4")
+    assert [search_faiss.index_code_size(i) for i in (flat, sq8, ivf_pq)] == [4 * DIMENSION, DIMENSION, 1]
+    assert not search_faiss.is_compressed_index(flat)
+    assert search_faiss.is_compressed_index(sq8) and search_faiss.is_compressed_index(ivf_pq)
+
+
+def test_compressed_index_is_reranked_exactly(corpus, tmp_path):
+    """A 4-bit index re-ranked against the float16 vectors finds the flat index's results."""
+    index, metadata, chunks = corpus
+    vectors = index.reconstruct_n(0, index.ntotal)
+    path = str(tmp_path / "vectors_f16.bin")
+    vectors.astype("float16").tofile(path)
+    compressed = search_faiss.build_faiss_index(vectors, factory="SQ4")
+    search_index = search_faiss.SearchIndex(compressed, chunks, metadata,
+                                            rerank_vectors=search_faiss.read_vectors_file(path, DIMENSION))
+
+    queries = [f"claim {i}" for i in range(10)]
+    expected = search_faiss.search_pdfs_batch(queries, index, FakeModel(), chunks, metadata, publication_types=TYPES)
+    results = search_faiss.search_pdfs_batch(queries, compressed, FakeModel(), chunks, metadata, publication_types=TYPES,
+                                             search_index=search_index)
+    for found, exact in zip(results, expected):
+        assert [r["chunk_id"] for r in found] == [r["chunk_id"] for r in exact]
+        assert np.allclose([r["score"] for r in found], [r["score"] for r in exact], rtol=1e-2)
+
+
+def test_rerank_exact_skips_missing_rows():
+    vectors = np.eye(4, DIMENSION, dtype="float16")
+    query = np.eye(1, DIMENSION, 2, dtype="float32")
+    distances, indices = search_faiss.rerank_exact(query, np.array([[3, -1, 2, 9]]), vectors, top_k=3)
+    assert indices.tolist() == [[2, 3, -1]]
+    assert distances[0, :2].tolist() == [0, 2] and np.isinf(distances[0, 2])
+
+
+def test_rerank_exact_keeps_the_inner_product_metric():
+    """Candidates of an inner-product index are re-ranked by inner product, as FAISS returns them."""
+    vectors = np.random.default_rng(0).standard_normal((50, DIMENSION)).astype("float32")
+    query = vectors[:2] + 0.1
+    flat = faiss.IndexFlatIP(DIMENSION)
+    flat.add(vectors)
+    expected_distances, expected = flat.search(query, 5)
+
+    candidates = np.tile(np.arange(50), (2, 1))
+    distances, indices = search_faiss.rerank_exact(query, candidates, vectors.astype("float16"), top_k=5,
+                                                   metric_type=faiss.METRIC_INNER_PRODUCT)
+    assert indices.tolist() == expected.tolist()
+    assert np.allclose(distances, expected_distances, rtol=1e-2)
+
+
+def test_search_pdfs_ranks_inner_product_indexes(corpus):
+    """An inner-product index ranks the most similar chunks first, like an L2 index of the same vectors."""
+    index, metadata, chunks = corpus
+    vectors = index.reconstruct_n(0, index.ntotal)
+    faiss.normalize_L2(vectors)
+    inner_product, l2 = faiss.IndexFlatIP(DIMENSION), faiss.IndexFlatL2(DIMENSION)
+    inner_product.add(vectors)
+    l2.add(vectors)
+
+    results = search_faiss.search_pdfs("", inner_product, None, chunks, metadata, normalise=True,
+                                       publication_types=TYPES, query_embedding=vectors[5])
+    expected = search_faiss.search_pdfs("", l2, None, chunks, metadata, normalise=True,
+                                        publication_types=TYPES, query_embedding=vectors[5])
+    assert results[0]["chunk_id"] == 5 and np.isclose(results[0]["score"], 1.0)
+    assert [r["chunk_id"] for r in results] == [r["chunk_id"] for r in expected]
+
+
+def test_build_faiss_index_rejects_unfilterable_structures():
+    vectors = np.random.default_rng(0).standard_normal((200, DIMENSION)).astype("float32")
+    with pytest.raises(ValueError):
+        search_faiss.build_faiss_index(vectors, factory="PQ2x4")
+
+
+def test_reciprocal_rank_fusion():
+    ids, scores = search_faiss.reciprocal_rank_fusion([[5, 3, 8], [3, 9]], k=1)
+    assert ids.tolist() == [3, 5, 9, 8]
+    assert np.allclose(scores, [1 / 3 + 1 / 2, 1 / 2, 1 / 3, 1 / 4])
+
+
+def test_search_pdfs_fuses_keyword_hits(corpus, tmp_path):
+    """A chunk naming the query's exact terms is found even if the embeddings miss it."""
+    index, metadata, chunks = corpus
+    chunks = list(chunks)
+    chunks[7] = "The Euro 7 standard limits brake dust"
+    dense = search_faiss.search_pdfs("Euro 7 standard", index, FakeModel(), chunks, metadata, publication_types=TYPES)
+    assert 7 not in [r["chunk_id"] for r in dense]
+
+    path = str(tmp_path / "text_index.bin")
+    build_text_index(path, chunks)
+    search_index = search_faiss.SearchIndex(index, chunks, metadata,
+                                            text_index=search_faiss.load_text_index(path, chunks, index))
+    results = search_faiss.search_pdfs("Euro 7 standard", index, FakeModel(), chunks, metadata, publication_types=TYPES,
+                                       search_index=search_index)
+    assert results[0]["chunk_id"] == 7
+    assert [r["chunk_id"] for r in results[1:]] == [r["chunk_id"] for r in dense[:4]]
+    # "score" stays the FAISS similarity, the fused value is "rrf_score"
+    assert results[0]["score"] < results[1]["score"] and results[0]["rrf_score"] > results[1]["rrf_score"]
+    assert [r["score"] for r in results[1:]] == [r["score"] for r in dense[:4]]
+    assert all(r["rrf_score"] is None for r in dense)
+
+    # Keyword hits respect the publication-type selection (chunk 7 is a "Briefing")
+    filtered = search_faiss.search_pdfs("Euro 7 standard", index, FakeModel(), chunks, metadata, publication_types=["Report"],
+                                        search_index=search_index)
+    assert 7 not in [r["chunk_id"] for r in filtered]
+
+    search_index.close()
+    assert search_index.text_index is None
@@ -0,0 +1,108 @@
+# tests/test_text_index.py
+
+import math
+from collections import Counter
+
+import pytest
+import numpy as np
+
+import sys
+import os
+
+# setting path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from text_index import TextIndex, build_text_index, tokenize, K1, B
+
+
+CHUNKS = [
+    "The Euro 7 standard sets limits for brake and tyre emissions.",
+    "CO2 standards for cars require zero emissions from 2035.",
+    "Trucks and buses face CO2 standards from 2030, trucks first.",
+    "Shipping emissions keep growing, the IMO target is too weak.",
+    "Euro 6 cars still emit NOx in cities.",
+]
+
+
+def bm25(chunks, ids, query):
+    """Reference BM25 scores of the indexed chunks, straight from the formula."""
+    counts = {i: Counter(tokenize(chunks[i])) for i in ids}
+    average_length = np.mean([sum(c.values()) for c in counts.values()])
+    frequencies = Counter(term for c in counts.values() for term in c)
+    scores = {}
+    for i, c in counts.items():
+        length = sum(c.values())
+        score = 0.0
+        for term in set(tokenize(query)):
+            if c[term]:
+                idf = math.log(1 + (len(ids) - frequencies[term] + 0.5) / (frequencies[term] + 0.5))
+                score += idf * c[term] * (K1 + 1) / (c[term] + K1 * (1 - B + B * length / average_length))
+        if score > 0:
+            scores[i] = score
+    return scores
+
+
+@pytest.fixture
+def random_corpus(tmp_path):
+    """Zipf-distributed words, so frequent terms span many posting blocks."""
+    rng = np.random.default_rng(0)
+    words = np.array([f"w{i}" for i in range(2000)])
+    p = 1 / np.arange(1, len(words) + 1)
+    chunks = [" ".join(words[rng.choice(len(words), 100, p=p / p.sum())]) for _ in range(1500)]
+    path = str(tmp_path / "text_index.bin")
+    build_text_index(path, chunks)
+    return chunks, TextIndex(path), words, p / p.sum()
+
+
+def test_tokenize():
+    assert tokenize("The CO2 standards of 2035 cut 1.5 or 2,000 t") == ["co2", "standards", "2035", "cut", "1.5", "2,000", "t"]
+
+
+def test_search_ranks_exact_terms(tmp_path):
+    path = str(tmp_path / "text_index.bin")
+    build_text_index(path, CHUNKS)
+    text_index = TextIndex(path)
+    assert (len(text_index), text_index.documents) == (5, 5)
+
+    ids, scores = text_index.search("Euro 7", 3)
+    assert ids[0] == 0
+    ids, scores = text_index.search("CO2 standards 2035", 2)
+    assert ids.tolist() == [1, 2]
+    assert np.allclose(scores, [bm25(CHUNKS, range(5), "CO2 standards 2035")[i] for i in (1, 2)], rtol=2e-3)
+
+    assert len(text_index.search("hydrogen", 3)[0]) == 0
+    assert len(text_index.search("the of", 3)[0]) == 0
+    text_index.close()
+
+
+def test_search_skips_unindexed_and_disallowed_chunks(tmp_path):
+    path = str(tmp_path / "text_index.bin")
+    build_text_index(path, CHUNKS, ids=[1, 2, 3, 4])
+    text_index = TextIndex(path)
+    assert (len(text_index), text_index.documents) == (5, 4)
+    assert 0 not in text_index.search("Euro emissions", 5)[0]
+
+    allowed = np.array([True, True, False, True, True])
+    ids, _ = text_index.search("CO2 standards", 5, allowed)
+    assert ids.tolist() == [1]
+
+
+def test_pruned_search_matches_exhaustive_scoring(random_corpus):
+    chunks, text_index, words, p = random_corpus
+    rng = np.random.default_rng(1)
+    for _ in range(20):
+        query = " ".join(words[rng.choice(len(words), 6, p=p)])
+        ids, scores = text_index.search(query, 10)
+        reference = bm25(chunks, range(len(chunks)), query)
+        expected = sorted(reference.values(), reverse=True)[:10]
+        assert np.allclose(scores, expected, rtol=2e-3)
+        assert all(reference[i] == pytest.approx(s, rel=2e-3) for i, s in zip(ids, scores))
+
+
+def test_posting_blocks(random_corpus):
+    chunks, text_index, _, _ = random_corpus
+    term_id = text_index.term_id("w0")
+    docs, scores = text_index.postings(term_id)
+    assert len(docs) > 3 * text_index.block_size
+    assert np.all(np.diff(docs.astype("int64")) > 0)
+    assert text_index.term_id("w0 ") is None
@@ -0,0 +1,62 @@
+# tests/test_thumbnails.py
+
+from PIL import Image
+
+import sys
+import os
+
+# setting path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from thumbnails import ByteLRUCache, ThumbnailPipeline, make_thumbnail, thumbnail_path
+
+
+def image_file(tmp_path, name="abc_output.jpg", size=(1200, 2400)):
+    path = os.path.join(tmp_path, name)
+    Image.new("RGB", size, "red").save(path, "JPEG")
+    return path
+
+
+def test_make_thumbnail_writes_webp_and_jpeg(tmp_path):
+    folder = os.path.join(tmp_path, "thumbnails")
+    path = make_thumbnail(image_file(tmp_path), folder, size=200)
+    assert path == os.path.join(folder, "abc_output.jpg")
+    webp_path = thumbnail_path(folder, path, "webp")
+    assert webp_path == os.path.join(folder, "abc_output.webp")
+    for thumbnail, fmt in ((path, "JPEG"), (webp_path, "WEBP")):
+        with Image.open(thumbnail) as image:
+            assert image.format == fmt
+            assert image.size == (100, 200)
+    assert sorted(os.listdir(folder)) == ["abc_output.jpg", "abc_output.webp"]  # No temporary files left
+
+
+def test_byte_lru_cache_is_bounded_by_size():
+    cache = ByteLRUCache(10)
+    cache.put("a", b"1234")
+    cache.put("b", b"1234")
+    assert cache.get("a") == b"1234"  # "b" is now the least recently used
+    cache.put("c", b"1234")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1234" and cache.get("c") == b"1234"
+    cache.put("too large", b"x" * 11)
+    assert cache.get("too large") is None
+    stats = cache.stats()
+    assert stats["bytes"] == 8 and stats["hits"] == 3 and stats["misses"] == 2
+
+
+def test_pipeline_generates_in_background_and_reads_through_cache(tmp_path):
+    pipeline = ThumbnailPipeline(os.path.join(tmp_path, "thumbnails"), size=64)
+    done = []
+    future = pipeline.submit([image_file(tmp_path, "x_input.jpg"), image_file(tmp_path, "x_output.jpg")],
+                             on_done=done.append)
+    paths = future.result(timeout=10)
+    assert done == [paths]
+    assert [os.path.basename(p) for p in paths] == ["x_input.jpg", "x_output.jpg"]
+
+    data, mime_type = pipeline.read("x_output.webp")
+    assert mime_type == "image/webp"
+    assert pipeline.read("x_output.webp")[0] is data
+    assert pipeline.cache.stats()["hits"] == 1
+    assert pipeline.read("missing.jpg") is None
+    assert pipeline.read("../x_input.jpg") is None
+    assert pipeline.read("x_output.png") is None
@@ -0,0 +1,67 @@
+# tests/test_verdict_cache.py
+
+import pytest
+from unittest.mock import patch
+
+import sys
+import os
+
+# setting path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from verdict_cache import VerdictCache, make_cache_key, normalise_text
+
+
+RESPONSE = {
+    "statement_analysis": "False.",
+    "sources": {"#1": ("Report", "https://example.org/report")},
+    "probability_true": 0,
+    "probability_false": 100,
+    "probability_undecided": 0,
+    "is_likely_true": False,
+}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return VerdictCache(f"sqlite:///{tmp_path}/verdicts.db", ttl_seconds=60, max_entries=3)
+
+
+def test_normalise_text():
+    assert normalise_text("  EVs pollute MORE\nthan diesel cars!! ") == "evs pollute more than diesel cars"
+
+
+def test_cache_key_depends_on_sources_and_model():
+    key = make_cache_key("EVs pollute more.", [1, 2], "gpt-4o-mini", "single")
+    assert key == make_cache_key("evs  pollute more", [1, 2], "gpt-4o-mini", "single")
+    assert key != make_cache_key("EVs pollute more.", [2, 1], "gpt-4o-mini", "single")
+    assert key != make_cache_key("EVs pollute more.", [1, 2], "gpt-4o", "single")
+
+
+def test_get_and_put(cache):
+    assert cache.get("a") is None
+    cache.put("a", "gpt-4o-mini", RESPONSE)
+    assert cache.get("a") == RESPONSE
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_expired_entries_are_dropped(cache):
+    with patch("verdict_cache.time.time", return_value=1000.0):
+        cache.put("a", "gpt-4o-mini", RESPONSE)
+    with patch("verdict_cache.time.time", return_value=1061.0):
+        assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entries_are_evicted(cache):
+    for i, key in enumerate(["a", "b", "c"]):
+        with patch("verdict_cache.time.time", return_value=1000.0 + i):
+            cache.put(key, "gpt-4o-mini", RESPONSE)
+    with patch("verdict_cache.time.time", return_value=1010.0):
+        cache.get("a")
+        cache.put("d", "gpt-4o-mini", RESPONSE)
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        assert cache.get("d") is not None
+    assert cache.stats()["entries"] == 3
@@ -0,0 +1,298 @@
+# BM25 keyword index over the chunk texts, searched next to the FAISS index.
+#
+# Dense search misses exact numbers and names ("Euro 7", "CO2 standards 2035").
+# search_pdfs fuses the BM25 hits with the FAISS results (reciprocal rank
+# fusion) when config.USE_TEXT_INDEX_FILE is set.
+#
+# The index is built once (by ingest.py or this script, the web app only
+# loads it) and memory-mapped like the chunk store:
+#
+#   magic (8 bytes) | header length (uint64) | JSON header | padding to 8 bytes | sections
+#
+# Sections: the sorted vocabulary (offsets and UTF-8 blob, binary searched),
+# per term the start of its postings and of its blocks and its maximum score,
+# the postings (chunk ID uint32 and precomputed BM25 score float16, sorted by
+# chunk ID) and per block of BLOCK_SIZE postings its last chunk ID and maximum
+# score. Searches score the terms with the highest maximum first and, once the
+# k-th best score can't be reached by chunks missing from the results so far,
+# only look up the candidates in the remaining terms, skipping every block
+# whose maximum can't lift a candidate into the top k (MaxScore with
+# block-max pruning).
+#
+# Build the index of an embedding directory with:
+#   python text_index.py embeddings/20250601_all-mpnet-base-v2/
+
+import os
+import re
+import json
+import mmap
+import argparse
+import threading
+from array import array
+from collections import Counter
+
+import numpy as np
+
+import config
+
+
+MAGIC = b"CFFBM25\x01"
+BLOCK_SIZE = 128
+K1 = 1.2
+B = 0.75
+
+TOKEN_PATTERN = re.compile(r"[^\W_]+(?:[.,][^\W_]+)*")
+STOP_WORDS = frozenset("""
+a an and are as at be been but by can could did do does for from had has have if in into is it its
+may more most no not of on or our so such than that the their them then there these they this those
+to was were which while who will with would
+""".split())
+
+
+def tokenize(text):
+    """Lower-case words and numbers of a text ("CO2", "1.5", "2,000" stay one token), without stop words."""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOP_WORDS]
+
+
+def _pad(length):
+    return (-length) % 8
+
+
+def build_text_index(path, chunks, ids=None, k1=K1, b=B):
+    """
+    Builds the BM25 index of the chunks and writes it to `path`.
+
+    Parameters:
+        path (str): Output file path.
+        chunks: Chunk texts (list or ChunkStore), chunk IDs are their positions.
+        ids (array-like): Chunk IDs to index, default all. Chunks removed from
+            the FAISS index are left out so keyword search can't return them.
+        k1 (float), b (float): BM25 term frequency saturation and length normalisation.
+    """
+    rows = len(chunks)
+    ids = np.arange(rows) if ids is None else np.unique(np.asarray(ids, dtype="int64"))
+    vocabulary = {}
+    term_ids, docs, frequencies = array("I"), array("I"), array("H")
+    lengths = np.zeros(rows, dtype="float32")
+    for doc in ids.tolist():
+        counts = Counter(tokenize(chunks[doc]))
+        lengths[doc] = sum(counts.values())
+        term_ids.extend(vocabulary.setdefault(term, len(vocabulary)) for term in counts)
+        docs.extend([doc] * len(counts))
+        frequencies.extend(min(count, 65535) for count in counts.values())
+
+    # Term IDs in sorted order of the terms, so lookups can binary search the vocabulary
+    terms = sorted(vocabulary)
+    rank = np.empty(len(terms), dtype="uint32")
+    rank[[vocabulary[term] for term in terms]] = np.arange(len(terms), dtype="uint32")
+    term_ids = rank[np.frombuffer(term_ids, dtype="uint32")] if len(term_ids) else np.empty(0, dtype="uint32")
+    docs = np.frombuffer(docs, dtype="uint32") if len(docs) else np.empty(0, dtype="uint32")
+    frequencies = np.frombuffer(frequencies, dtype="uint16") if len(frequencies) else np.empty(0, dtype="uint16")
+
+    # Postings by term, then chunk ID; their BM25 scores are computed here once
+    order = np.lexsort((docs, term_ids))
+    term_ids, docs, frequencies = term_ids[order], docs[order], frequencies[order].astype("float32")
+    document_frequency = np.bincount(term_ids, minlength=len(terms))
+    average_length = float(lengths[ids].mean()) if len(ids) else 0.0
+    average_length = average_length or 1.0
+    idf = np.log(1 + (len(ids) - document_frequency + 0.5) / (document_frequency + 0.5)).astype("float32")
+    norms = k1 * (1 - b + b * lengths[docs] / average_length)
+    scores = (idf[term_ids] * frequencies * (k1 + 1) / (frequencies + norms)).astype("float16")
+    posting_offsets = np.zeros(len(terms) + 1, dtype="int64")
+    np.cumsum(document_frequency, out=posting_offsets[1:])
+
+    # Blocks of BLOCK_SIZE postings per term with their last chunk ID and best score
+    blocks_per_term = -(-document_frequency // BLOCK_SIZE)
+    block_offsets = np.zeros(len(terms) + 1, dtype="int64")
+    np.cumsum(blocks_per_term, out=block_offsets[1:])
+    block_terms = np.repeat(np.arange(len(terms)), blocks_per_term)
+    block_starts = posting_offsets[block_terms] + BLOCK_SIZE * (np.arange(len(block_terms)) - block_offsets[block_terms])
+    block_ends = np.minimum(block_starts + BLOCK_SIZE, posting_offsets[block_terms + 1])
+    if len(block_starts):
+        block_max = np.maximum.reduceat(scores.astype("float32"), block_starts)
+        block_last = docs[block_ends - 1]
+        term_max = np.maximum.reduceat(block_max, block_offsets[:-1])
+    else:
+        block_max, block_last, term_max = (np.empty(0, dtype=t) for t in ("float32", "uint32", "float32"))
+
+    encoded = [term.encode("utf-8") for term in terms]
+    term_offsets = np.zeros(len(terms) + 1, dtype="<u8")
+    np.cumsum([len(e) for e in encoded], out=term_offsets[1:])
+    sections = {
+        "term_offsets": term_offsets,
+        "term_blob": np.frombuffer(b"".join(encoded), dtype="u1"),
+        "posting_offsets": posting_offsets.astype("<u8"),
+        "block_offsets": block_offsets.astype("<u8"),
+        "term_max": term_max.astype("<f4"),
+        "docs": docs.astype("<u4"),
+        "scores": scores.astype("<f2"),
+        "block_last": block_last.astype("<u4"),
+        "block_max": block_max.astype("<f4"),
+    }
+
+    header = {"rows": rows, "documents": len(ids), "terms": len(terms), "average_length": average_length,
+              "k1": k1, "b": b, "block_size": BLOCK_SIZE, "sections": {}}
+    position = 0
+    for name, values in sections.items():
+        header["sections"][name] = {"dtype": values.dtype.str, "count": len(values), "offset": position}
+        position += values.nbytes + _pad(values.nbytes)
+    header_bytes = json.dumps(header).encode("utf-8")
+    header_bytes += b" " * _pad(len(header_bytes))
+
+    # Per writer, concurrent builds must not write into each other's file
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(np.uint64(len(header_bytes)).tobytes())
+        f.write(header_bytes)
+        for values in sections.values():
+            f.write(values.tobytes())
+            f.write(b"\0" * _pad(values.nbytes))
+    os.replace(tmp_path, path)
+
+
+class TextIndex:
+    """Memory-mapped BM25 index file, see the module docstring for the layout."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:8] != MAGIC:
+            raise ValueError(f"{path} is not a text index file")
+        header_length = int(np.frombuffer(self._mmap, dtype="<u8", count=1, offset=8)[0])
+        header = json.loads(self._mmap[16:16 + header_length].decode("utf-8"))
+        base = 16 + header_length
+        self.rows = header["rows"]
+        self.documents = header["documents"]
+        self.terms = header["terms"]
+        self.block_size = header["block_size"]
+        for name, spec in header["sections"].items():
+            setattr(self, "_" + name, np.frombuffer(self._mmap, dtype=spec["dtype"], count=spec["count"],
+                                                    offset=base + spec["offset"]))
+        self._blob = base + header["sections"]["term_blob"]["offset"]
+
+    def __len__(self):
+        return self.rows
+
+    def _term(self, i):
+        return self._mmap[self._blob + int(self._term_offsets[i]):self._blob + int(self._term_offsets[i + 1])]
+
+    def term_id(self, term):
+        """Position of a term in the sorted vocabulary, None if no chunk contains it."""
+        key = term.encode("utf-8")
+        low, high = 0, self.terms
+        while low < high:
+            middle = (low + high) // 2
+            if self._term(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low if low < self.terms and self._term(low) == key else None
+
+    def postings(self, term_id):
+        """(chunk IDs, BM25 scores) of a term, sorted by chunk ID."""
+        start, end = int(self._posting_offsets[term_id]), int(self._posting_offsets[term_id + 1])
+        return self._docs[start:end], self._scores[start:end]
+
+    def _lookup(self, term_id, candidates, theta, scores, rest):
+        """
+        Adds the scores of one term to the candidates (sorted chunk IDs),
+        reading only the blocks that can lift a candidate to `theta` with the
+        `rest` of the terms. Returns the surviving candidates and their scores.
+        """
+        first_block, last_block = int(self._block_offsets[term_id]), int(self._block_offsets[term_id + 1])
+        block_last = self._block_last[first_block:last_block]
+        block = np.searchsorted(block_last, candidates)
+        in_term = block < len(block_last)
+        bound = scores + rest + np.where(in_term, self._block_max[first_block:last_block][np.minimum(block, len(block_last) - 1)], 0)
+        keep = bound >= theta
+        candidates, scores, block, in_term = candidates[keep], scores[keep], block[keep], in_term[keep]
+
+        needed = np.unique(block[in_term])
+        if len(needed):
+            start, end = int(self._posting_offsets[term_id]), int(self._posting_offsets[term_id + 1])
+            starts = start + needed * self.block_size
+            lengths = np.minimum(starts + self.block_size, end) - starts
+            positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(int(lengths.sum()))
+            docs = self._docs[positions]
+            found = np.minimum(np.searchsorted(docs, candidates), len(docs) - 1)
+            match = docs[found] == candidates
+            scores = scores + np.where(match, self._scores[positions[found]].astype("float32"), 0)
+        return candidates, scores
+
+    def search(self, query, k, allowed=None):
+        """
+        The k chunks with the highest BM25 score for the query.
+
+        Parameters:
+            query (str): The search query.
+            k (int): Number of results.
+            allowed (np.ndarray): Boolean mask over the chunk IDs (e.g. the
+                publication-type selection), chunks outside it are skipped.
+
+        Returns:
+            tuple: (chunk IDs, scores) by descending score.
+        """
+        term_ids = {self.term_id(term) for term in tokenize(query)} - {None}
+        if not term_ids or k <= 0:
+            return np.empty(0, dtype="int64"), np.empty(0, dtype="float32")
+        term_ids = sorted(term_ids, key=lambda t: -float(self._term_max[t]))
+        upper = np.array([self._term_max[t] for t in term_ids], dtype="float32")
+        rest = np.append(np.cumsum(upper[::-1])[::-1], 0)  # rest[i]: best score of terms i, i + 1, ...
+
+        candidates, scores = np.empty(0, dtype="int64"), np.empty(0, dtype="float32")
+        theta = 0.0
+        for i, term_id in enumerate(term_ids):
+            if len(candidates) >= k and rest[i] < theta:
+                # Chunks not found so far can't reach the top k, only complete the candidates' scores
+                candidates, scores = self._lookup(term_id, candidates, theta, scores, rest[i + 1])
+            else:
+                docs, term_scores = self.postings(term_id)
+                if allowed is not None:
+                    keep = allowed[docs]
+                    docs, term_scores = docs[keep], term_scores[keep]
+                merged, inverse = np.unique(np.concatenate([candidates, docs.astype("int64")]), return_inverse=True)
+                scores = np.bincount(inverse, weights=np.concatenate([scores, term_scores.astype("float32")]),
+                                     minlength=len(merged)).astype("float32")
+                candidates = merged
+            if len(candidates) >= k:
+                theta = max(theta, float(np.partition(scores, len(scores) - k)[len(scores) - k]))
+
+        top = np.argsort(-scores, kind="stable")[:k]
+        return candidates[top], scores[top]
+
+    def close(self):
+        for name in ("term_offsets", "term_blob", "posting_offsets", "block_offsets", "term_max",
+                     "docs", "scores", "block_last", "block_max"):
+            setattr(self, "_" + name, None)
+        try:
+            self._mmap.close()
+        except BufferError:
+            # Views of the postings are still referenced, the map is released with them
+            pass
+
+
+if __name__ == "__main__":
+    from chunk_store import ChunkStore
+
+    parser = argparse.ArgumentParser(description="Build the BM25 text index of an embedding directory's chunks.")
+    parser.add_argument("directory", help="Embedding directory containing the chunk store, e.g. embeddings/20250601_all-mpnet-base-v2/")
+    args = parser.parse_args()
+
+    chunk_store_file = os.path.join(args.directory, config.CHUNKS_STORE_FILE)
+    if os.path.exists(chunk_store_file):
+        chunks = ChunkStore(chunk_store_file)
+    else:
+        with open(os.path.join(args.directory, config.CHUNKS_FILE), "r", encoding="utf-8") as f:
+            chunks = json.load(f)
+
+    # Only the chunks of ingested PDFs, chunks of changed and removed PDFs are gone from the FAISS index
+    ids = None
+    manifest_file = os.path.join(args.directory, config.INGEST_MANIFEST_FILE)
+    if os.path.exists(manifest_file):
+        with open(manifest_file, "r", encoding="utf-8") as f:
+            ids = [i for entry in json.load(f)["files"].values() for start, stop in entry["ids"] for i in range(start, stop)]
+
+    build_text_index(os.path.join(args.directory, config.TEXT_INDEX_FILE), chunks, ids)
+    print(f"Wrote {config.TEXT_INDEX_FILE} ({len(chunks) if ids is None else len(ids)} chunks) to {args.directory}")
@@ -0,0 +1,151 @@
+# Small copies (derivatives) of the input and output images for the gallery.
+#
+# Thumbnails are written as WebP and JPEG into a folder next to the uploads,
+# named after the image (abc_output.jpg -> thumbnails/abc_output.webp and
+# thumbnails/abc_output.jpg). For new uploads ThumbnailPipeline generates them
+# on a background thread once the output image was saved. Images from before
+# get theirs the first time they appear in the gallery. Listing the gallery
+# never decodes a full-size image. JPEGs are decoded in draft mode (scaled by
+# 1/2, 1/4 or 1/8 while decoding) before the final resize.
+#
+# The files are served with long cache lifetimes. The most requested ones are
+# kept in memory (an LRU cache bounded by total bytes).
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+from werkzeug.utils import safe_join
+
+
+# Format: (file extension, MIME type, Pillow save options)
+THUMBNAIL_FORMATS = {
+    "jpeg": ("jpg", "image/jpeg", {"quality": 80}),
+    "webp": ("webp", "image/webp", {"quality": 75, "method": 4}),
+}
+MIME_TYPES = {extension: mime_type for extension, mime_type, _ in THUMBNAIL_FORMATS.values()}
+
+
+def thumbnail_path(thumbnails_folder: str, image_path: str, fmt: str = "jpeg") -> str:
+    """Path of the thumbnail of an image in the given format."""
+    name = os.path.splitext(os.path.basename(image_path))[0]
+    return os.path.join(thumbnails_folder, f"{name}.{THUMBNAIL_FORMATS[fmt][0]}")
+
+
+def make_thumbnail(image_path: str, thumbnails_folder: str, size: int = 320, formats=("webp", "jpeg")) -> str:
+    """
+    Writes thumbnails of the image with at most `size` pixels on its longest
+    side to the thumbnails folder, one per format, and returns the path of
+    the JPEG (the other formats have the same name and their own extension).
+    """
+    os.makedirs(thumbnails_folder, exist_ok=True)
+    with Image.open(image_path) as image:
+        image.draft("RGB", (size, size))
+        image = image.convert("RGB")
+        image.thumbnail((size, size), Image.LANCZOS)
+    for fmt in dict.fromkeys((*formats, "jpeg")):
+        path = thumbnail_path(thumbnails_folder, image_path, fmt)
+        # Written under a temporary name, concurrent requests never send a partial file
+        temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        image.save(temporary_path, fmt.upper(), **THUMBNAIL_FORMATS[fmt][2])
+        os.replace(temporary_path, path)
+    return thumbnail_path(thumbnails_folder, image_path, "jpeg")
+
+
+class ByteLRUCache:
+    """Keeps values (bytes) up to a total of `max_bytes`, evicting the least recently used."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.pop(key, None)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries[key] = value
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            self.size += len(value) - (len(previous) if previous is not None else 0)
+            self._entries[key] = value
+            while self.size > self.max_bytes:
+                self.size -= len(self._entries.pop(next(iter(self._entries))))
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self.size, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses}
+
+
+class ThumbnailPipeline:
+    """
+    Generates thumbnails in the background and reads them through an
+    in-memory cache.
+
+    Parameters:
+        folder (str): Folder the thumbnails are written to.
+        size (int): Longest side of the thumbnails in pixels.
+        formats (tuple): Formats to write, JPEG is always written.
+        workers (int): Background threads generating thumbnails.
+        cache_bytes (int): Size of the in-memory cache of thumbnail files.
+    """
+
+    def __init__(self, folder, size=320, formats=("webp", "jpeg"), workers=1, cache_bytes=32 * 1024 * 1024):
+        self.folder = folder
+        self.size = size
+        self.formats = formats
+        self.cache = ByteLRUCache(cache_bytes)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnails")
+
+    def make(self, image_path: str) -> str:
+        """Generates the thumbnails of an image in the calling thread, returns the JPEG path."""
+        return make_thumbnail(image_path, self.folder, self.size, self.formats)
+
+    def submit(self, image_paths, on_done=None):
+        """
+        Generates the thumbnails of the images on the background thread and
+        calls on_done(JPEG paths, in order) when all are written.
+        """
+        def run():
+            try:
+                paths = [self.make(path) for path in image_paths]
+                if on_done is not None:
+                    on_done(paths)
+                return paths
+            except Exception as e:
+                print(f"Error generating thumbnails of {image_paths}: {e}")
+                raise
+
+        return self._pool.submit(run)
+
+    def read(self, filename: str):
+        """
+        (bytes, MIME type) of a thumbnail file, from memory if it was read
+        before. None if there is no such thumbnail.
+        """
+        mime_type = MIME_TYPES.get(filename.rsplit(".", 1)[-1])
+        path = safe_join(os.path.abspath(self.folder), filename)
+        if mime_type is None or path is None:
+            return None
+        data = self.cache.get(filename)
+        if data is None:
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                return None
+            self.cache.put(filename, data)
+        return data, mime_type
@@ -0,0 +1,133 @@
+# Persistent cache of fact-check verdicts.
+#
+# An exact image hash only matches byte-identical uploads. A re-compressed or
+# cropped sharepic with the same claim produces the same OCR text and retrieves
+# the same chunks, so verdicts are cached under a key built from the normalised
+# text, the retrieved chunk IDs, the LLM model and the check mode.
+
+import re
+import json
+import time
+import hashlib
+import threading
+import unicodedata
+
+from sqlalchemy import create_engine, Column, String, Float, Text
+from sqlalchemy.orm import sessionmaker, declarative_base
+
+
+Base = declarative_base()
+
+class VerdictCacheEntry(Base):
+    __tablename__ = 'verdict_cache'
+    key = Column(String, primary_key=True)
+    model = Column(String)
+    created_at = Column(Float, index=True)
+    last_used_at = Column(Float, index=True)
+    response = Column(Text)
+
+
+def normalise_text(text: str) -> str:
+    """
+    Normalises OCR text so that case, punctuation, line breaks and spacing
+    differences between two screenshots of the same claim don't matter.
+    """
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    text = re.sub(r"[^\w]+", " ", text)
+    return " ".join(text.split())
+
+
+def make_cache_key(extracted_text: str, chunk_ids, model: str, mode: str) -> str:
+    """Builds the cache key for a claim and the chunks retrieved for it."""
+    parts = [normalise_text(extracted_text), ",".join(str(i) for i in chunk_ids), model, mode]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class VerdictCache:
+    """
+    SQLite-backed verdict cache with a time-to-live and a maximum number of
+    entries; the least recently used entries are evicted first.
+    """
+
+    def __init__(self, database_url, ttl_seconds, max_entries):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.engine = create_engine(database_url)
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key):
+        """Returns the cached response for `key`, or None if missing or expired."""
+        session = self.Session()
+        try:
+            entry = session.get(VerdictCacheEntry, key)
+            now = time.time()
+            if entry is not None and now - entry.created_at > self.ttl_seconds:
+                session.delete(entry)
+                session.commit()
+                entry = None
+            if entry is None:
+                self._count(hit=False)
+                return None
+
+            entry.last_used_at = now
+            session.commit()
+            self._count(hit=True)
+            response = json.loads(entry.response)
+            response["sources"] = {k: tuple(v) for k, v in response.get("sources", {}).items()}
+            return response
+        finally:
+            session.close()
+
+    def put(self, key, model, response):
+        """Stores a response and evicts expired and least recently used entries."""
+        session = self.Session()
+        try:
+            now = time.time()
+            session.merge(VerdictCacheEntry(
+                key=key, model=model, created_at=now, last_used_at=now, response=json.dumps(response)
+            ))
+            session.query(VerdictCacheEntry).filter(
+                VerdictCacheEntry.created_at < now - self.ttl_seconds
+            ).delete(synchronize_session=False)
+
+            excess = session.query(VerdictCacheEntry).count() - self.max_entries
+            if excess > 0:
+                oldest = session.query(VerdictCacheEntry.key).order_by(
+                    VerdictCacheEntry.last_used_at
+                ).limit(excess).subquery()
+                session.query(VerdictCacheEntry).filter(
+                    VerdictCacheEntry.key.in_(oldest.select())
+                ).delete(synchronize_session=False)
+            session.commit()
+        finally:
+            session.close()
+
+    def stats(self):
+        """Returns hit/miss counters of this process and the number of stored entries."""
+        session = self.Session()
+        try:
+            size = session.query(VerdictCacheEntry).count()
+        finally:
+            session.close()
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else None,
+            "entries": size,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+        }
@@ -20,24 +20,35 @@ function App() {
   const [progress, setProgress] = useState(0);
   const [uploadedImageUrl, setUploadedImageUrl] = useState(null);
   const [galleryImages, setGalleryImages] = useState([]);
+  const [galleryCursor, setGalleryCursor] = useState(null); // Cursor of the next gallery page, null on the last page
+  const [galleryLoading, setGalleryLoading] = useState(false);
 
   // Replace 127.0.0.1:5000 with the actual IP and port of your backend server
   const BACKEND_URL = 'http://127.0.0.1:5000';
 
+  // Fetches one page of the gallery, newest first; without a cursor the first page replaces the list
+  const loadGalleryPage = (cursor = null) => {
+    setGalleryLoading(true);
+    const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+    fetch(`${BACKEND_URL}/api/gallery-images${query}`)
+      .then(response => {
+        if (!response.ok) {
+          throw new Error(`HTTP error! Status: ${response.status}`);
+        }
+        return response.json();
+      })
+      .then(data => {
+        console.log("Fetched gallery images:", data);
+        setGalleryImages(previous => (cursor ? [...previous, ...data.images] : data.images));
+        setGalleryCursor(data.next_cursor);
+      })
+      .catch(error => console.error('Error fetching gallery images:', error))
+      .finally(() => setGalleryLoading(false));
+  };
+
   useEffect(() => {
     if (activeTab === 'gallery') {
-      fetch(`${BACKEND_URL}/api/gallery-images`)
-        .then(response => {
-          if (!response.ok) {
-            throw new Error(`HTTP error! Status: ${response.status}`);
-          }
-          return response.json();
-        })
-        .then(data => {
-          console.log("Fetched gallery images:", data);
-          setGalleryImages(data);
-        })
-        .catch(error => console.error('Error fetching gallery images:', error));
+      loadGalleryPage();
     }
   }, [activeTab]);
 
@@ -281,20 +292,35 @@ function App() {
           {activeTab === 'gallery' && (
             <div className="gallery-grid">
               {galleryImages.length > 0 ? (
-                galleryImages.map((imagePair, index) => (
-                  <div key={index} className="gallery-row">
+                galleryImages.map((imagePair) => (
+                  <div key={imagePair.id} className="gallery-row">
                     <div className="image-preview">
                       <h3>True?</h3>
-                      <img src={`http://127.0.0.1:5000/${imagePair.input}`} alt="True sharepic?" />
+                      <a href={`${BACKEND_URL}${imagePair.input}`} target="_blank" rel="noreferrer">
+                        <picture>
+                          {imagePair.input_thumbnail_webp && <source srcSet={`${BACKEND_URL}${imagePair.input_thumbnail_webp}`} type="image/webp" />}
+                          <img src={`${BACKEND_URL}${imagePair.input_thumbnail || imagePair.input}`} alt="True sharepic?" loading="lazy" />
+                        </picture>
+                      </a>
                     </div>
                     <div className="image-preview">
-                      <h3>Fake!</h3>
-                      <img src={`http://127.0.0.1:5000/${imagePair.output}`} alt="Fake sharepic" />
+                      <h3>{imagePair.is_statement_true ? "True!" : "Fake!"}</h3>
+                      <a href={`${BACKEND_URL}${imagePair.output}`} target="_blank" rel="noreferrer">
+                        <picture>
+                          {imagePair.output_thumbnail_webp && <source srcSet={`${BACKEND_URL}${imagePair.output_thumbnail_webp}`} type="image/webp" />}
+                          <img src={`${BACKEND_URL}${imagePair.output_thumbnail}`} alt="Fake sharepic" loading="lazy" />
+                        </picture>
+                      </a>
                     </div>
                   </div>
                 ))
               ) : (
-                <p>No images available in the gallery.</p>
+                !galleryLoading && <p>No images available in the gallery.</p>
+              )}
+              {galleryCursor && (
+                <button className="load-more" onClick={() => loadGalleryPage(galleryCursor)} disabled={galleryLoading}>
+                  {galleryLoading ? "Loading..." : "Load more"}
+                </button>
               )}
             </div>
           )}